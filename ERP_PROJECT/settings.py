@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover the rest of the stack
+    'inventory.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,12 +80,151 @@ WSGI_APPLICATION = 'ERP_PROJECT.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profile picked from the environment:
+#   ERP_DB_ENGINE=sqlite (default)   ERP_DB_NAME (file path), ERP_SQLITE_TUNING=0 to
+#                                    keep SQLite's defaults, ERP_SQLITE_MMAP_SIZE (bytes)
+#   ERP_DB_ENGINE=postgresql         ERP_DB_NAME, ERP_DB_USER, ERP_DB_PASSWORD,
+#                                    ERP_DB_HOST, ERP_DB_PORT, ERP_DB_CONN_MAX_AGE (seconds),
+#                                    ERP_DB_POOL=1 for psycopg's connection pool
+#                                    (ERP_DB_POOL_MIN_SIZE / ERP_DB_POOL_MAX_SIZE)
+
+DB_ENGINE = os.environ.get('ERP_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('ERP_DB_NAME', 'erp'),
+            'USER': os.environ.get('ERP_DB_USER', ''),
+            'PASSWORD': os.environ.get('ERP_DB_PASSWORD', ''),
+            'HOST': os.environ.get('ERP_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('ERP_DB_PORT', '5432'),
+            # Keep connections open between requests; check them before reuse
+            'CONN_MAX_AGE': int(os.environ.get('ERP_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('ERP_DB_POOL') == '1':
+        # Pooled connections are returned to the pool after each request,
+        # which replaces persistent connections (requires psycopg[pool]).
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('ERP_DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('ERP_DB_POOL_MAX_SIZE', 10)),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('ERP_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # SQLite has no row locks: take the write lock when a transaction
+                # starts and wait for it instead of failing with "database is locked".
+                'transaction_mode': 'IMMEDIATE',
+                # Busy timeout, in seconds
+                'timeout': 20,
+            },
+            'TEST': {
+                # File-backed so multi-threaded tests get real, separate connections
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+    if os.environ.get('ERP_SQLITE_TUNING', '1') == '1':
+        # Run on every new connection. WAL lets readers proceed while a
+        # receipt is being written; synchronous=NORMAL is durable across
+        # application crashes in WAL mode and only fsyncs at checkpoints;
+        # mmap serves reads straight from the page cache.
+        DATABASES['default']['OPTIONS']['init_command'] = (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f"PRAGMA mmap_size={int(os.environ.get('ERP_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))};"
+            'PRAGMA temp_store=MEMORY;'
+        )
+else:
+    raise ImproperlyConfigured(f"ERP_DB_ENGINE must be 'sqlite' or 'postgresql', not {DB_ENGINE!r}")
+
+
+# Inventory
+# Locking strategy used by inventory.stock.post_movements: 'pessimistic'
+# (SELECT ... FOR UPDATE in primary-key order) or 'optimistic' (version column + retry)
+
+INVENTORY_STOCK_LOCKING = 'pessimistic'
+
+# Serialized product / PO payloads (inventory.cache). With ERP_CACHE_REDIS_URL
+# set, every server process shares one Redis cache, so an invalidation reaches
+# all of them. Otherwise each process has its own local-memory LRU: another
+# process's write only invalidates that process's copy, so entries are kept
+# briefly and other processes may serve a payload up to TIMEOUT seconds stale.
+CACHE_REDIS_URL = os.environ.get('ERP_CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'TIMEOUT': 300,
+        }
+    }
+    # Completed POs never change, so their payloads are kept longer
+    INVENTORY_CACHE_COMPLETED_TIMEOUT = 24 * 60 * 60
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'inventory-payloads',
+            'TIMEOUT': int(os.environ.get('ERP_CACHE_LOCAL_TIMEOUT', 30)),
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
     }
-}
+    # A supplier rename still changes a completed PO's supplier_name
+    INVENTORY_CACHE_COMPLETED_TIMEOUT = CACHES['default']['TIMEOUT']
+
+# Per-request metrics (inventory.middleware), scraped at /metrics by staff
+# users or with "Authorization: Bearer $ERP_METRICS_TOKEN". Requests slower than
+# INVENTORY_SLOW_REQUEST_MS are dumped with their SQL (no parameters), owner-only,
+# to INVENTORY_SLOW_REQUEST_DIR (None disables dumps), keeping the newest
+# INVENTORY_SLOW_REQUEST_MAX_FILES.
+INVENTORY_METRICS_ENABLED = True
+INVENTORY_METRICS_TOKEN = os.environ.get('ERP_METRICS_TOKEN') or None
+INVENTORY_SLOW_REQUEST_MS = 500
+INVENTORY_SLOW_REQUEST_DIR = os.environ.get(
+    'ERP_SLOW_REQUEST_DIR', os.path.join(tempfile.gettempdir(), 'erp-slow-requests'),
+)
+INVENTORY_SLOW_REQUEST_MAX_FILES = 200
+
+# Analytics rollups (inventory.rollups). Receipts within INVENTORY_ON_TIME_DAYS
+# of PO approval count as on time. On PostgreSQL, set the settle delay above
+# the longest ledger- or PO-writing transaction so late-committing ledger rows
+# and order lines are not skipped.
+INVENTORY_ON_TIME_DAYS = 14
+INVENTORY_ROLLUP_SETTLE_SECONDS = 0
+
+# Follow-up work (rollups, auto-planning) runs on the database job queue
+# (inventory.jobs); start workers with `python manage.py run_workers`.
+# With INVENTORY_AUTO_PLAN, outgoing stock queues a planner run whose POs are
+# created by INVENTORY_AUTO_PLAN_USER (a username, or None).
+INVENTORY_AUTO_PLAN = False
+INVENTORY_AUTO_PLAN_USER = None
+
+# Stock snapshots (inventory.snapshots). As with the rollups, on PostgreSQL set
+# the settle delay above the longest ledger-writing transaction so a snapshot
+# never covers an ID whose row commits after it is built.
+INVENTORY_SNAPSHOT_SETTLE_SECONDS = 0
+
+# Months of ledger kept in InventoryTransaction, counting the current one;
+# `python manage.py archive_ledger` moves older months to the archive table.
+INVENTORY_LEDGER_HOT_MONTHS = 3
+
+# Change feed (inventory.changes). As with the rollups, on PostgreSQL set the
+# settle delay above the longest writing transaction so that consumers never
+# move their cursor past an event that commits later.
+INVENTORY_CHANGES_SETTLE_SECONDS = 0
+
+# Responses of requests sent with an Idempotency-Key (inventory.idempotency) are
+# replayed to retries for this many hours; `python manage.py purge_idempotency_keys`
+# deletes older ones.
+INVENTORY_IDEMPOTENCY_TTL_HOURS = 24
 
 
 # Password validation
@@ -2,31 +2,166 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import Supplier, Product, PurchaseOrder, PurchaseOrderItem, InventoryTransaction
+from .models import (
+    ArchivedTransaction, ChangeCursor, ChangeEvent, IdempotencyRecord, Job, LedgerPeriodSummary, Supplier, Product,
+    PurchaseOrder, PurchaseOrderItem, InventoryTransaction, ReorderItem,
+)
+from . import search
+from .availability import refresh_on_order
+from .stock import post_movements
+
+# Most index matches an admin search lists
+ADMIN_SEARCH_LIMIT = 1000
+
+# Product columns maintained by stock movements, never saved from the admin form
+STOCK_FIELDS = {'current_stock', 'reorder_needed', 'version'}
+
+class IndexedSearchMixin:
+    """
+    Admin search answered from the search index (search.py) instead of
+    LIKE '%term%' scans over search_fields, which remain the fallback for
+    one-character terms and databases without the index table.
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.uses_index() or not search.searchable(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        ids = [pk for _, pk in search.matching_ids(search_term, [self.search_kind], limit=ADMIN_SEARCH_LIMIT)]
+        return queryset.filter(pk__in=ids), False
 
 @admin.register(Supplier)
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['id', 'name', 'contact_email', 'phone']
+    search_fields = ['name']
+    search_kind = 'supplier'
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'sku', 'current_stock', 'reorder_threshold', 'reorder_needed']
+class ProductAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['id', 'name', 'sku', 'current_stock', 'reorder_threshold', 'reorder_needed', 'preferred_supplier']
     list_filter = ['reorder_needed']
     search_fields = ['name', 'sku']
+    search_kind = 'product'
+    # Derived from the stock level, which only the ledger writes
+    readonly_fields = ['reorder_needed']
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # Round-trip the stock value the user saw, so save_model can post a delta
+        form.base_fields['current_stock'].show_hidden_initial = True
+        return form
+
+    def save_model(self, request, obj, form, change):
+        """
+        Stock edits are posted to the ledger as an adjustment (the difference
+        from the value shown in the form) instead of overwriting current_stock,
+        so a receipt that lands while the form is open is not lost. Existing
+        products are saved with update_fields limited to the other changed
+        fields: the stock columns the form copied onto obj are stale.
+        """
+        delta = 0
+        if 'current_stock' in form.changed_data:
+            field = form.fields['current_stock']
+            shown_stock = field.to_python(form.data.get(form['current_stock'].html_initial_name)) or 0
+            delta = obj.current_stock - shown_stock
+        other_fields = [name for name in form.changed_data if name not in STOCK_FIELDS]
+        if not change:
+            obj.current_stock = form.initial.get('current_stock', 0)
+            obj.save()
+        elif other_fields:
+            obj.save(update_fields=other_fields)
+        if delta:
+            post_movements([(obj.pk, delta)], reference=f"Admin adjustment by {request.user}", allow_negative=True)
+        obj.refresh_from_db(fields=sorted(STOCK_FIELDS))
 
 class PurchaseOrderItemInline(admin.TabularInline):
     model = PurchaseOrderItem
     extra = 1
 
 @admin.register(PurchaseOrder)
-class PurchaseOrderAdmin(admin.ModelAdmin):
+class PurchaseOrderAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['id', 'supplier', 'status', 'created_by', 'created_at', 'approved_at']
     list_filter = ['status', 'created_at']
     search_fields = ['supplier__name']
+    search_kind = 'purchase_order'
     inlines = [PurchaseOrderItemInline]
 
+    # Inline edits can rewrite any line, so on_order is recomputed for every
+    # product the PO referenced before or after the change.
+    def save_related(self, request, form, formsets, change):
+        before = set(form.instance.items.values_list('product_id', flat=True)) if change else set()
+        super().save_related(request, form, formsets, change)
+        refresh_on_order(before | set(form.instance.items.values_list('product_id', flat=True)))
+
+    def delete_model(self, request, obj):
+        product_ids = list(obj.items.values_list('product_id', flat=True))
+        super().delete_model(request, obj)
+        refresh_on_order(product_ids)
+
+    def delete_queryset(self, request, queryset):
+        product_ids = list(PurchaseOrderItem.objects.filter(purchase_order__in=queryset).values_list('product_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_on_order(product_ids)
+
+@admin.register(ReorderItem)
+class ReorderItemAdmin(admin.ModelAdmin):
+    list_display = ['product', 'shortfall', 'supplier', 'updated_at']
+    list_filter = ['supplier']
+    list_select_related = ['product', 'supplier']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at']
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'topic', 'object_id', 'created_at']
+    list_filter = ['topic']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ChangeCursor)
+class ChangeCursorAdmin(admin.ModelAdmin):
+    list_display = ['consumer', 'acked_id', 'updated_at']
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'endpoint', 'status_code', 'created_at']
+    list_filter = ['created_at']
+    list_select_related = ['user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(InventoryTransaction)
 class InventoryTransactionAdmin(admin.ModelAdmin):
     list_display = ['id', 'product', 'quantity', 'timestamp', 'reference']
     list_filter = ['timestamp']
 
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'quantity', 'timestamp', 'reference']
+    # Filter on the month column rather than the timestamp: one indexed equality
+    list_filter = ['period']
+    list_select_related = ['product']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(LedgerPeriodSummary)
+class LedgerPeriodSummaryAdmin(admin.ModelAdmin):
+    list_display = ['product', 'period', 'received', 'issued', 'transactions', 'closing_balance']
+    list_filter = ['period']
+    list_select_related = ['product']
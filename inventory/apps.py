@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
+        # Register job handlers, so workers know every job name
+        from . import planning, rollups  # noqa: F401
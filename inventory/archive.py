@@ -0,0 +1,221 @@
+"""
+Ledger archival.
+
+InventoryTransaction only keeps recent months (INVENTORY_LEDGER_HOT_MONTHS).
+archive_ledger() moves the rows of closed months, oldest month first, into
+ArchivedTransaction (same columns and IDs, plus the month) and maintains a
+LedgerPeriodSummary per product and month with the month's totals and closing
+balance. Each batch is copied, deleted and summarised in one transaction.
+
+Before moving anything, stock snapshots and analytics rollups are brought up
+to date, and only rows already covered by both are archived: point-in-time
+stock keeps starting from a snapshot, and rollups never miss a row.
+
+Reads that need full history go through ledger_rows(), which unions the hot
+and archived tables.
+"""
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, Sum, Value, When
+from django.utils import timezone
+from .models import ArchivedTransaction, InventoryTransaction, LedgerPeriodSummary
+from .rollups import LEDGER, catch_up, month_start, period_of, watermarks
+from .snapshots import build_snapshots
+
+# Ledger rows moved per transaction
+DEFAULT_BATCH_SIZE = 5000
+
+# Columns shared by the hot and archived ledger tables
+LEDGER_FIELDS = ['id', 'product_id', 'quantity', 'timestamp', 'reference']
+
+# Products per closing-balance UPDATE (keeps the CASE expression small)
+SUMMARY_UPDATE_BATCH_SIZE = 250
+
+
+def hot_months():
+    """
+    Months of ledger kept in InventoryTransaction (INVENTORY_LEDGER_HOT_MONTHS),
+    counting the current one.
+    """
+    return getattr(settings, 'INVENTORY_LEDGER_HOT_MONTHS', 3)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _month_bounds(period):
+    """
+    [start, end) of a month as aware datetimes in the current time zone.
+    """
+    return (
+        timezone.make_aware(datetime.combine(period, time.min)),
+        timezone.make_aware(datetime.combine(add_months(period, 1), time.min)),
+    )
+
+
+def archive_cutoff(keep_months=None, today=None):
+    """
+    First day of the oldest month that stays hot.
+    """
+    keep = hot_months() if keep_months is None else keep_months
+    return add_months(month_start(today or timezone.localdate()), 1 - keep)
+
+
+def _summarise(period, rows):
+    """
+    Fold archived rows of one month into LedgerPeriodSummary and carry their
+    net change into the closing balance of later months.
+    """
+    totals = {}
+    for row in rows:
+        entry = totals.setdefault(row['product_id'], {'received': 0, 'issued': 0, 'transactions': 0})
+        if row['quantity'] > 0:
+            entry['received'] += row['quantity']
+        else:
+            entry['issued'] -= row['quantity']
+        entry['transactions'] += 1
+    product_ids = list(totals)
+
+    existing = {
+        row['product_id']: row
+        for row in LedgerPeriodSummary.objects.filter(product_id__in=product_ids, period=period)
+        .values('product_id', 'received', 'issued', 'transactions', 'closing_balance')
+    }
+    # Balance before this month: the net of every earlier archived month
+    opening = dict(
+        LedgerPeriodSummary.objects.filter(product_id__in=product_ids, period__lt=period)
+        .values('product_id').order_by().annotate(balance=Sum(F('received') - F('issued')))
+        .values_list('product_id', 'balance')
+    )
+    summaries = []
+    for product_id, entry in totals.items():
+        net = entry['received'] - entry['issued']
+        current = existing.get(product_id)
+        if current:
+            summaries.append(LedgerPeriodSummary(
+                product_id=product_id, period=period,
+                closing_balance=current['closing_balance'] + net,
+                **{name: current[name] + entry[name] for name in entry},
+            ))
+        else:
+            summaries.append(LedgerPeriodSummary(
+                product_id=product_id, period=period,
+                closing_balance=(opening.get(product_id) or 0) + net, **entry,
+            ))
+    LedgerPeriodSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['product', 'period'],
+        update_fields=['received', 'issued', 'transactions', 'closing_balance'],
+        batch_size=1000,
+    )
+
+    # Late rows for an already summarised month shift every later balance
+    for start in range(0, len(product_ids), SUMMARY_UPDATE_BATCH_SIZE):
+        batch = product_ids[start:start + SUMMARY_UPDATE_BATCH_SIZE]
+        shift = Case(
+            *[When(product_id=pk, then=Value(totals[pk]['received'] - totals[pk]['issued'])) for pk in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        LedgerPeriodSummary.objects.filter(product_id__in=batch, period__gt=period).update(
+            closing_balance=F('closing_balance') + shift,
+        )
+
+
+def _archive_batch(period, upto, batch_size):
+    """
+    Move up to `batch_size` rows of one month. Returns the number moved.
+    """
+    start, end = _month_bounds(period)
+    with transaction.atomic():
+        rows = list(
+            InventoryTransaction.objects.filter(timestamp__gte=start, timestamp__lt=end, id__lte=upto)
+            .order_by('id').values(*LEDGER_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedTransaction.objects.bulk_create(
+            [ArchivedTransaction(period=period, **row) for row in rows], batch_size=1000,
+        )
+        InventoryTransaction.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        _summarise(period, rows)
+    return len(rows)
+
+
+def archive_ledger(keep_months=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Move ledger rows older than the hot window into the archive.
+    Returns {'cutoff': date, 'months': {period: rows moved}, 'rows': total}.
+    With dry_run=True, reports what would be moved without writing anything.
+    """
+    cutoff = archive_cutoff(keep_months)
+    cutoff_start = _month_bounds(cutoff)[0]
+    closed = InventoryTransaction.objects.filter(timestamp__lt=cutoff_start)
+    bounds = closed.aggregate(first=Min('timestamp'), upto=Max('id'))
+    report = {'cutoff': cutoff, 'months': {}, 'rows': 0}
+    if bounds['first'] is None:
+        return report
+
+    if dry_run:
+        for period in _periods(period_of(bounds['first'], 'month'), cutoff):
+            start, end = _month_bounds(period)
+            count = closed.filter(timestamp__gte=start, timestamp__lt=end).count()
+            if count:
+                report['months'][period] = count
+        report['rows'] = sum(report['months'].values())
+        return report
+
+    build_snapshots(upto=bounds['upto'])
+    catch_up()
+    upto = min(bounds['upto'], watermarks().get(LEDGER, 0))
+    for period in _periods(period_of(bounds['first'], 'month'), cutoff):
+        moved = 0
+        while True:
+            count = _archive_batch(period, upto, batch_size)
+            if not count:
+                break
+            moved += count
+        if moved:
+            report['months'][period] = moved
+    report['rows'] = sum(report['months'].values())
+    return report
+
+
+def _periods(first, cutoff):
+    period = first
+    while period < cutoff:
+        yield period
+        period = add_months(period, 1)
+
+
+def ledger_rows(product_id=None, since=None, until=None, fields=LEDGER_FIELDS, ordering=('id',)):
+    """
+    Ledger rows in [since, until) from the hot and archived tables, as dicts
+    of `fields`. Both sides are filtered before the UNION, so each uses its
+    own (product, timestamp) index.
+    """
+    def side(model):
+        queryset = model.objects.all()
+        if product_id is not None:
+            queryset = queryset.filter(product_id=product_id)
+        if since is not None:
+            queryset = queryset.filter(timestamp__gte=since)
+        if until is not None:
+            queryset = queryset.filter(timestamp__lt=until)
+        return queryset.order_by().values(*fields)
+
+    return side(ArchivedTransaction).union(side(InventoryTransaction), all=True).order_by(*ordering)
+
+
+def period_summaries(product_id):
+    """
+    Monthly totals and closing balances of a product's archived history.
+    """
+    return LedgerPeriodSummary.objects.filter(product_id=product_id).order_by('period').values(
+        'period', 'received', 'issued', 'transactions', 'closing_balance',
+    )
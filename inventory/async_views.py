@@ -0,0 +1,190 @@
+"""
+Async (ASGI) read endpoints.
+
+Async counterparts of the busiest read paths, written against Django's async
+ORM (aiterator, acount, aget) so that under an ASGI server one worker process
+can keep many slow dashboard and scanner clients in flight without holding a
+thread per request. Lists are streamed: rows are encoded and sent as they
+arrive from the database.
+
+Authentication is session based (await request.auser()); API clients that
+use HTTP Basic auth should call the synchronous endpoints instead.
+
+Routes (see urls.py):
+    GET /async/api/purchase-orders/?status=&page_size=&cursor=
+    GET /async/api/purchase-orders/{id}/
+    GET /async/api/products/{id}/transactions/?since=&until=
+    GET /async/api/products/availability/?sku=
+    GET /async/api/changes/stream/?since=&topic=
+"""
+from functools import wraps
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+from .archive import ledger_rows
+from .availability import AVAILABILITY_FIELDS, SKU_LIST_ERROR, availability_payload, parse_skus
+from .changes import (
+    STREAM_MAX_EVENTS, STREAM_MAX_SECONDS, STREAM_RETRY_MS, ChangeFeedError, parse_feed_params, stream_events,
+)
+from .exports import (
+    EXPORT_CHUNK_SIZE, TRANSACTION_CSV_HEADER, TRANSACTION_EXPORT_FIELDS, ExportFilterError, parse_bound,
+    purchase_order_document,
+)
+from .models import ChangeCursor, Product, PurchaseOrder, PurchaseOrderItem
+from .pagination import KeysetPagination
+
+encoder = DjangoJSONEncoder()
+
+
+def login_required_json(view):
+    """
+    Answer 403 in DRF's format unless the session user is authenticated.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def purchase_orders_with_items():
+    return PurchaseOrder.objects.select_related('supplier').prefetch_related(
+        Prefetch('items', queryset=PurchaseOrderItem.objects.order_by('id'))
+    )
+
+
+@login_required_json
+async def purchase_order_list(request):
+    """
+    Same parameters and response shape as GET /api/purchase-orders/, with
+    'next' sent after the streamed results.
+    """
+    paginator = KeysetPagination()
+    page_size = paginator.parse_page_size(request.GET)
+    try:
+        position = paginator.parse_cursor(request.GET.get(paginator.cursor_query_param))
+    except NotFound as exc:
+        return JsonResponse({'detail': str(exc.detail)}, status=404)
+    queryset = purchase_orders_with_items()
+    if request.GET.get('status'):
+        queryset = queryset.filter(status=request.GET['status'])
+    # One extra row tells whether there is a next page
+    rows = paginator.seek(queryset, position)[:page_size + 1].aiterator(chunk_size=page_size + 1)
+
+    async def body():
+        yield '{"results": ['
+        sent, last, has_more = 0, None, False
+        async for po in rows:
+            if sent == page_size:
+                has_more = True
+                break
+            yield (',' if sent else '') + encoder.encode(purchase_order_document(po))
+            sent, last = sent + 1, po
+        next_url = None
+        if has_more:
+            cursor = paginator.encode_cursor(last.created_at, last.pk)
+            next_url = replace_query_param(request.build_absolute_uri(), paginator.cursor_query_param, cursor)
+        yield '], "next": ' + encoder.encode(next_url) + '}'
+
+    return StreamingHttpResponse(body(), content_type='application/json')
+
+
+@login_required_json
+async def purchase_order_detail(request, pk):
+    try:
+        po = await purchase_orders_with_items().aget(pk=pk)
+    except PurchaseOrder.DoesNotExist:
+        return JsonResponse({'detail': 'No PurchaseOrder matches the given query.'}, status=404)
+    return JsonResponse(purchase_order_document(po))
+
+
+@login_required_json
+async def product_transactions(request, pk):
+    """
+    Ledger history of one product as NDJSON, oldest first, optionally limited
+    to [since, until). The row count is sent up front in X-Total-Count.
+    """
+    if not await Product.objects.filter(pk=pk).aexists():
+        return JsonResponse({'detail': 'No Product matches the given query.'}, status=404)
+    try:
+        since = parse_bound(request.GET.get('since'), 'since')
+        until = parse_bound(request.GET.get('until'), 'until')
+    except ExportFilterError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    # Hot and archived ledger rows
+    queryset = ledger_rows(pk, since, until, fields=TRANSACTION_EXPORT_FIELDS, ordering=('timestamp', 'id'))
+    total = await queryset.acount()
+    # values() rather than values_list(): the latter's iterator runs its query
+    # on the first call instead of on the first next(), i.e. in the event loop
+    rows = queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    async def lines():
+        async for row in rows:
+            yield encoder.encode(dict(zip(TRANSACTION_CSV_HEADER, row.values()))) + '\n'
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+    response['X-Total-Count'] = str(total)
+    return response
+
+
+@login_required_json
+async def product_availability(request):
+    """
+    Same as GET /api/products/availability/?sku=...
+    """
+    skus = parse_skus(request.GET.get('sku'))
+    if skus is None:
+        return JsonResponse({'error': SKU_LIST_ERROR}, status=400)
+    rows = [row async for row in Product.objects.filter(sku__in=skus).values(*AVAILABILITY_FIELDS).aiterator()]
+    return JsonResponse(availability_payload(skus, rows))
+
+
+@login_required_json
+async def change_stream(request):
+    """
+    The change feed as Server-Sent Events: one `id:`/`event:`/`data:` record
+    per change event, and a comment line as heartbeat while there is nothing
+    new. Resumes after the Last-Event-ID header a reconnecting EventSource
+    sends, else after ?since= or the ?consumer='s acknowledged cursor.
+
+    The stream ends after STREAM_MAX_SECONDS or STREAM_MAX_EVENTS and the
+    client reconnects, so no connection is held indefinitely. Under WSGI each
+    stream would pin a worker thread, so it answers 501 there.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'The event stream is only served under ASGI; long-poll /api/changes/ instead.'}, status=501,
+        )
+    try:
+        params = parse_feed_params(request.GET)
+    except ChangeFeedError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    since = params['since']
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    elif request.GET.get('consumer') and not request.GET.get('since'):
+        cursor = ChangeCursor.objects.filter(consumer=request.GET['consumer'])
+        since = await cursor.values_list('acked_id', flat=True).afirst() or 0
+
+    async def records():
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        async for event in stream_events(
+            since, params['topics'], params['limit'], max_seconds=STREAM_MAX_SECONDS, max_events=STREAM_MAX_EVENTS,
+        ):
+            if event is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"id: {event['id']}\nevent: {event['topic']}\ndata: {encoder.encode(event)}\n\n"
+
+    response = StreamingHttpResponse(records(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Let reverse proxies pass events through as they are sent
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,159 @@
+"""
+Maintained per-product on-order quantity.
+
+Product.on_order holds the units ordered but not yet received on purchase
+orders that are not Completed, so availability lookups read one row instead of
+summing open PO lines. Every code path that changes that sum posts the change
+through adjust_on_order() inside its own transaction:
+
+- PO creation (single, bulk and planned): + ordered - received per line
+- goods receipt: - received quantity
+- deletion of a PO that is not Completed: - remaining quantity
+
+Approval moves a PO from Pending to Approved; both count as open, so the
+aggregate is unchanged. Edits that can rewrite lines or status arbitrarily
+(admin, PUT/PATCH) call refresh_on_order() for the products involved, and
+verify_on_order()/rebuild_on_order() repair drift after raw SQL.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from .batches import product_batches
+from .cache import invalidate_products
+from .models import Product, PurchaseOrderItem
+from .rollups import schedule_catch_up
+
+# Maximum number of products touched by a single UPDATE statement
+ON_ORDER_UPDATE_BATCH_SIZE = 250
+
+# Products checked per batch by verify_on_order / rebuild_on_order
+DEFAULT_BATCH_SIZE = 1000
+
+# Upper bound on SKUs per availability request
+MAX_AVAILABILITY_SKUS = 500
+
+SKU_LIST_ERROR = f'Pass between 1 and {MAX_AVAILABILITY_SKUS} comma-separated SKUs in ?sku=.'
+
+# Columns read by availability lookups
+AVAILABILITY_FIELDS = ['id', 'sku', 'current_stock', 'on_order']
+
+
+def open_lines():
+    """
+    Line items of POs that are not Completed.
+    """
+    return PurchaseOrderItem.objects.exclude(purchase_order__status='Completed')
+
+
+def remaining_quantities(product_ids):
+    """
+    {product_id: open quantity} recomputed from the PO lines.
+    """
+    return dict(
+        open_lines().filter(product_id__in=product_ids)
+        .values('product_id')
+        .annotate(total=Sum(F('ordered_quantity') - F('received_quantity')))
+        .values_list('product_id', 'total')
+    )
+
+
+def open_quantity():
+    """
+    Subquery: open quantity of the outer product, recomputed from the PO lines.
+    """
+    return Coalesce(
+        Subquery(
+            open_lines().filter(product=OuterRef('pk'))
+            .values('product')
+            .annotate(total=Sum(F('ordered_quantity') - F('received_quantity')))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def adjust_on_order(changes):
+    """
+    Add (product_id, quantity) changes to Product.on_order.
+    Updates are applied in primary-key order so concurrent writers cannot deadlock.
+    """
+    deltas = {}
+    for product_id, quantity in changes:
+        deltas[product_id] = deltas.get(product_id, 0) + quantity
+    product_ids = sorted(pk for pk, delta in deltas.items() if delta)
+    with transaction.atomic():
+        for start in range(0, len(product_ids), ON_ORDER_UPDATE_BATCH_SIZE):
+            batch = product_ids[start:start + ON_ORDER_UPDATE_BATCH_SIZE]
+            delta = Case(
+                *[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            Product.objects.filter(pk__in=batch).update(on_order=F('on_order') + delta)
+    invalidate_products(product_ids)
+
+
+def order_lines_placed(items):
+    """
+    Account for newly created PurchaseOrderItem objects.
+    """
+    adjust_on_order((item.product_id, item.ordered_quantity - item.received_quantity) for item in items)
+    # Ordered units feed the supplier rollups
+    schedule_catch_up()
+
+
+def refresh_on_order(product_ids):
+    """
+    Recompute on_order from the PO lines for the given products (one UPDATE).
+    """
+    product_ids = sorted(set(product_ids))
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(on_order=open_quantity())
+        invalidate_products(product_ids)
+
+
+def verify_on_order(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield (product_id, on_order, open quantity) for every product whose
+    stored aggregate differs from the PO lines.
+    """
+    for batch in product_batches(batch_size):
+        actual = remaining_quantities(batch)
+        for pk, stored in Product.objects.filter(pk__in=batch).values_list('pk', 'on_order'):
+            if stored != actual.get(pk, 0):
+                yield pk, stored, actual.get(pk, 0)
+
+
+def rebuild_on_order(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recompute on_order for every product, batch by batch.
+    """
+    for batch in product_batches(batch_size):
+        with transaction.atomic():
+            refresh_on_order(batch)
+
+
+def parse_skus(value):
+    """
+    SKUs from a comma-separated ?sku= value, or None if there are none or too many.
+    """
+    skus = [sku for sku in (value or '').split(',') if sku]
+    if not skus or len(skus) > MAX_AVAILABILITY_SKUS:
+        return None
+    return skus
+
+
+def availability_payload(skus, rows):
+    """
+    Response body for an availability lookup, in request order.
+    `rows` are dicts of AVAILABILITY_FIELDS for the SKUs that exist.
+    """
+    found = {row['sku']: row for row in rows}
+    return {
+        'results': [
+            dict(found[sku], projected_stock=found[sku]['current_stock'] + found[sku]['on_order'])
+            for sku in skus if sku in found
+        ],
+        'missing': [sku for sku in skus if sku not in found],
+    }
@@ -0,0 +1,20 @@
+"""
+Helpers for maintenance jobs that walk every product in batches.
+"""
+from .models import Product
+
+
+def product_batches(batch_size):
+    """
+    Yield lists of at most `batch_size` product IDs in primary-key order.
+    Each batch is a keyset range read, so late batches cost the same as early ones.
+    """
+    last_pk = 0
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
@@ -0,0 +1,449 @@
+"""
+API load-benchmark harness.
+
+Drives the purchase-order endpoints through Django's test client against the
+current database (typically one filled by generate_test_data) and records
+latency percentiles and queries per request for every scenario. Reports are
+plain JSON so successive releases can be compared.
+
+Scenarios run in order and feed each other: 'create' makes Pending POs,
+'approve' approves them and 'receive' receives their goods.
+
+run_concurrency_benchmark() compares throughput of the PO list under many
+concurrent clients: synchronous views on a thread per client (WSGI), the same
+views under ASGI, and the async views of async_views.py under ASGI.
+
+run_write_benchmark() fires parallel receive calls at a few shared SKUs to
+measure the database profile (SQLite pragmas, PostgreSQL pooling) under
+write contention; run it once per profile and compare the reports.
+
+run_serializer_benchmark() compares building one large page of PO payloads
+with PurchaseOrderSerializer and with the lean .values() path of payloads.py,
+and encoding it with each available renderer.
+"""
+import asyncio
+import math
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .cache import invalidate_purchase_orders
+from .models import Product, PurchaseOrder, PurchaseOrderItem, Supplier
+from .payloads import build_purchase_orders
+from .renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from .serializers import PurchaseOrderSerializer
+
+User = get_user_model()
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def benchmark_host():
+    """
+    A host name accepted by ALLOWED_HOSTS ('localhost' covers DEBUG and '*').
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def summarize(timings, queries, errors):
+    """
+    Reduce per-request samples to the figures stored in the report.
+    """
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+        'p95_ms': round(percentile(timings, 95), 3) if timings else None,
+        'mean_ms': round(sum(timings) / len(timings), 3) if timings else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+
+class BenchmarkRun:
+    """
+    State shared by the scenarios of one run.
+    """
+    def __init__(self, iterations, seed=0, page_size=50):
+        self.iterations = iterations
+        self.page_size = page_size
+        self.rng = Random(seed)
+        self.client = Client(SERVER_NAME=benchmark_host())
+        self.user = self.benchmark_user()
+        self.client.force_login(self.user)
+        self.created_ids = []
+
+    def benchmark_user(self):
+        """
+        A Manager so that the approve scenario is allowed.
+        """
+        user = benchmark_user()
+        manager, _ = Group.objects.get_or_create(name='Manager')
+        user.groups.add(manager)
+        return user
+
+    def measure(self, requests):
+        """
+        Time each (method, path, payload) request, capturing its queries.
+        """
+        timings, queries, errors = [], [], 0
+        for method, path, payload in requests:
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                if method == 'get':
+                    response = self.client.get(path)
+                else:
+                    response = self.client.post(path, payload, content_type='application/json')
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+            timings.append(elapsed)
+            queries.append(len(ctx.captured_queries))
+            if response.status_code >= 400:
+                errors += 1
+        return summarize(timings, queries, errors)
+
+
+def scenario_list(run):
+    return run.measure(
+        ('get', f'/api/purchase-orders/?page_size={run.page_size}', None) for _ in range(run.iterations)
+    )
+
+
+def scenario_retrieve(run):
+    ids = list(PurchaseOrder.objects.order_by('-id').values_list('id', flat=True)[:run.iterations])
+    return run.measure(('get', f'/api/purchase-orders/{pk}/', None) for pk in ids)
+
+
+def scenario_create(run):
+    suppliers = list(Supplier.objects.values_list('id', flat=True)[:100])
+    products = list(Product.objects.values_list('id', flat=True)[:1000])
+    if not suppliers or not products:
+        return None
+
+    def requests():
+        for _ in range(run.iterations):
+            items = [
+                {'product': pk, 'ordered_quantity': run.rng.randint(1, 20)}
+                for pk in set(run.rng.choices(products, k=run.rng.randint(1, 5)))
+            ]
+            yield 'post', '/api/purchase-orders/', {'supplier': run.rng.choice(suppliers), 'items': items}
+
+    started_at = timezone.now()
+    result = run.measure(requests())
+    run.created_ids = list(
+        PurchaseOrder.objects.filter(created_by=run.user, created_at__gte=started_at).values_list('id', flat=True)
+    )
+    return result
+
+
+def scenario_approve(run):
+    return run.measure(('post', f'/api/purchase-orders/{pk}/approve/', {}) for pk in run.created_ids)
+
+
+def scenario_receive(run):
+    lines = {}
+    for item_id, po_id, ordered in PurchaseOrderItem.objects.filter(
+        purchase_order_id__in=run.created_ids
+    ).values_list('id', 'purchase_order_id', 'ordered_quantity'):
+        lines.setdefault(po_id, []).append({'id': item_id, 'received_quantity': ordered})
+    return run.measure(
+        ('post', f'/api/purchase-orders/{pk}/receive/', {'items': items}) for pk, items in lines.items()
+    )
+
+
+# Scenario name -> callable(run) returning a summary dict (or None if skipped)
+SCENARIOS = {
+    'list': scenario_list,
+    'retrieve': scenario_retrieve,
+    'create': scenario_create,
+    'approve': scenario_approve,
+    'receive': scenario_receive,
+}
+
+
+def run_benchmarks(iterations=50, scenarios=None, seed=0, page_size=50, keep=False):
+    """
+    Run the named scenarios (default: all) and return the report dict.
+    Everything runs in one transaction that is rolled back unless keep=True,
+    so the benchmark leaves the database as it found it.
+    """
+    names = scenarios or list(SCENARIOS)
+    results = {}
+    with transaction.atomic():
+        run = BenchmarkRun(iterations, seed=seed, page_size=page_size)
+        for name in names:
+            results[name] = SCENARIOS[name](run)
+        if not keep:
+            transaction.set_rollback(True)
+    if not keep:
+        # Payloads of the rolled-back POs may have been cached during the run
+        invalidate_purchase_orders(run.created_ids)
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'dataset': {
+            'suppliers': Supplier.objects.count(),
+            'products': Product.objects.count(),
+            'purchase_orders': PurchaseOrder.objects.count(),
+        },
+        'iterations': iterations,
+        'scenarios': results,
+    }
+
+
+def benchmark_user():
+    """
+    The benchmark user, created if needed (outside any benchmark transaction).
+    """
+    user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+    return user
+
+
+def _throughput(timings, errors, seconds, clients):
+    result = summarize(timings, [], errors)
+    del result['queries_per_request'], result['max_queries']
+    result['clients'] = clients
+    result['requests_per_second'] = round(len(timings) / seconds, 1) if seconds else None
+    return result
+
+
+def _wsgi_clients(path, user, clients, requests_per_client):
+    """
+    Synchronous views, one thread (and database connection) per client.
+    """
+    def client_loop():
+        client = Client(SERVER_NAME=benchmark_host())
+        client.force_login(user)
+        timings, errors = [], 0
+        try:
+            for _ in range(requests_per_client):
+                started = time.perf_counter()
+                response = client.get(path)
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+        finally:
+            connections.close_all()
+        return timings, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: client_loop(), range(clients)))
+    seconds = time.perf_counter() - started
+    return _throughput([t for timings, _ in results for t in timings], sum(e for _, e in results), seconds, clients)
+
+
+async def _asgi_clients(path, session_cookie, clients, requests_per_client):
+    """
+    Concurrent clients on one event loop, going through the ASGI handler.
+    """
+    timings, errors = [], 0
+
+    async def client_loop():
+        nonlocal errors
+        client = AsyncClient(headers={'host': benchmark_host()})
+        client.cookies[settings.SESSION_COOKIE_NAME] = session_cookie
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            response = await client.get(path)
+            if getattr(response, 'streaming', False):
+                async for _ in response.streaming_content:
+                    pass
+            timings.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(clients)))
+    return _throughput(timings, errors, time.perf_counter() - started, clients)
+
+
+def run_concurrency_benchmark(clients=20, requests_per_client=10, page_size=50):
+    """
+    Throughput of the PO list with `clients` concurrent clients, for
+    - wsgi: GET /api/purchase-orders/ on a thread per client
+    - asgi_sync_view: the same view through the ASGI handler
+    - asgi_async_view: GET /async/api/purchase-orders/ through the ASGI handler
+    Read-only; nothing is written except the benchmark user's session.
+    """
+    user = benchmark_user()
+    login = Client(SERVER_NAME=benchmark_host())
+    login.force_login(user)
+    session_cookie = login.cookies[settings.SESSION_COOKIE_NAME].value
+    sync_path = f'/api/purchase-orders/?page_size={page_size}'
+    async_path = f'/async/api/purchase-orders/?page_size={page_size}'
+    # async_to_sync keeps thread-sensitive ORM calls on this thread's connection
+    return {
+        'wsgi': _wsgi_clients(sync_path, user, clients, requests_per_client),
+        'asgi_sync_view': async_to_sync(_asgi_clients)(sync_path, session_cookie, clients, requests_per_client),
+        'asgi_async_view': async_to_sync(_asgi_clients)(async_path, session_cookie, clients, requests_per_client),
+    }
+
+
+def database_profile():
+    """
+    Settings that matter for write concurrency, as seen by a live connection.
+    """
+    db = settings.DATABASES['default']
+    profile = {'vendor': connection.vendor, 'conn_max_age': db.get('CONN_MAX_AGE', 0)}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                profile[pragma] = cursor.fetchone()[0]
+    else:
+        profile['pool'] = bool(db.get('OPTIONS', {}).get('pool'))
+    return profile
+
+
+def run_write_benchmark(threads=8, receipts_per_thread=10, skus=5):
+    """
+    `threads` clients receive goods in parallel, each against its own
+    Approved POs whose lines all hit the same `skus` products, so every
+    receipt contends for the same product rows. The data is committed (the
+    threads need to see it) and deleted again afterwards.
+    """
+    user = benchmark_user()
+    supplier = Supplier.objects.create(name='Write benchmark supplier', contact_email='bench@example.com')
+    products = Product.objects.bulk_create([
+        Product(name=f'Write benchmark {i}', sku=f'WRITE-BENCH-{i:03d}', price=1) for i in range(skus)
+    ])
+    try:
+        orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(supplier=supplier, status='Approved', created_by=user)
+            for _ in range(threads * receipts_per_thread)
+        ])
+        PurchaseOrderItem.objects.bulk_create([
+            PurchaseOrderItem(purchase_order=po, product=product, ordered_quantity=5)
+            for po in orders for product in products
+        ])
+        lines = {}
+        for item_id, po_id in PurchaseOrderItem.objects.filter(purchase_order__in=orders).values_list(
+            'id', 'purchase_order_id'
+        ):
+            lines.setdefault(po_id, []).append({'id': item_id, 'received_quantity': 5})
+
+        def client_loop(po_ids):
+            client = Client(SERVER_NAME=benchmark_host())
+            client.force_login(user)
+            timings, errors = [], 0
+            try:
+                for po_id in po_ids:
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(f'/api/purchase-orders/{po_id}/receive/',
+                                               {'items': lines[po_id]}, content_type='application/json')
+                        errors += response.status_code >= 400
+                    except Exception:
+                        # e.g. OperationalError: database is locked
+                        errors += 1
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return timings, errors
+
+        po_ids = [po.id for po in orders]
+        batches = [po_ids[i::threads] for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(client_loop, batches))
+        seconds = time.perf_counter() - started
+
+        result = _throughput(
+            [t for timings, _ in results for t in timings], sum(e for _, e in results), seconds, threads
+        )
+        # Every successful receipt adds 5 units to every product; none may be lost
+        stocks = set(Product.objects.filter(pk__in=[p.pk for p in products]).values_list('current_stock', flat=True))
+        result['stock_consistent'] = stocks == {5 * (len(orders) - result['errors'])}
+        return {'profile': database_profile(), 'receive': result}
+    finally:
+        Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+        supplier.delete()
+
+
+def _fastest_ms(func, repeat):
+    """
+    Best wall time of `repeat` calls, in ms, and the last call's result.
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 3), result
+
+
+def run_serializer_benchmark(count=10000, repeat=3, sparse_fields=('id', 'status', 'supplier')):
+    """
+    Time one page of the `count` newest POs (queries included), built
+    - serializer: PurchaseOrderSerializer over a select_related /
+      prefetch_related queryset (how the payload cache loaded misses before);
+    - values: payloads.build_purchase_orders;
+    - values_sparse: the same with only `sparse_fields`;
+    then encoded with DRF's JSONRenderer and, when installed, orjson and
+    MessagePack. Read-only.
+    """
+    pks = list(PurchaseOrder.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[:count])
+    if not pks:
+        return None
+    queryset = PurchaseOrder.objects.select_related('supplier').prefetch_related('items').order_by('-created_at', '-id')
+    build = {
+        'serializer': lambda: PurchaseOrderSerializer(queryset[:count], many=True).data,
+        'values': lambda: build_purchase_orders(pks),
+        'values_sparse': lambda: build_purchase_orders(pks, list(sparse_fields)),
+    }
+    build_ms, payloads = {}, {}
+    for name, func in build.items():
+        build_ms[name], payloads[name] = _fastest_ms(func, repeat)
+
+    renderers = {'json': JSONRenderer()}
+    if orjson is not None:
+        renderers['orjson'] = ORJSONRenderer()
+    if msgpack is not None:
+        renderers['msgpack'] = MessagePackRenderer()
+    render_ms, render_bytes = {}, {}
+    for name, renderer in renderers.items():
+        render_ms[name], body = _fastest_ms(lambda: renderer.render(payloads['values']), repeat)
+        render_bytes[name] = len(body)
+
+    return {
+        'pos': len(pks),
+        'items': sum(len(payload['items']) for payload in payloads['values']),
+        'build_ms': build_ms,
+        'speedup': round(build_ms['serializer'] / build_ms['values'], 2) if build_ms['values'] else None,
+        # Both paths must produce the same payloads
+        'payloads_match': [dict(payload) for payload in payloads['serializer']] == payloads['values'],
+        'render_ms': render_ms,
+        'render_bytes': render_bytes,
+    }
@@ -0,0 +1,106 @@
+"""
+Query side of the server-rendered purchase-order board.
+
+The board is keyset-paginated like the API: each page is a range scan on an
+indexed column (created_at, or the primary key) continuing after the last row
+of the previous page, so deep pages are as cheap as the first. Filters
+(status, supplier) match the leading columns of po_status_created_idx and
+po_supplier_created_idx.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .models import PurchaseOrder
+
+# ?sort= value -> (column, descending)
+BOARD_SORTS = {
+    '-created_at': ('created_at', True),
+    'created_at': ('created_at', False),
+    '-id': ('id', True),
+    'id': ('id', False),
+}
+DEFAULT_SORT = '-created_at'
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class BoardFilterError(ValueError):
+    """
+    Raised for an unparseable board cursor.
+    """
+
+
+def encode_cursor(po, column):
+    value = po.created_at.isoformat() if column == 'created_at' else str(po.pk)
+    return base64.urlsafe_b64encode(f'{value}|{po.pk}'.encode()).decode()
+
+
+def decode_cursor(encoded, column):
+    try:
+        value, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+        pk = int(pk)
+        value = parse_datetime(value) if column == 'created_at' else int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BoardFilterError('Invalid cursor')
+    if value is None:
+        raise BoardFilterError('Invalid cursor')
+    return value, pk
+
+
+def board_page(params):
+    """
+    One page of the board for the request's query parameters.
+    Returns a dict with the orders, the cursor of the next page (or None)
+    and the normalised filters to render back into the form.
+    """
+    sort = params.get('sort') if params.get('sort') in BOARD_SORTS else DEFAULT_SORT
+    column, descending = BOARD_SORTS[sort]
+    try:
+        page_size = max(1, min(int(params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    status = params.get('status') if params.get('status') in dict(PurchaseOrder.STATUS_CHOICES) else ''
+    try:
+        supplier = int(params.get('supplier') or 0) or None
+    except ValueError:
+        supplier = None
+
+    queryset = PurchaseOrder.objects.select_related('supplier').only(
+        'id', 'status', 'created_at', 'updated_at', 'supplier__name'
+    )
+    if status:
+        queryset = queryset.filter(status=status)
+    if supplier:
+        queryset = queryset.filter(supplier_id=supplier)
+
+    prefix = '-' if descending else ''
+    queryset = queryset.order_by(f'{prefix}{column}', f'{prefix}id')
+    if params.get('cursor'):
+        value, pk = decode_cursor(params['cursor'], column)
+        after = 'lt' if descending else 'gt'
+        if column == 'id':
+            queryset = queryset.filter(**{f'id__{after}': pk})
+        else:
+            # (created_at, id) beyond the cursor, written so the index range-scans
+            queryset = queryset.filter(
+                Q(**{f'created_at__{after}e': value})
+                & (Q(**{f'created_at__{after}': value}) | Q(**{f'id__{after}': pk}))
+            )
+
+    # One extra row tells whether there is a next page
+    orders = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = encode_cursor(orders[-1], column)
+    return {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'sort': sort,
+        'status': status,
+        'supplier': supplier,
+        'page_size': page_size,
+    }
@@ -0,0 +1,192 @@
+"""
+Read-through cache of serialized product and purchase-order payloads.
+
+Payloads are stored in Django's cache framework (the local-memory backend is
+an LRU with per-entry TTL) under keys built from the object id and
+PAYLOAD_VERSION, which is bumped whenever a serializer's output changes so old
+entries are never served in the new shape. Completed POs no longer change and
+are kept for INVENTORY_CACHE_COMPLETED_TIMEOUT seconds instead of the default.
+
+Entries are invalidated precisely:
+- post_save / post_delete of Product, PurchaseOrder, PurchaseOrderItem and
+  Supplier (see signals.py);
+- explicitly by the bulk writers that bypass signals (stock movements, the
+  reorder worklist sync, on-order maintenance, the catalogue importer).
+Invalidation happens immediately and again when the surrounding transaction
+commits, so a read racing the write cannot re-cache the old state.
+
+PO payloads are loaded from .values() rows by payloads.build_purchase_orders,
+in the shape of PurchaseOrderSerializer, without instantiating models. A
+sparse fieldset is served from cached payloads where present; its misses are
+read with only the requested columns.
+
+Hit/miss counters are kept per process and reported by cache_stats().
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+from django.utils.module_loading import import_string
+from .models import Product, PurchaseOrder
+from .payloads import build_purchase_orders, sparse
+
+# Bump when a cached serializer's output changes shape
+PAYLOAD_VERSION = 1
+
+# Seconds a payload that can no longer change is kept (Completed POs)
+DEFAULT_COMPLETED_TIMEOUT = 24 * 60 * 60
+
+
+class PayloadCache:
+    """
+    Cache of one serializer's output, keyed by object id.
+    """
+    def __init__(self, name, serializer_path=None, queryset=None):
+        self.name = name
+        # Dotted path, imported lazily: the serializers' module imports the
+        # services that invalidate this cache
+        self.serializer_path = serializer_path
+        # Callable returning the queryset misses are loaded from
+        self.queryset = queryset
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def serializer_class(self):
+        return import_string(self.serializer_path)
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+    def key(self, pk):
+        return f'inventory:{self.name}:v{PAYLOAD_VERSION}:{pk}'
+
+    def timeout(self, payload):
+        """
+        Cache timeout for a payload; None means the backend default.
+        """
+        return None
+
+    def load(self, pks):
+        """
+        Payloads of the given ids by id, from the database.
+        """
+        return {obj.pk: self.serializer_class(obj).data for obj in self.queryset().filter(pk__in=pks)}
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _cached(self, pks):
+        """
+        Cached payloads of `pks` by id, and the ids that missed.
+        """
+        keys = {self.key(pk): pk for pk in pks}
+        found = {keys[key]: payload for key, payload in self.backend.get_many(list(keys)).items()}
+        missing = [pk for pk in pks if pk not in found]
+        self._count(len(pks) - len(missing), len(missing))
+        return found, missing
+
+    def get_many(self, pks):
+        """
+        Payloads for the given ids, in the same order; ids that do not exist
+        are left out. Misses are loaded with one queryset and cached.
+        """
+        pks = list(pks)
+        found, missing = self._cached(pks)
+        if missing:
+            by_timeout = {}
+            for pk, payload in self.load(missing).items():
+                found[pk] = payload
+                by_timeout.setdefault(self.timeout(payload), {})[self.key(pk)] = payload
+            for timeout, entries in by_timeout.items():
+                if timeout is None:
+                    self.backend.set_many(entries)
+                else:
+                    self.backend.set_many(entries, timeout=timeout)
+        return [found[pk] for pk in pks if pk in found]
+
+    def get(self, pk):
+        """
+        Payload of one object; raises Http404 if it does not exist.
+        """
+        payloads = self.get_many([pk])
+        if not payloads:
+            raise Http404
+        return payloads[0]
+
+    def invalidate(self, pks):
+        keys = [self.key(pk) for pk in set(pks)]
+        if not keys:
+            return
+        self.backend.delete_many(keys)
+        transaction.on_commit(lambda: self.backend.delete_many(keys))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+class PurchaseOrderPayloadCache(PayloadCache):
+    def load(self, pks):
+        return {payload['id']: payload for payload in build_purchase_orders(pks)}
+
+    def get_many(self, pks, fields=None):
+        """
+        As PayloadCache.get_many; with `fields` (see payloads.parse_fields),
+        hits are cut down to those fields and misses read only their columns.
+        Such partial payloads are not cached.
+        """
+        if fields is None:
+            return super().get_many(pks)
+        pks = list(pks)
+        found, missing = self._cached(pks)
+        if missing:
+            # 'id' places the loaded payloads; sparse() drops it if not requested
+            columns = ['id'] + [field for field in fields if field != 'id']
+            found.update((payload['id'], payload) for payload in build_purchase_orders(missing, columns))
+        return sparse([found[pk] for pk in pks if pk in found], fields)
+
+    def timeout(self, payload):
+        if payload['status'] == 'Completed':
+            return getattr(settings, 'INVENTORY_CACHE_COMPLETED_TIMEOUT', DEFAULT_COMPLETED_TIMEOUT)
+        return None
+
+
+purchase_order_payloads = PurchaseOrderPayloadCache('purchase-order')
+product_payloads = PayloadCache('product', 'inventory.serializers.ProductSerializer', lambda: Product.objects.all())
+
+
+def invalidate_products(pks):
+    product_payloads.invalidate(pks)
+
+
+def invalidate_purchase_orders(pks):
+    purchase_order_payloads.invalidate(pks)
+
+
+def invalidate_suppliers(pks):
+    """
+    PO payloads embed the supplier name, so drop every PO of these suppliers.
+    """
+    pks = list(pks)
+    if pks:
+        invalidate_purchase_orders(PurchaseOrder.objects.filter(supplier_id__in=pks).values_list('pk', flat=True))
+
+
+def cache_stats():
+    """
+    Hit/miss counters of every payload cache in this process.
+    """
+    stats = {}
+    for payload_cache in (purchase_order_payloads, product_payloads):
+        counts = payload_cache.stats()
+        total = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / total, 4) if total else None
+        stats[payload_cache.name] = counts
+    return stats
@@ -0,0 +1,214 @@
+"""
+Change feed: a transactional outbox of purchase-order and inventory changes.
+
+Writers append ChangeEvent rows in the same transaction as the change itself,
+so an event is visible exactly when its change is committed. Event IDs are the
+sequence consumers page through (GET /api/changes/?since=<id>):
+
+- 'purchase_order': a PO was created, saved or changed status
+  ({"status": ..., "supplier": id}), or deleted ({"deleted": true});
+- 'receipt': units received against a PO line
+  ({"purchase_order": id, "product": id, "quantity": n, "received_quantity": n});
+- 'ledger': an InventoryTransaction row ({"product": id, "quantity": n, "reference": ...}).
+
+Consumers acknowledge what they have processed with ack(); compact() deletes
+the events every registered consumer has acknowledged.
+
+On databases where IDs can commit out of order (PostgreSQL sequences), set
+INVENTORY_CHANGES_SETTLE_SECONDS so that events are only served once older
+than any transaction still in flight; otherwise a consumer could move its
+cursor past an event that commits later.
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+from .models import ChangeCursor, ChangeEvent
+
+# Events returned per page by default, and at most
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 1000
+
+# Longest long-poll wait, and how often a waiting request re-checks
+MAX_WAIT_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.5
+
+# An event stream is closed after this long or this many events; the client
+# reconnects with Last-Event-ID after STREAM_RETRY_MS
+STREAM_MAX_SECONDS = 300
+STREAM_MAX_EVENTS = 10000
+STREAM_RETRY_MS = 1000
+
+# Events deleted per statement when compacting
+COMPACT_BATCH_SIZE = 5000
+
+# Columns served to consumers
+EVENT_FIELDS = ['id', 'topic', 'object_id', 'data', 'created_at']
+
+TOPICS = [topic for topic, _ in ChangeEvent.TOPIC_CHOICES]
+
+
+class ChangeFeedError(ValueError):
+    """
+    Raised for an invalid change-feed query parameter.
+    """
+
+
+def _non_negative(params, name, default, cast=int):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ChangeFeedError(f"{name} must be a non-negative number.")
+    if not value >= 0:
+        raise ChangeFeedError(f"{name} must be a non-negative number.")
+    return value
+
+
+def parse_feed_params(params):
+    """
+    Validate since / limit / topic / wait query parameters.
+    """
+    limit = _non_negative(params, 'limit', DEFAULT_BATCH_SIZE)
+    if not 1 <= limit <= MAX_BATCH_SIZE:
+        raise ChangeFeedError(f"limit must be between 1 and {MAX_BATCH_SIZE}.")
+    topics = [topic for topic in params.get('topic', '').split(',') if topic]
+    unknown = sorted(set(topics) - set(TOPICS))
+    if unknown:
+        raise ChangeFeedError(f"Unknown topics {unknown}; expected some of {TOPICS}.")
+    return {
+        'since': _non_negative(params, 'since', 0),
+        'limit': limit,
+        'topics': topics,
+        'wait': min(_non_negative(params, 'wait', 0, cast=float), MAX_WAIT_SECONDS),
+    }
+
+
+def settle_seconds():
+    return getattr(settings, 'INVENTORY_CHANGES_SETTLE_SECONDS', 0)
+
+
+def record(topic, events):
+    """
+    Append (object_id, data) events of one topic.
+    """
+    ChangeEvent.objects.bulk_create(
+        [ChangeEvent(topic=topic, object_id=object_id, data=data) for object_id, data in events],
+        batch_size=1000,
+    )
+
+
+def record_purchase_orders(rows):
+    """
+    Status events for (po_id, status, supplier_id) rows.
+    """
+    record('purchase_order', ((pk, {'status': status, 'supplier': supplier}) for pk, status, supplier in rows))
+
+
+def events(since=0, limit=DEFAULT_BATCH_SIZE, topics=None):
+    """
+    Queryset of the events after `since`, oldest first, as dicts of EVENT_FIELDS.
+    """
+    queryset = ChangeEvent.objects.filter(id__gt=since)
+    if topics:
+        queryset = queryset.filter(topic__in=topics)
+    if settle_seconds():
+        queryset = queryset.filter(created_at__lte=timezone.now() - timedelta(seconds=settle_seconds()))
+    return queryset.order_by('id').values(*EVENT_FIELDS)[:limit]
+
+
+def page(rows, since, limit):
+    """
+    Response body for up to limit + 1 fetched rows: the events, the cursor to
+    continue from and whether more events are already waiting.
+    """
+    rows = list(rows)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {'events': rows, 'next': rows[-1]['id'] if rows else since, 'more': more}
+
+
+def wait_for_events(since=0, limit=DEFAULT_BATCH_SIZE, topics=None, wait=0):
+    """
+    Next page of events; with `wait`, block up to that many seconds for the
+    first one to arrive (long polling).
+    """
+    deadline = time.monotonic() + min(wait, MAX_WAIT_SECONDS)
+    while True:
+        rows = list(events(since, limit + 1, topics))
+        if rows or time.monotonic() >= deadline:
+            return page(rows, since, limit)
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def stream_events(since=0, topics=None, limit=DEFAULT_BATCH_SIZE, max_seconds=None, max_events=None):
+    """
+    Yield events after `since`, polling every POLL_INTERVAL_SECONDS once caught
+    up, until `max_seconds` have passed or `max_events` were yielded (forever
+    when None). Yields None after each empty poll (heartbeat opportunity).
+    """
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    sent = 0
+    while True:
+        batch = limit if max_events is None else min(limit, max_events - sent)
+        rows = [row async for row in events(since, batch, topics).aiterator()]
+        for row in rows:
+            since = row['id']
+            yield row
+        sent += len(rows)
+        if max_events is not None and sent >= max_events:
+            return
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if len(rows) < batch:
+            yield None
+            pause = POLL_INTERVAL_SECONDS
+            if deadline is not None:
+                pause = min(pause, max(deadline - time.monotonic(), 0))
+            await asyncio.sleep(pause)
+
+
+def latest_id():
+    return ChangeEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def ack(consumer, event_id):
+    """
+    Record that `consumer` has processed every event up to `event_id`.
+    Cursors only move forward. Returns the consumer's acknowledged ID.
+    """
+    updated = ChangeCursor.objects.filter(consumer=consumer, acked_id__lt=event_id).update(
+        acked_id=event_id, updated_at=timezone.now(),
+    )
+    if updated:
+        return event_id
+    cursor, _ = ChangeCursor.objects.get_or_create(consumer=consumer, defaults={'acked_id': event_id})
+    return cursor.acked_id
+
+
+def acked_id(consumer):
+    """
+    The consumer's acknowledged ID, or None for an unknown consumer.
+    """
+    return ChangeCursor.objects.filter(consumer=consumer).values_list('acked_id', flat=True).first()
+
+
+def compact(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Delete the events every consumer has acknowledged; with no registered
+    consumer nothing is deleted. Returns the number of events deleted.
+    """
+    upto = ChangeCursor.objects.aggregate(upto=Min('acked_id'))['upto']
+    if not upto:
+        return 0
+    deleted = 0
+    while True:
+        ids = list(ChangeEvent.objects.filter(id__lte=upto).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += ChangeEvent.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,189 @@
+"""
+Streaming exports of purchase orders and the inventory ledger.
+
+Rows are read with QuerySet.iterator(chunk_size=...) (a server-side cursor on
+PostgreSQL) and written straight into a StreamingHttpResponse, so memory use
+does not depend on the number of rows and the first bytes go out as soon as
+the first chunk has been fetched.
+"""
+import csv
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .archive import ledger_rows
+from .models import PurchaseOrder, PurchaseOrderItem
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+PURCHASE_ORDER_CSV_HEADER = [
+    'po_id', 'supplier_id', 'supplier_name', 'status', 'created_at', 'approved_at',
+    'item_id', 'product_id', 'ordered_quantity', 'received_quantity',
+]
+TRANSACTION_CSV_HEADER = ['id', 'product_id', 'sku', 'quantity', 'timestamp', 'reference']
+TRANSACTION_EXPORT_FIELDS = ['id', 'product_id', 'product__sku', 'quantity', 'timestamp', 'reference']
+
+
+class ExportFilterError(ValueError):
+    """
+    Raised for an unparseable export filter value.
+    """
+
+
+class Echo:
+    """
+    File-like object whose write() hands the value back, so csv.writer
+    produces strings that can be yielded to a StreamingHttpResponse.
+    """
+    def write(self, value):
+        return value
+
+
+def parse_bound(value, name):
+    """
+    Parse a since/until filter: an ISO datetime, or a date meaning midnight.
+    Naive values are taken in the current time zone.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportFilterError(f"{name} must be an ISO 8601 date or datetime.")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _date_range(queryset, field, since, until):
+    """
+    Restrict `field` to [since, until).
+    """
+    if since:
+        queryset = queryset.filter(**{f'{field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{field}__lt': until})
+    return queryset
+
+
+def purchase_orders_for_export(since=None, until=None, status=None):
+    """
+    Purchase orders with supplier and items, streamed in chunks. Items are
+    prefetched per chunk, so each chunk costs two queries.
+    """
+    queryset = PurchaseOrder.objects.select_related('supplier').prefetch_related(
+        Prefetch('items', queryset=PurchaseOrderItem.objects.order_by('id'))
+    ).order_by('id')
+    if status:
+        queryset = queryset.filter(status=status)
+    queryset = _date_range(queryset, 'created_at', since, until)
+    return queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def transactions_for_export(since=None, until=None):
+    """
+    Ledger rows, archived ones included, as tuples in TRANSACTION_CSV_HEADER
+    order, streamed in chunks.
+    """
+    rows = ledger_rows(since=since, until=until, fields=TRANSACTION_EXPORT_FIELDS)
+    return (tuple(row.values()) for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE))
+
+
+def _iso(value):
+    return value.isoformat() if value else ''
+
+
+def purchase_order_csv_rows(orders):
+    """
+    One CSV row per line item; a PO without items gets one row with empty item columns.
+    """
+    for po in orders:
+        head = [po.id, po.supplier_id, po.supplier.name, po.status, _iso(po.created_at), _iso(po.approved_at)]
+        items = po.items.all()
+        if not items:
+            yield head + ['', '', '', '']
+        for item in items:
+            yield head + [item.id, item.product_id, item.ordered_quantity, item.received_quantity]
+
+
+def purchase_order_document(po):
+    """
+    A PO with its items nested, in the shape of PurchaseOrderSerializer.
+    """
+    return {
+        'id': po.id,
+        'supplier': po.supplier_id,
+        'supplier_name': po.supplier.name,
+        'status': po.status,
+        'created_at': po.created_at,
+        'approved_at': po.approved_at,
+        'items': [
+            {
+                'id': item.id,
+                'product': item.product_id,
+                'ordered_quantity': item.ordered_quantity,
+                'received_quantity': item.received_quantity,
+            }
+            for item in po.items.all()
+        ],
+    }
+
+
+def purchase_order_documents(orders):
+    for po in orders:
+        yield purchase_order_document(po)
+
+
+def transaction_csv_rows(rows):
+    for row in rows:
+        yield row[:4] + (_iso(row[4]), row[5])
+
+
+def transaction_documents(rows):
+    for row in rows:
+        yield dict(zip(TRANSACTION_CSV_HEADER, row))
+
+
+def stream_csv(header, rows, filename):
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def stream_ndjson(documents, filename):
+    encoder = DjangoJSONEncoder()
+
+    def lines():
+        for document in documents:
+            yield encoder.encode(document) + '\n'
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.ndjson"'
+    return response
+
+
+def export_purchase_orders(output_format, **filters):
+    orders = purchase_orders_for_export(**filters)
+    if output_format == 'csv':
+        return stream_csv(PURCHASE_ORDER_CSV_HEADER, purchase_order_csv_rows(orders), 'purchase_orders')
+    return stream_ndjson(purchase_order_documents(orders), 'purchase_orders')
+
+
+def export_transactions(output_format, **filters):
+    rows = transactions_for_export(**filters)
+    if output_format == 'csv':
+        return stream_csv(TRANSACTION_CSV_HEADER, transaction_csv_rows(rows), 'inventory_transactions')
+    return stream_ndjson(transaction_documents(rows), 'inventory_transactions')
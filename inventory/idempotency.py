@@ -0,0 +1,153 @@
+"""
+Idempotency-Key support for mutating endpoints.
+
+Clients on flaky networks (handheld scanners) send a unique key with each
+logical request and simply resend it, key included, when no response arrives:
+
+    POST /api/purchase-orders/7/receive/
+    Idempotency-Key: 3f1c2a9e-...
+
+The first request runs as usual; its response is stored as an
+IdempotencyRecord in the same transaction as the request's writes, so either
+both are committed or neither is. A retry is answered from the record with
+one lookup on the (user, key) unique index and is not executed again; its
+response carries `Idempotent-Replayed: true`.
+
+- The record is inserted before the view runs. A concurrent retry therefore
+  waits on the unique index until the first request finishes, then replays
+  its response instead of executing twice.
+- Only successful (2xx) responses are stored. An error rolls the record back
+  (the views write nothing when they fail), so the client may retry with
+  the same key, e.g. after fixing the stock it tried to receive against.
+- Reusing a key for another endpoint or body is rejected with 422.
+- Records older than INVENTORY_IDEMPOTENCY_TTL_HOURS are no longer replayed
+  and are deleted by `python manage.py purge_idempotency_keys`.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+from .models import IdempotencyRecord
+
+# Request header carrying the key
+HEADER = 'Idempotency-Key'
+
+# Response header marking a replayed response
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# Hours a stored response is replayed for, unless INVENTORY_IDEMPOTENCY_TTL_HOURS is set
+DEFAULT_TTL_HOURS = 24
+
+# Longest accepted key (the column size)
+MAX_KEY_LENGTH = 255
+
+# Records deleted per statement when purging
+PURGE_BATCH_SIZE = 5000
+
+
+class _Rollback(Exception):
+    """
+    Raised to undo the claimed record of a request that did not succeed.
+    """
+
+    def __init__(self, response):
+        self.response = response
+
+
+def ttl():
+    return timedelta(hours=getattr(settings, 'INVENTORY_IDEMPOTENCY_TTL_HOURS', DEFAULT_TTL_HOURS))
+
+
+def fingerprint(data):
+    """
+    SHA-256 of the parsed request body, independent of key order and whitespace.
+    """
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(record, endpoint, digest):
+    if record.endpoint != endpoint or record.fingerprint != digest:
+        return Response(
+            {'error': f'This {HEADER} was already used for a different request.'},
+            status=422,
+        )
+    return Response(record.response, status=record.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def _lookup(user, key):
+    """
+    The live record for (user, key), or None. An expired one is deleted so the
+    key can be used again.
+    """
+    record = IdempotencyRecord.objects.filter(user=user, key=key).first()
+    if record is not None and record.created_at < timezone.now() - ttl():
+        IdempotencyRecord.objects.filter(pk=record.pk).delete()
+        return None
+    return record
+
+
+def idempotent(view):
+    """
+    Decorator for a mutating view method (viewset action) that honours the
+    Idempotency-Key header; requests without one run unchanged.
+    """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'}, status=400)
+
+        endpoint = f'{request.method} {request.path}'[:255]
+        digest = fingerprint(request.data)
+        record = _lookup(request.user, key)
+        if record is not None:
+            return _replay(record, endpoint, digest)
+
+        try:
+            with transaction.atomic():
+                # Claimed first: a concurrent retry blocks here until this request is done
+                record = IdempotencyRecord.objects.create(
+                    user=request.user, key=key, endpoint=endpoint, fingerprint=digest, status_code=0, response={},
+                )
+                response = view(self, request, *args, **kwargs)
+                if not 200 <= response.status_code < 300:
+                    raise _Rollback(response)
+                IdempotencyRecord.objects.filter(pk=record.pk).update(
+                    status_code=response.status_code, response=response.data,
+                )
+        except _Rollback as rollback:
+            return rollback.response
+        except IntegrityError:
+            # Lost the race to a concurrent request with the same key
+            record = _lookup(request.user, key)
+            if record is None:
+                raise
+            return _replay(record, endpoint, digest)
+        return response
+    return wrapper
+
+
+def purge(older_than=None, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete records older than `older_than` (default: the TTL). Returns the
+    number deleted.
+    """
+    cutoff = timezone.now() - (older_than if older_than is not None else ttl())
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyRecord.objects.filter(created_at__lt=cutoff).order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyRecord.objects.filter(id__in=ids).delete()[0]
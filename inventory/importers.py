@@ -0,0 +1,342 @@
+"""
+Streaming catalogue importer for suppliers, products and opening stock.
+
+Input files (CSV with a header row, or NDJSON) are parsed lazily and written
+in chunks, each chunk in its own transaction with a handful of set-based
+queries. After every committed chunk an optional checkpoint file records how
+many rows are done, so an interrupted import can resume where it stopped.
+
+Record kinds and their columns:
+- suppliers: name*, contact_email*, phone, address (upserted by name)
+- products:  sku*, name*, price*, description, reorder_threshold, target_stock,
+  opening_stock
+  (upserted by sku; opening_stock sets the stock level through the ledger)
+- stock:     sku*, quantity* (sets the stock level through the ledger)
+(* = required)
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import connection, transaction
+from .cache import invalidate_suppliers
+from .models import Product, Supplier
+from .reorder import sync_reorder_state
+from .search import index as search_index
+from .stock import post_movements
+
+IMPORT_KINDS = ['suppliers', 'products', 'stock']
+IMPORT_FORMATS = ['csv', 'ndjson']
+
+# Rows written per transaction
+DEFAULT_CHUNK_SIZE = 5000
+
+# Reference stored on ledger rows written for opening balances
+OPENING_BALANCE_REFERENCE = 'Opening balance'
+
+# Only the first errors are kept in the report
+MAX_REPORTED_ERRORS = 100
+
+PRODUCT_UPDATE_FIELDS = ['name', 'price', 'description', 'reorder_threshold', 'target_stock']
+SUPPLIER_UPDATE_FIELDS = ['contact_email', 'phone', 'address']
+
+
+class CatalogImportError(ValueError):
+    """
+    Raised for a file that cannot be imported at all (bad kind or format).
+    """
+
+
+class RowError(ValueError):
+    """
+    Raised for a single invalid row; the row is skipped and reported.
+    """
+
+
+def read_records(stream, file_format):
+    """
+    Yield one dict per record from a text stream. An NDJSON line that is not
+    a JSON object is yielded as a RowError, to be reported like an invalid
+    CSV row.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield RowError(f"Line {line_number}: invalid JSON ({exc}).")
+                continue
+            if not isinstance(record, dict):
+                yield RowError(f"Line {line_number}: expected a JSON object.")
+                continue
+            yield record
+    else:
+        raise CatalogImportError(f"Unknown format {file_format!r}; expected one of {IMPORT_FORMATS}.")
+
+
+def guess_format(filename):
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def _required(row, name):
+    value = row.get(name)
+    if value is None or str(value).strip() == '':
+        raise RowError(f"'{name}' is required.")
+    return str(value).strip()
+
+
+def _text(row, model, name, required=False):
+    """
+    A string column, checked against the model field's max_length so an
+    overlong value is a row error instead of a database error for the chunk.
+    """
+    value = _required(row, name) if required else str(row.get(name) or '')
+    max_length = model._meta.get_field(name).max_length
+    if max_length is not None and len(value) > max_length:
+        raise RowError(f"'{name}' must be at most {max_length} characters.")
+    return value
+
+
+def _integer(row, name, default=None):
+    value = row.get(name)
+    if value is None or str(value).strip() == '':
+        if default is None:
+            raise RowError(f"'{name}' is required.")
+        return default
+    # JSON numbers arrive as int/float: 3.0 is fine, 3.7 and true are not
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise RowError(f"'{name}' must be an integer.")
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError(f"'{name}' must be an integer.")
+    low, high = connection.ops.integer_field_range('IntegerField')
+    if not low <= value <= high:
+        raise RowError(f"'{name}' must be between {low} and {high}.")
+    return value
+
+
+def _optional_integer(row, name):
+    value = row.get(name)
+    return None if value in (None, '') else _integer(row, name)
+
+
+def _price(row):
+    try:
+        price = Decimal(_required(row, 'price'))
+    except InvalidOperation:
+        raise RowError("'price' must be a decimal number.")
+    if not price.is_finite():
+        raise RowError("'price' must be a finite decimal number.")
+    field = Product._meta.get_field('price')
+    try:
+        DecimalValidator(field.max_digits, field.decimal_places)(price)
+    except ValidationError as exc:
+        raise RowError(f"'price': {exc.messages[0]}")
+    return price
+
+
+class ImportReport:
+    """
+    Running totals for one import.
+    """
+    def __init__(self, skipped=0):
+        self.rows = 0
+        self.written = 0
+        self.skipped = skipped
+        self.errors = []
+        self.error_count = 0
+        self.started = time.monotonic()
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'written': self.written,
+            'skipped_from_checkpoint': self.skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class CatalogImporter:
+    """
+    Import one kind of record from a stream.
+    Usage:
+        report = CatalogImporter('products').run(open('catalog.csv'), 'csv')
+    """
+    def __init__(self, kind, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint=None, on_chunk=None):
+        if kind not in IMPORT_KINDS:
+            raise CatalogImportError(f"Unknown kind {kind!r}; expected one of {IMPORT_KINDS}.")
+        self.kind = kind
+        self.chunk_size = chunk_size
+        # Optional path of a JSON file recording progress after each chunk
+        self.checkpoint = checkpoint
+        # Optional callback(report) invoked after each committed chunk
+        self.on_chunk = on_chunk
+
+    def load_checkpoint(self):
+        """
+        Number of data rows already imported according to the checkpoint file.
+        """
+        if not self.checkpoint:
+            return 0
+        try:
+            with open(self.checkpoint) as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            return 0
+        if state.get('kind') != self.kind:
+            raise CatalogImportError(f"Checkpoint {self.checkpoint} belongs to a '{state.get('kind')}' import.")
+        return state['rows_done']
+
+    def save_checkpoint(self, rows_done):
+        if self.checkpoint:
+            with open(self.checkpoint, 'w') as fh:
+                json.dump({'kind': self.kind, 'rows_done': rows_done}, fh)
+
+    def run(self, stream, file_format, resume=False):
+        """
+        Import every record of `stream`. With resume=True, rows already
+        recorded in the checkpoint file are skipped.
+        Returns an ImportReport.
+        """
+        skip = self.load_checkpoint() if resume else 0
+        records = islice(read_records(stream, file_format), skip, None)
+        report = ImportReport(skipped=skip)
+        row_number = skip
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            numbered = list(enumerate(chunk, start=row_number + 1))
+            row_number += len(chunk)
+            with transaction.atomic():
+                report.written += getattr(self, f'_import_{self.kind}')(numbered, report)
+            report.rows += len(chunk)
+            self.save_checkpoint(row_number)
+            if self.on_chunk:
+                self.on_chunk(report)
+        return report
+
+    def _parse(self, numbered, parser, report):
+        """
+        Apply `parser` to every row, collecting row errors in the report.
+        Later rows win when a key appears twice in the same chunk.
+        """
+        parsed = {}
+        for row_number, row in numbered:
+            if isinstance(row, RowError):
+                report.add_error(row_number, str(row))
+                continue
+            try:
+                key, values = parser(row)
+            except RowError as exc:
+                report.add_error(row_number, str(exc))
+                continue
+            parsed[key] = values
+        return parsed
+
+    def _import_suppliers(self, numbered, report):
+        def parse(row):
+            return _text(row, Supplier, 'name', required=True), {
+                'contact_email': _text(row, Supplier, 'contact_email', required=True),
+                'phone': _text(row, Supplier, 'phone'),
+                'address': _text(row, Supplier, 'address'),
+            }
+
+        parsed = self._parse(numbered, parse, report)
+        existing = {}
+        for pk, name in Supplier.objects.filter(name__in=parsed).order_by('-pk').values_list('pk', 'name'):
+            existing[name] = pk
+        updates = [Supplier(pk=existing[name], name=name, **values) for name, values in parsed.items() if name in existing]
+        inserts = [Supplier(name=name, **values) for name, values in parsed.items() if name not in existing]
+        Supplier.objects.bulk_update(updates, SUPPLIER_UPDATE_FIELDS, batch_size=1000)
+        invalidate_suppliers(supplier.pk for supplier in updates)
+        Supplier.objects.bulk_create(inserts, batch_size=1000)
+        search_index('supplier', [supplier.pk for supplier in inserts])
+        return len(parsed)
+
+    def _import_products(self, numbered, report):
+        def parse(row):
+            return _text(row, Product, 'sku', required=True), {
+                'name': _text(row, Product, 'name', required=True),
+                'price': _price(row),
+                'description': _text(row, Product, 'description'),
+                'reorder_threshold': _integer(row, 'reorder_threshold', default=5),
+                'target_stock': _optional_integer(row, 'target_stock'),
+                'opening_stock': _optional_integer(row, 'opening_stock'),
+            }
+
+        parsed = self._parse(numbered, parse, report)
+        opening = {sku: values.pop('opening_stock') for sku, values in parsed.items()}
+        # Existing products only get the columns the file actually provides
+        columns = set().union(*(row.keys() for _, row in numbered if isinstance(row, dict)))
+        Product.objects.bulk_create(
+            [Product(sku=sku, **values) for sku, values in parsed.items()],
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=[name for name in PRODUCT_UPDATE_FIELDS if name in columns],
+            batch_size=1000,
+        )
+        self._set_stock_levels({sku: qty for sku, qty in opening.items() if qty is not None})
+        pks = list(Product.objects.filter(sku__in=parsed).values_list('pk', flat=True))
+        # Thresholds may have changed without any stock movement
+        sync_reorder_state(pks)
+        search_index('product', pks)
+        return len(parsed)
+
+    def _import_stock(self, numbered, report):
+        def parse(row):
+            return _required(row, 'sku'), _integer(row, 'quantity')
+
+        parsed = self._parse(numbered, parse, report)
+        known = self._set_stock_levels(parsed)
+        for row_number, row in numbered:
+            if isinstance(row, RowError):
+                continue
+            sku = str(row.get('sku') or '').strip()
+            if sku in parsed and sku not in known:
+                report.add_error(row_number, f"Unknown sku {sku!r}.")
+        return len(known)
+
+    def _set_stock_levels(self, levels):
+        """
+        Bring each SKU's stock to the given level by posting the difference to
+        the ledger as an opening balance. Returns the SKUs that exist.
+        """
+        if not levels:
+            return set()
+        current = {
+            sku: (pk, stock)
+            for pk, sku, stock in Product.objects.select_for_update()
+            .filter(sku__in=levels).order_by('pk').values_list('pk', 'sku', 'current_stock')
+        }
+        post_movements(
+            [(pk, levels[sku] - stock) for sku, (pk, stock) in current.items()],
+            reference=OPENING_BALANCE_REFERENCE,
+            allow_negative=True,
+        )
+        return set(current)
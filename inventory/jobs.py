@@ -0,0 +1,256 @@
+"""
+Lightweight database-backed job queue.
+
+Follow-up work that a request does not need to wait for (analytics rollups,
+automatic reorder planning, ...) is enqueued as Job rows once the request's
+transaction commits, and executed by `manage.py run_workers`:
+
+    @register('rollups.catch_up')
+    def catch_up(): ...
+
+    enqueue_on_commit('rollups.catch_up', key='rollups.catch_up')
+
+- Claiming is a conditional UPDATE ... WHERE status='queued', so two workers
+  never run the same job.
+- A handler that raises is retried with exponential back-off until
+  max_attempts, then the job is marked failed with its traceback.
+- Jobs enqueued with the same idempotency key are coalesced while one of them
+  is still queued.
+- Handlers run outside any transaction of the worker's and open their own,
+  e.g. one per batch, so a long job never holds the (SQLite) write lock for
+  its whole run. Only the claim and the outcome are separate short writes.
+  A retry may therefore find part of the work already committed: handlers
+  must be safe to run again, typically by resuming from a watermark or an
+  idempotency key.
+- A job left running by a worker that died is re-queued once its lease
+  expires. While a handler runs, a heartbeat thread keeps renewing the lease,
+  so a job that runs longer than the lease is not handed to a second worker,
+  and a claimed job whose lease lapsed before it started is left to whoever
+  re-claims it.
+"""
+import os
+import socket
+import threading
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Job
+
+# Jobs claimed per poll by one worker
+DEFAULT_BATCH_SIZE = 10
+
+# Retry delay after the n-th failed attempt: 2**n seconds, capped
+MAX_BACKOFF_SECONDS = 300
+
+# A running job whose lease has not been renewed for this long is re-queued
+DEFAULT_LEASE_SECONDS = 600
+
+# A running job's lease is renewed this many times per lease period
+HEARTBEATS_PER_LEASE = 3
+
+# Finished jobs are purged after this many days
+DEFAULT_KEEP_DAYS = 7
+
+# name -> handler(**payload)
+HANDLERS = {}
+
+
+class UnknownJob(LookupError):
+    """
+    Raised when enqueueing a job name that has no registered handler.
+    """
+
+
+def register(name):
+    """
+    Decorator registering a function as the handler of job `name`.
+    """
+    def decorator(func):
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=5):
+    """
+    Add a job to the queue. With `key`, nothing is added while a queued job
+    with the same key exists.
+    """
+    if name not in HANDLERS:
+        raise UnknownJob(f"No handler registered for job {name!r}.")
+    if key is not None and Job.objects.filter(idempotency_key=key, status='queued').exists():
+        # Coalesced without taking a write lock; the unique constraint covers races
+        return
+    Job.objects.bulk_create([Job(
+        name=name,
+        payload=payload or {},
+        idempotency_key=key,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=key is not None)
+
+
+def enqueue_on_commit(name, payload=None, key=None, **kwargs):
+    """
+    Enqueue once the current transaction commits (immediately outside one),
+    so a rolled-back request leaves no follow-up work behind.
+    """
+    if name not in HANDLERS:
+        raise UnknownJob(f"No handler registered for job {name!r}.")
+    transaction.on_commit(lambda: enqueue(name, payload, key=key, **kwargs))
+
+
+def claim(worker, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Mark up to `batch_size` due jobs as running for `worker` and return them,
+    oldest first.
+    """
+    now = timezone.now()
+    due = list(
+        Job.objects.filter(status='queued', run_after__lte=now)
+        .order_by('run_after', 'id').values_list('id', flat=True)[:batch_size]
+    )
+    if not due:
+        return []
+    token = f'{worker}:{uuid.uuid4().hex[:12]}'
+    # Only rows still queued are taken, so a concurrent worker's claim wins cleanly
+    Job.objects.filter(pk__in=due, status='queued').update(
+        status='running', locked_by=token, locked_at=now, attempts=F('attempts') + 1,
+    )
+    return list(Job.objects.filter(locked_by=token, status='running').order_by('run_after', 'id'))
+
+
+def backoff(attempts):
+    return min(2 ** attempts, MAX_BACKOFF_SECONDS)
+
+
+def _requeue(job, error, delay):
+    """
+    Put a claimed job back in the queue. If a job with the same key was
+    queued meanwhile it already covers the retry, so this one is closed as failed.
+    """
+    fields = {'locked_by': '', 'locked_at': None, 'last_error': error}
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status='queued', run_after=timezone.now() + timedelta(seconds=delay), **fields,
+            )
+    except IntegrityError:
+        fields['last_error'] = f'{error}\nRetry coalesced into the queued job with the same key.'
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            status='failed', finished_at=timezone.now(), **fields,
+        )
+
+
+def _renew_lease(job):
+    """
+    Move the lease of a job this worker still holds. Returns False when the
+    job was re-queued (and possibly re-claimed) in the meantime.
+    """
+    return bool(
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status='running').update(locked_at=timezone.now())
+    )
+
+
+@contextmanager
+def _heartbeat(job, lease_seconds):
+    """
+    Renew the job's lease from a background thread (with its own database
+    connection) until the block exits.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(lease_seconds / HEARTBEATS_PER_LEASE):
+                _renew_lease(job)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Execute one claimed job and record the outcome. Returns True on success,
+    False on failure, and None when the job's lease had already lapsed (it
+    was re-queued for another worker, so it is not run here).
+    """
+    if not _renew_lease(job):
+        return None
+    try:
+        # Not wrapped in atomic(): the handler commits its own batches
+        with _heartbeat(job, lease_seconds):
+            HANDLERS[job.name](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            _requeue(job, error, backoff(job.attempts))
+        else:
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status='failed', locked_by='', locked_at=None, last_error=error, finished_at=timezone.now(),
+            )
+        return False
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='done', locked_by='', finished_at=timezone.now(),
+    )
+    return True
+
+
+def requeue_stale(lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Put jobs whose worker vanished mid-run back in the queue.
+    Returns the number of jobs re-queued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    stale = list(Job.objects.filter(status='running', locked_at__lt=cutoff))
+    for job in stale:
+        _requeue(job, f'Lease expired on worker {job.locked_by}.', 0)
+    return len(stale)
+
+
+def run_pending(worker=None, batch_size=DEFAULT_BATCH_SIZE, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Run due jobs until none are left. Returns (succeeded, failed) counts.
+    """
+    worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+    succeeded = failed = 0
+    while True:
+        jobs = claim(worker, batch_size)
+        if not jobs:
+            return succeeded, failed
+        for job in jobs:
+            outcome = run_job(job, lease_seconds)
+            if outcome:
+                succeeded += 1
+            elif outcome is not None:
+                failed += 1
+
+
+def purge(keep_days=DEFAULT_KEEP_DAYS):
+    """
+    Delete done jobs finished more than `keep_days` ago; failed jobs are kept
+    for inspection. Returns the number deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    return Job.objects.filter(status='done', finished_at__lt=cutoff).delete()[0]
+
+
+def queue_stats():
+    """
+    Job counts per status.
+    """
+    counts = {status: 0 for status, _ in Job.STATUS_CHOICES}
+    counts.update(Job.objects.values('status').order_by().annotate(count=Count('id')).values_list('status', 'count'))
+    return counts
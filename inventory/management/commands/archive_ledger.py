@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from inventory import archive
+
+
+class Command(BaseCommand):
+    help = "Move ledger rows of closed months into the archive table, keeping monthly summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=None,
+                            help="Months kept in the live ledger, counting the current one "
+                                 "(default: INVENTORY_LEDGER_HOT_MONTHS)")
+        parser.add_argument('--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE,
+                            help="Ledger rows moved per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be moved")
+
+    def handle(self, *args, **options):
+        report = archive.archive_ledger(
+            keep_months=options['keep_months'], batch_size=options['batch_size'], dry_run=options['dry_run'],
+        )
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        for period, rows in report['months'].items():
+            self.stdout.write(f"{period:%Y-%m}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['rows']} ledger rows older than {report['cutoff']}"
+        ))
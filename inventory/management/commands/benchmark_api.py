@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand
+from inventory.benchmarks import (
+    SCENARIOS, run_benchmarks, run_concurrency_benchmark, run_serializer_benchmark, run_write_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the purchase-order API and write p50/p95 latency and queries per request to a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Requests per scenario")
+        parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                            help="Scenario to run (repeatable; default: all)")
+        parser.add_argument('--page-size', type=int, default=50, help="Page size for the list scenario")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for generated requests")
+        parser.add_argument('--output', default='benchmark_report.json', help="Where to write the JSON report")
+        parser.add_argument('--keep', action='store_true',
+                            help="Commit the data written by the benchmark instead of rolling it back")
+        parser.add_argument('--concurrency', type=int, default=0, metavar='CLIENTS',
+                            help="Also compare WSGI and ASGI list throughput with this many concurrent clients")
+        parser.add_argument('--write-threads', type=int, default=0, metavar='THREADS',
+                            help="Also run parallel receive calls from this many threads against shared SKUs")
+        parser.add_argument('--serializer-pos', type=int, default=0, metavar='POS',
+                            help="Also time building and rendering one page of this many PO payloads "
+                                 "with the serializer and with the lean .values() path (e.g. 10000)")
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(
+            iterations=options['iterations'],
+            scenarios=options['scenario'],
+            seed=options['seed'],
+            page_size=options['page_size'],
+            keep=options['keep'],
+        )
+        if options['concurrency']:
+            report['concurrency'] = run_concurrency_benchmark(
+                clients=options['concurrency'],
+                requests_per_client=options['iterations'],
+                page_size=options['page_size'],
+            )
+        if options['write_threads']:
+            report['write_concurrency'] = run_write_benchmark(
+                threads=options['write_threads'],
+                receipts_per_thread=options['iterations'],
+            )
+        if options['serializer_pos']:
+            report['serialization'] = run_serializer_benchmark(count=options['serializer_pos'])
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+        self.stdout.write(f"{'scenario':<10} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}")
+        for name, result in report['scenarios'].items():
+            if result is None:
+                self.stdout.write(f"{name:<10} skipped (no data)")
+                continue
+            self.stdout.write(
+                f"{name:<10} {result['requests']:>8} {result['p50_ms'] or 0:>9.2f} "
+                f"{result['p95_ms'] or 0:>9.2f} {result['queries_per_request'] or 0:>8}"
+            )
+        for name, result in report.get('concurrency', {}).items():
+            self.stdout.write(
+                f"{name:<16} {result['clients']:>4} clients {result['requests_per_second'] or 0:>9.1f} req/s "
+                f"p95 {result['p95_ms'] or 0:.2f} ms errors {result['errors']}"
+            )
+        if 'write_concurrency' in report:
+            profile, result = report['write_concurrency']['profile'], report['write_concurrency']['receive']
+            self.stdout.write(
+                f"parallel receive ({profile['vendor']}, {profile.get('journal_mode', 'server')}): "
+                f"{result['requests_per_second'] or 0:.1f} req/s p95 {result['p95_ms'] or 0:.2f} ms "
+                f"errors {result['errors']} consistent {result['stock_consistent']}"
+            )
+        if report.get('serialization'):
+            result = report['serialization']
+            build = ' '.join(f"{name} {ms:.1f} ms" for name, ms in result['build_ms'].items())
+            render = ' '.join(
+                f"{name} {ms:.1f} ms/{result['render_bytes'][name]} B" for name, ms in result['render_ms'].items()
+            )
+            self.stdout.write(
+                f"{result['pos']} PO payloads: {build} (x{result['speedup']}, match {result['payloads_match']}); "
+                f"render {render}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
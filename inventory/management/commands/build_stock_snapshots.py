@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from inventory import snapshots
+
+
+class Command(BaseCommand):
+    help = "Fold new InventoryTransaction rows into per-product stock snapshots, optionally compacting old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=snapshots.DEFAULT_BATCH_SIZE,
+                            help="Products processed per batch")
+        parser.add_argument('--compact', action='store_true',
+                            help="Also thin out old snapshots to one per product per month")
+        parser.add_argument('--keep-days', type=int, default=90,
+                            help="Snapshots newer than this many days are never compacted")
+        parser.add_argument('--reconcile', action='store_true',
+                            help="Report products whose current_stock differs from the ledger balance")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        created = snapshots.build_snapshots(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} snapshots"))
+
+        if options['compact']:
+            deleted = snapshots.compact_snapshots(keep_days=options['keep_days'], batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Compacted {deleted} snapshots"))
+
+        if options['reconcile']:
+            drifted = 0
+            for product_id, current_stock, balance in snapshots.reconcile(batch_size=batch_size):
+                drifted += 1
+                self.stdout.write(f"Product {product_id}: current_stock={current_stock} ledger={balance}")
+            style = self.style.WARNING if drifted else self.style.SUCCESS
+            self.stdout.write(style(f"{drifted} products differ from the ledger"))
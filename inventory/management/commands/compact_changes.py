@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from inventory import changes
+
+
+class Command(BaseCommand):
+    help = "Delete change events that every registered consumer has acknowledged"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=changes.COMPACT_BATCH_SIZE,
+                            help="Events deleted per statement")
+
+    def handle(self, *args, **options):
+        deleted = changes.compact(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} acknowledged change events"))
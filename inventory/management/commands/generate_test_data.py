@@ -1,51 +1,52 @@
-from django.core.management.base import BaseCommand
-from inventory.models import Supplier, Product, PurchaseOrder, PurchaseOrderItem
+from datetime import timedelta
+from itertools import accumulate
+from random import Random
+
 from django.contrib.auth import get_user_model
-from random import randint, choice
+from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
+from inventory.models import Supplier, Product, PurchaseOrder, PurchaseOrderItem, InventoryTransaction
+from inventory.availability import rebuild_on_order
+from inventory.reorder import rebuild_worklist
+from inventory.rollups import catch_up
+from inventory.search import rebuild as rebuild_search_index
 
 User = get_user_model()
 
+# Share of generated POs in each status
+STATUS_MIX = [
+    ('Pending', 0.2),
+    ('Approved', 0.2),
+    ('Partially Delivered', 0.2),
+    ('Completed', 0.4),
+]
+
 
 class Command(BaseCommand):
     help = "Generate lots of dummy data for testing Purchase Orders, Suppliers, and Products"
 
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=10, help="Number of suppliers")
+        parser.add_argument('--products', type=int, default=50, help="Number of products")
+        parser.add_argument('--pos', type=int, default=30, help="Number of purchase orders")
+        parser.add_argument('--items-per-po', type=int, default=5, help="Maximum line items per PO")
+        parser.add_argument('--days', type=int, default=365, help="Spread PO history over this many days")
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help="Zipf exponent for SKU popularity (0 = uniform)")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible data")
+        parser.add_argument('--batch-size', type=int, default=2000, help="POs inserted per batch")
+
     def handle(self, *args, **options):
-        NUM_SUPPLIERS = 10
-        NUM_PRODUCTS = 50
-        NUM_POS = 30
-        MAX_ITEMS_PER_PO = 5
-
-        # Create suppliers
-        suppliers = []
-        for i in range(NUM_SUPPLIERS):
-            supplier, _ = Supplier.objects.get_or_create(
-                name=f"Supplier {i+1}",
-                defaults={
-                    "contact_email": f"supplier{i+1}@example.com",
-                    "phone": f"999000{i+1}",
-                    "address": f"{i+1} Market Road, City"
-                }
-            )
-            suppliers.append(supplier)
-        self.stdout.write(self.style.SUCCESS(f"Created {NUM_SUPPLIERS} suppliers"))
+        rng = Random(options['seed'])
+        now = timezone.now()
+        start = now - timedelta(days=options['days'])
 
-        # Create products
-        products = []
-        for i in range(NUM_PRODUCTS):
-            product, _ = Product.objects.get_or_create(
-                name=f"Product {i+1}",
-                defaults={
-                    "sku": f"P{i+1:04d}",
-                    "price": round(randint(50, 5000) + 0.99, 2),
-                    "current_stock": randint(0, 200),
-                    "reorder_threshold": randint(5, 20),
-                    "reorder_needed": False,
-                    "description": "Sample product description."
-                }
-            )
-            products.append(product)
-        self.stdout.write(self.style.SUCCESS(f"Created {NUM_PRODUCTS} products"))
+        suppliers = self.create_suppliers(options['suppliers'])
+        self.stdout.write(self.style.SUCCESS(f"Created {options['suppliers']} suppliers"))
+
+        products = self.create_products(options['products'], rng, start, suppliers)
+        self.stdout.write(self.style.SUCCESS(f"Created {options['products']} products"))
 
         # Create test user if not exists
         user, created = User.objects.get_or_create(username="testuser")
@@ -56,30 +57,126 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.SUCCESS("Using existing test user 'testuser'"))
 
-        # Create Purchase Orders
-        for i in range(NUM_POS):
-            supplier = choice(suppliers)
-            status = choice(["Pending", "Approved", "Partially Delivered", "Completed"])
-            po = PurchaseOrder.objects.create(
-                supplier=supplier,
+        # Popular SKUs are ordered far more often than the long tail
+        weights = [1 / (rank ** options['skew']) for rank in range(1, len(products) + 1)]
+        cum_weights = list(accumulate(weights))
+        statuses, status_weights = zip(*STATUS_MIX)
+
+        received = {}
+        remaining = options['pos']
+        while remaining > 0:
+            size = min(remaining, options['batch_size'])
+            self.create_po_batch(
+                size, rng, start, now, user, suppliers, products, cum_weights,
+                statuses, status_weights, options['items_per_po'], received,
+            )
+            remaining -= size
+
+        # Bring stock levels in line with the receipts that were generated
+        for product in products:
+            product.current_stock += received.get(product.pk, 0)
+        Product.objects.bulk_update(products, ['current_stock'], batch_size=1000)
+        rebuild_worklist()
+        rebuild_on_order()
+        # Backdated rows are folded at their final timestamps
+        catch_up()
+        rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS(f"Created {options['pos']} purchase orders with line items"))
+
+    def create_suppliers(self, count):
+        names = [f"Supplier {i+1}" for i in range(count)]
+        existing = set(Supplier.objects.values_list('name', flat=True).iterator())
+        Supplier.objects.bulk_create([
+            Supplier(
+                name=name,
+                contact_email=f"supplier{i+1}@example.com",
+                phone=f"999000{i+1}",
+                address=f"{i+1} Market Road, City",
+            )
+            for i, name in enumerate(names) if name not in existing
+        ], batch_size=1000)
+        wanted = set(names)
+        return [supplier for supplier in Supplier.objects.order_by('pk').iterator() if supplier.name in wanted]
+
+    def create_products(self, count, rng, start, suppliers):
+        """
+        Create missing products with an opening balance logged in the ledger.
+        """
+        skus = [f"P{i+1:04d}" for i in range(count)]
+        # Compared in Python: an IN list of every SKU would exceed parameter limits
+        existing = set(Product.objects.values_list('sku', flat=True).iterator())
+        new_products = Product.objects.bulk_create([
+            Product(
+                name=f"Product {i+1}",
+                sku=sku,
+                price=round(rng.randint(50, 5000) + 0.99, 2),
+                current_stock=rng.randint(0, 200),
+                reorder_threshold=rng.randint(5, 20),
+                preferred_supplier=rng.choice(suppliers) if suppliers else None,
+                description="Sample product description.",
+            )
+            for i, sku in enumerate(skus) if sku not in existing
+        ], batch_size=1000)
+        opening = InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(product=product, quantity=product.current_stock, reference="Opening balance")
+            for product in new_products if product.current_stock
+        ], batch_size=1000)
+        self.backdate(opening, 'timestamp', [start] * len(opening))
+        wanted = set(skus)
+        return [product for product in Product.objects.order_by('pk').iterator() if product.sku in wanted]
+
+    def backdate(self, objects, field, values):
+        """
+        Overwrite auto_now_add timestamps, which bulk_create always sets to now.
+        """
+        if not objects:
+            return
+        for obj, value in zip(objects, values):
+            setattr(obj, field, value)
+        type(objects[0]).objects.bulk_update(objects, [field], batch_size=1000)
+
+    @transaction.atomic
+    def create_po_batch(self, size, rng, start, now, user, suppliers, products, cum_weights,
+                        statuses, status_weights, max_items, received):
+        span = (now - start).total_seconds()
+        created_at = sorted(start + timedelta(seconds=rng.uniform(0, span)) for _ in range(size))
+        po_statuses = rng.choices(statuses, weights=status_weights, k=size)
+        orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(
+                supplier=rng.choice(suppliers),
                 status=status,
                 created_by=user,
-                created_at=timezone.now(),
-                approved_at=timezone.now() if status in ["Approved", "Partially Delivered", "Completed"] else None
+                approved_at=min(now, created + timedelta(hours=rng.uniform(1, 48))) if status != 'Pending' else None,
             )
-            num_items = randint(1, MAX_ITEMS_PER_PO)
-            for _ in range(num_items):
-                product = choice(products)
-                ordered_qty = randint(1, 20)
+            for status, created in zip(po_statuses, created_at)
+        ])
+        self.backdate(orders, 'created_at', created_at)
+
+        items = []
+        receipts = []
+        receipt_times = []
+        for po in orders:
+            chosen = rng.choices(products, cum_weights=cum_weights, k=rng.randint(1, max_items))
+            for product in {p.pk: p for p in chosen}.values():
+                ordered_qty = rng.randint(1, 20)
                 received_qty = 0
-                if status in ["Partially Delivered", "Completed"]:
-                    # For testing, mark some as received
-                    received_qty = randint(0, ordered_qty)
-                PurchaseOrderItem.objects.create(
+                if po.status == 'Completed':
+                    received_qty = ordered_qty
+                elif po.status == 'Partially Delivered':
+                    received_qty = rng.randint(0, ordered_qty - 1)
+                items.append(PurchaseOrderItem(
                     purchase_order=po,
                     product=product,
                     ordered_quantity=ordered_qty,
-                    received_quantity=received_qty
-                )
-
-        self.stdout.write(self.style.SUCCESS(f"Created {NUM_POS} purchase orders with line items"))
+                    received_quantity=received_qty,
+                ))
+                if received_qty:
+                    received[product.pk] = received.get(product.pk, 0) + received_qty
+                    receipts.append(InventoryTransaction(
+                        product=product, quantity=received_qty, reference=f"PO #{po.id} Receipt",
+                    ))
+                    receipt_times.append(min(now, po.approved_at + timedelta(days=rng.uniform(1, 21))))
+        PurchaseOrderItem.objects.bulk_create(items, batch_size=2000)
+        receipts = InventoryTransaction.objects.bulk_create(receipts, batch_size=2000)
+        self.backdate(receipts, 'timestamp', receipt_times)
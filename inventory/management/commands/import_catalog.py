@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.importers import (
+    DEFAULT_CHUNK_SIZE, IMPORT_FORMATS, IMPORT_KINDS, CatalogImporter, CatalogImportError, guess_format,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV/NDJSON file of suppliers, products or opening stock into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument('--kind', choices=IMPORT_KINDS, required=True,
+                            help="Type of records in the file")
+        parser.add_argument('--format', choices=IMPORT_FORMATS,
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Rows written per transaction")
+        parser.add_argument('--checkpoint',
+                            help="Progress file (default: <path>.checkpoint)")
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip rows already recorded in the checkpoint file")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        checkpoint = options['checkpoint'] or f"{path}.checkpoint"
+
+        def progress(report):
+            self.stdout.write(f"{report.skipped + report.rows} rows ({report.rows_per_second:,.0f} rows/sec)")
+
+        try:
+            importer = CatalogImporter(
+                options['kind'], chunk_size=options['chunk_size'], checkpoint=checkpoint, on_chunk=progress,
+            )
+            with open(path, newline='', encoding='utf-8') as stream:
+                report = importer.run(stream, file_format, resume=options['resume'])
+        except (CatalogImportError, OSError, UnicodeDecodeError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.written} {options['kind']} from {report.rows} rows "
+            f"in {report.seconds:.1f}s ({report.rows_per_second:,.0f} rows/sec), "
+            f"{report.error_count} rows rejected"
+        ))
@@ -0,0 +1,41 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from inventory.planning import plan_purchase_orders
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Create Pending purchase orders, one per supplier, for every product that needs reordering"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username recorded as the creator of the POs")
+        parser.add_argument('--supplier', type=int, help="Only plan orders for this supplier ID")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be ordered without writing")
+        parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']!r}")
+
+        summary = plan_purchase_orders(user=user, supplier_id=options['supplier'], dry_run=options['dry_run'])
+        if options['json']:
+            self.stdout.write(json.dumps(summary))
+            return
+
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['suppliers']} purchase orders with {summary['lines']} lines "
+            f"({summary['units']} units)"
+        ))
+        if summary['skipped_without_supplier']:
+            self.stdout.write(self.style.WARNING(
+                f"Skipped {summary['skipped_without_supplier']} products without a preferred supplier: "
+                f"{', '.join(summary['skipped_skus'])}"
+            ))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from inventory import idempotency
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than their TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=None,
+                            help="Age after which records are deleted (default: INVENTORY_IDEMPOTENCY_TTL_HOURS)")
+        parser.add_argument('--batch-size', type=int, default=idempotency.PURGE_BATCH_SIZE,
+                            help="Records deleted per statement")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(hours=options['hours']) if options['hours'] is not None else None
+        deleted = idempotency.purge(older_than=older_than, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency records"))
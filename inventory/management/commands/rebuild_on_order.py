@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.availability import DEFAULT_BATCH_SIZE, refresh_on_order, verify_on_order
+
+# Only the first drifted products are listed
+MAX_LISTED = 20
+
+
+class Command(BaseCommand):
+    help = "Verify Product.on_order against open purchase order lines, and rebuild it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Products checked per batch")
+        parser.add_argument('--check', action='store_true',
+                            help="Only report drift; exit with an error if any is found")
+
+    def handle(self, *args, **options):
+        drift = list(verify_on_order(batch_size=options['batch_size']))
+        for pk, stored, actual in drift[:MAX_LISTED]:
+            self.stdout.write(self.style.WARNING(f"Product {pk}: on_order {stored}, open PO lines {actual}"))
+        if options['check']:
+            if drift:
+                raise CommandError(f"{len(drift)} products have a stale on_order quantity")
+            self.stdout.write(self.style.SUCCESS("on_order matches the open purchase order lines"))
+            return
+        drifted = [pk for pk, _, _ in drift]
+        for start in range(0, len(drifted), options['batch_size']):
+            refresh_on_order(drifted[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f"on_order rebuilt; {len(drift)} products corrected"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from inventory.reorder import DEFAULT_BATCH_SIZE, rebuild_worklist
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.reorder_needed and the reorder worklist for every product"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Products processed per batch")
+
+    def handle(self, *args, **options):
+        entries = rebuild_worklist(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reorder worklist rebuilt: {entries} products need reordering"))
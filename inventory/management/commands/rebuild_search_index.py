@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product/supplier/PO search index from scratch (after raw bulk loads)"
+
+    def handle(self, *args, **options):
+        if not search.uses_index():
+            self.stdout.write("This database is searched without an index table; nothing to rebuild")
+            return
+        with transaction.atomic():
+            entries = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {entries} entries"))
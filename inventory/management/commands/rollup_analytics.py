@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from inventory import rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new ledger rows and PO lines into the daily/monthly analytics rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=rollups.DEFAULT_BATCH_SIZE,
+                            help="Source rows folded per transaction")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop the rollups and fold the full history again")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            folded = rollups.rebuild(batch_size=options['batch_size'])
+        else:
+            folded = rollups.catch_up(batch_size=options['batch_size'])
+        for name, count in folded.items():
+            self.stdout.write(self.style.SUCCESS(f"Folded {count} {name} rows"))
+        marks = ', '.join(f"{name}={last_id}" for name, last_id in rollups.watermarks().items())
+        self.stdout.write(f"Watermarks: {marks}")
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from inventory import jobs
+
+
+def work(name, stop, poll, batch_size, lease):
+    """
+    Worker loop: claim due jobs, run them, and sleep `poll` seconds when the
+    queue is empty, until `stop` is set.
+    """
+    # Never share the parent's database connection
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while not stop.is_set():
+        jobs.requeue_stale(lease)
+        claimed = jobs.claim(name, batch_size)
+        if not claimed:
+            stop.wait(poll)
+            continue
+        for job in claimed:
+            jobs.run_job(job, lease)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background job workers for the database-backed job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help="Worker processes")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--batch-size', type=int, default=jobs.DEFAULT_BATCH_SIZE,
+                            help="Jobs claimed per poll")
+        parser.add_argument('--lease', type=int, default=jobs.DEFAULT_LEASE_SECONDS,
+                            help="Re-queue running jobs whose lease has not been renewed for this many seconds")
+        parser.add_argument('--once', action='store_true',
+                            help="Run every due job in this process, then exit")
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help="Before starting, delete done jobs older than this many days")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            purged = jobs.purge(keep_days=options['purge_days'])
+            self.stdout.write(self.style.SUCCESS(f"Purged {purged} finished jobs"))
+
+        if options['once']:
+            jobs.requeue_stale(options['lease'])
+            succeeded, failed = jobs.run_pending(batch_size=options['batch_size'], lease_seconds=options['lease'])
+            style = self.style.WARNING if failed else self.style.SUCCESS
+            self.stdout.write(style(f"Ran {succeeded + failed} jobs: {succeeded} succeeded, {failed} failed"))
+            return
+
+        # Workers are forked, so they inherit the configured Django project
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        connections.close_all()
+        host = socket.gethostname()
+        workers = [
+            context.Process(
+                target=work,
+                args=(f'{host}-{os.getpid()}-{index}', stop, options['poll'], options['batch_size'],
+                      options['lease']),
+            )
+            for index in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {len(workers)} workers; Ctrl+C or SIGTERM to stop"))
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        # Running jobs are allowed to finish before the workers exit
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
@@ -0,0 +1,317 @@
+"""
+In-process request metrics.
+
+RequestMetricsMiddleware (middleware.py) opens a RequestProbe for every
+request. A database execute wrapper, installed once per connection, adds each
+query's SQL and duration to the probe of the current request (found through a
+context variable, so it works for sync and async views alike). When the
+response is done the probe is folded into the histograms below, labelled by
+view and action (DRF action names such as list, approve, receive). The
+histograms are rendered in the Prometheus text format at /metrics.
+
+Requests slower than INVENTORY_SLOW_REQUEST_MS are also dumped as JSON, with
+their SQL, to INVENTORY_SLOW_REQUEST_DIR. Query parameters are never recorded
+(they carry session keys, credentials and personal data); dumps are written
+owner-only and only the newest INVENTORY_SLOW_REQUEST_MAX_FILES are kept.
+
+The counters live in this process; with several server processes each one
+is scraped (or aggregated) separately.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+from .cache import cache_stats
+
+# Upper bounds of the histogram buckets (Prometheus 'le' labels)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+DEFAULT_SLOW_REQUEST_MS = 500
+
+# Slow-request dumps list the queries that ran most often first, up to this many
+MAX_DUMPED_QUERIES = 200
+
+# Dumps kept in INVENTORY_SLOW_REQUEST_DIR; older ones are deleted
+DEFAULT_SLOW_REQUEST_MAX_FILES = 200
+
+_current_probe = contextvars.ContextVar('inventory_request_probe', default=None)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with one series per label tuple.
+    """
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: {**series, 'buckets': list(series['buckets'])} for labels, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self.snapshot().items()):
+            labels = _labels(self.labels, label_values)
+            for bound, count in zip(self.buckets, series['buckets']):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return lines
+
+
+class CounterMetric:
+    """
+    Monotonic counter with one series per label tuple.
+    """
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.snapshot().items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUEST_LABELS = ('view', 'action')
+
+request_seconds = Histogram(
+    'inventory_request_seconds', 'Wall time of a request.', REQUEST_LABELS, SECONDS_BUCKETS)
+db_queries = Histogram(
+    'inventory_request_db_queries', 'Database queries per request.', REQUEST_LABELS, QUERY_COUNT_BUCKETS)
+db_seconds = Histogram(
+    'inventory_request_db_seconds', 'Time spent in database queries per request.', REQUEST_LABELS, SECONDS_BUCKETS)
+render_seconds = Histogram(
+    'inventory_request_render_seconds', 'Time spent rendering (serializing) the response body.',
+    REQUEST_LABELS, SECONDS_BUCKETS)
+duplicate_queries = CounterMetric(
+    'inventory_request_duplicate_queries_total',
+    'Queries whose SQL already ran earlier in the same request (N+1 indicator).', REQUEST_LABELS)
+responses = CounterMetric(
+    'inventory_responses_total', 'Responses by status code.', REQUEST_LABELS + ('status',))
+slow_requests = CounterMetric(
+    'inventory_slow_requests_total', 'Requests slower than INVENTORY_SLOW_REQUEST_MS.', REQUEST_LABELS)
+
+METRICS = [request_seconds, db_queries, db_seconds, render_seconds, duplicate_queries, responses, slow_requests]
+
+
+class RequestProbe:
+    """
+    Measurements of one request in flight.
+    """
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.view = 'unresolved'
+        self.action = method.lower()
+        self.started = time.perf_counter()
+        # (sql, seconds) per query; parameters are deliberately not kept
+        self.queries = []
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+
+    def record_query(self, sql, seconds):
+        self.queries.append((sql, seconds))
+        self.db_seconds += seconds
+
+    def duplicate_count(self):
+        return len(self.queries) - len({sql for sql, _ in self.queries})
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    probe = _current_probe.get()
+    if probe is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        probe.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """
+    connection_created receiver: time every query on this connection.
+    """
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def enabled():
+    return getattr(settings, 'INVENTORY_METRICS_ENABLED', True)
+
+
+def start_request(request):
+    probe = RequestProbe(request.method, request.path)
+    token = _current_probe.set(probe)
+    return probe, token
+
+
+def resolve_view(probe, request, view_func):
+    """
+    Label the probe with the view class (or function) and the action.
+    """
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    probe.view = view_class.__name__ if view_class else getattr(view_func, '__name__', 'unknown')
+    # DRF viewsets map HTTP methods to action names, including @action methods
+    actions = getattr(view_func, 'actions', None) or {}
+    probe.action = actions.get(request.method.lower(), request.method.lower())
+
+
+def finish_request(probe, token, response):
+    """
+    Fold a finished request into the metrics. Returns the slow-request report
+    to pass to dump_slow_request(), or None; the caller writes it, off the
+    event loop under ASGI.
+    """
+    _current_probe.reset(token)
+    elapsed = time.perf_counter() - probe.started
+    labels = (probe.view, probe.action)
+    request_seconds.observe(labels, elapsed)
+    db_queries.observe(labels, len(probe.queries))
+    db_seconds.observe(labels, probe.db_seconds)
+    if probe.render_seconds:
+        render_seconds.observe(labels, probe.render_seconds)
+    duplicates = probe.duplicate_count()
+    if duplicates:
+        duplicate_queries.inc(labels, duplicates)
+    status = response.status_code if response is not None else 500
+    responses.inc(labels + (str(status),))
+
+    threshold = getattr(settings, 'INVENTORY_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+    if threshold is not None and elapsed * 1000 >= threshold:
+        slow_requests.inc(labels)
+        return slow_request_report(probe, elapsed, status)
+    return None
+
+
+def slow_request_report(probe, elapsed, status):
+    """
+    JSON-ready report of a slow request and its SQL (without parameters).
+    """
+    counts = Counter(sql for sql, _ in probe.queries)
+    queries = sorted(probe.queries, key=lambda query: (-counts[query[0]], -query[1]))
+    return {
+        'at': timezone.now().isoformat(),
+        'method': probe.method,
+        'path': probe.path,
+        'view': probe.view,
+        'action': probe.action,
+        'status': status,
+        'ms': round(elapsed * 1000, 3),
+        'db_ms': round(probe.db_seconds * 1000, 3),
+        'render_ms': round(probe.render_seconds * 1000, 3),
+        'query_count': len(probe.queries),
+        'duplicate_queries': probe.duplicate_count(),
+        'queries': [
+            {'sql': sql, 'ms': round(seconds * 1000, 3), 'times_in_request': counts[sql]}
+            for sql, seconds in queries[:MAX_DUMPED_QUERIES]
+        ],
+    }
+
+
+def dump_slow_request(report):
+    """
+    Write a slow-request report to INVENTORY_SLOW_REQUEST_DIR, readable by the
+    owner only, and delete the oldest dumps beyond the cap.
+    Returns the file path, or None when dumps are disabled.
+    """
+    directory = getattr(settings, 'INVENTORY_SLOW_REQUEST_DIR', None)
+    if not directory:
+        return None
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    now = time.time_ns()
+    # Nanoseconds keep names in write order within one second
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(now // 10**9)) + f'.{now % 10**9:09d}'
+    name = f"{stamp}-{report['view']}-{report['action']}-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+    path = os.path.join(directory, name)
+    # O_EXCL | O_NOFOLLOW: never write through a planted file or symlink
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    _prune_dumps(directory)
+    return path
+
+
+def _prune_dumps(directory):
+    keep = getattr(settings, 'INVENTORY_SLOW_REQUEST_MAX_FILES', DEFAULT_SLOW_REQUEST_MAX_FILES)
+    # Names start with the timestamp, so they sort oldest first
+    dumps = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in dumps[:max(len(dumps) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Pruned concurrently by another process
+            pass
+
+
+def render_prometheus():
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.append('# HELP inventory_payload_cache_requests_total Payload cache lookups by result.')
+    lines.append('# TYPE inventory_payload_cache_requests_total counter')
+    for name, counts in sorted(cache_stats().items()):
+        for result in ('hits', 'misses'):
+            lines.append(f'inventory_payload_cache_requests_total{{cache="{name}",result="{result}"}} {counts[result]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
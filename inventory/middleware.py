@@ -0,0 +1,71 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Record wall time, DB queries, DB time, duplicate queries and render time
+    of every request, labelled by view and action (see metrics.py).
+    Works in both sync and async stacks. Disable with INVENTORY_METRICS_ENABLED = False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics.enabled():
+            return self.get_response(request)
+        probe, token = metrics.start_request(request)
+        request._metrics_probe = probe
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            report = metrics.finish_request(probe, token, response)
+            if report is not None:
+                metrics.dump_slow_request(report)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.enabled():
+            return await self.get_response(request)
+        probe, token = metrics.start_request(request)
+        request._metrics_probe = probe
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            report = metrics.finish_request(probe, token, response)
+            if report is not None:
+                # File I/O runs in a thread, not on the event loop
+                await sync_to_async(metrics.dump_slow_request, thread_sensitive=False)(report)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        probe = getattr(request, '_metrics_probe', None)
+        if probe is not None:
+            metrics.resolve_view(probe, request, view_func)
+
+    def process_template_response(self, request, response):
+        """
+        Time the rendering of template and DRF responses, which Django performs
+        right after this hook returns.
+        """
+        probe = getattr(request, '_metrics_probe', None)
+        if probe is not None:
+            started = time.perf_counter()
+
+            def rendered(rendered_response):
+                probe.render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_worklist(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    ReorderItem = apps.get_model('inventory', 'ReorderItem')
+    needing = Product.objects.filter(current_stock__lt=F('reorder_threshold'))
+    needing.update(reorder_needed=True)
+    Product.objects.filter(current_stock__gte=F('reorder_threshold')).update(reorder_needed=False)
+    ReorderItem.objects.bulk_create([
+        ReorderItem(product_id=pk, shortfall=threshold - stock)
+        for pk, threshold, stock in needing.values_list('pk', 'reorder_threshold', 'current_stock').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='preferred_supplier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.supplier'),
+        ),
+        migrations.CreateModel(
+            name='ReorderItem',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder_item', serialize=False, to='inventory.product')),
+                ('shortfall', models.IntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.supplier')),
+            ],
+        ),
+        migrations.RunPython(populate_worklist, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_reorder_worklist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='target_stock',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:22
+
+from django.db import migrations, models
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_on_order(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    PurchaseOrderItem = apps.get_model('inventory', 'PurchaseOrderItem')
+    open_quantity = (
+        PurchaseOrderItem.objects.filter(product=OuterRef('pk'))
+        .exclude(purchase_order__status='Completed')
+        .values('product')
+        .annotate(total=Sum(F('ordered_quantity') - F('received_quantity')))
+        .values('total')
+    )
+    Product.objects.update(on_order=Coalesce(Subquery(open_quantity, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_target_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='on_order',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_on_order, migrations.RunPython.noop),
+    ]
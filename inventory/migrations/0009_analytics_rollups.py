@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_purchaseorder_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField()),
+                ('received', models.IntegerField(default=0)),
+                ('issued', models.IntegerField(default=0)),
+                ('transactions', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movement_rollups', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grain', 'period'], name='movement_rollup_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'grain', 'period'), name='movement_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField()),
+                ('ordered', models.IntegerField(default=0)),
+                ('received', models.IntegerField(default=0)),
+                ('received_on_time', models.IntegerField(default=0)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='inventory.supplier')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('supplier', 'grain', 'period'), name='supplier_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('reference', models.CharField(max_length=255)),
+                ('period', models.DateField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'timestamp'], name='archive_product_timestamp_idx'), models.Index(fields=['period'], name='archive_period_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerPeriodSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('received', models.IntegerField(default=0)),
+                ('issued', models.IntegerField(default=0)),
+                ('transactions', models.IntegerField(default=0)),
+                ('closing_balance', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_summaries', to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'period'), name='ledger_summary_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# FTS5 index of product, supplier and PO (supplier) names, see
+# inventory/search.py; the prefix indexes answer 2-4 character prefixes
+# without scanning the term list
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE inventory_search USING fts5("
+    "kind, title, tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+    "INSERT INTO inventory_search (rowid, kind, title) "
+    "SELECT id * 4 + 1, 'product', name FROM inventory_product",
+    "INSERT INTO inventory_search (rowid, kind, title) "
+    "SELECT id * 4 + 2, 'supplier', name FROM inventory_supplier",
+    "INSERT INTO inventory_search (rowid, kind, title) "
+    "SELECT o.id * 4 + 3, 'purchase_order', s.name "
+    "FROM inventory_purchaseorder o JOIN inventory_supplier s ON s.id = o.supplier_id",
+]
+SQLITE_DROP = ["DROP TABLE inventory_search"]
+
+# Trigram indexes serving the name icontains lookups of the index-less search
+# (Django compares UPPER("column"::text) for icontains)
+POSTGRESQL_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX product_name_trgm_idx ON inventory_product USING gin (UPPER("name"::text) gin_trgm_ops)',
+    'CREATE INDEX supplier_name_trgm_idx ON inventory_supplier USING gin (UPPER("name"::text) gin_trgm_ops)',
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS product_name_trgm_idx",
+    "DROP INDEX IF EXISTS supplier_name_trgm_idx",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}),
+            run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}),
+        ),
+    ]
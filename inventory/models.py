@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -34,6 +35,24 @@ class Product(models.Model):
     reorder_threshold = models.IntegerField(default=5)
     # Flag indicating if reordering is necessary
     reorder_needed = models.BooleanField(default=False)
+    # Stock level replenishment orders top up to (empty = twice the threshold)
+    target_stock = models.IntegerField(null=True, blank=True)
+    # Supplier that replenishment orders go to by default
+    preferred_supplier = models.ForeignKey(Supplier, null=True, blank=True, on_delete=models.SET_NULL)
+    # Units ordered but not yet received on POs that are not Completed (maintained aggregate)
+    on_order = models.IntegerField(default=0, editable=False)
+    # Bumped on every stock mutation; used for optimistic concurrency control
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Partial index: only the (few) products that need reordering
+            models.Index(
+                fields=['reorder_needed'],
+                condition=models.Q(reorder_needed=True),
+                name='product_reorder_needed_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -57,6 +76,18 @@ class PurchaseOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     # Timestamp when the purchase order was approved
     approved_at = models.DateTimeField(null=True, blank=True)
+    # Timestamp of the last change; keys the cached board row
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Status-filtered lists and admin filters, newest first
+            models.Index(fields=['status', 'created_at'], name='po_status_created_idx'),
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='po_created_id_idx'),
+            # Supplier-filtered board, sorted by creation time
+            models.Index(fields=['supplier', 'created_at'], name='po_supplier_created_idx'),
+        ]
 
     def __str__(self):
         return f'PO #{self.id} - {self.supplier.name}'
@@ -71,6 +102,8 @@ class PurchaseOrderItem(models.Model):
     ordered_quantity = models.IntegerField()
     # Quantity received so far
     received_quantity = models.IntegerField(default=0)
+    # When the line was written (lets rollups wait for late-committing IDs)
+    created_at = models.DateTimeField(auto_now_add=True)
 
 # InventoryTransaction logs any inventory updates
 class InventoryTransaction(models.Model):
@@ -82,3 +115,267 @@ class InventoryTransaction(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     # Reference or note (e.g., "PO #7 Receipt")
     reference = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            # Per-product ledger history by time
+            models.Index(fields=['product', 'timestamp'], name='txn_product_timestamp_idx'),
+            # Per-product rows past a snapshot's watermark (point-in-time replay)
+            models.Index(fields=['product', 'id'], name='txn_product_id_idx'),
+        ]
+
+# ReorderItem is the worklist of products currently below their reorder threshold
+class ReorderItem(models.Model):
+    # The product needing reorder (one worklist entry per product)
+    product = models.OneToOneField(Product, primary_key=True, related_name='reorder_item', on_delete=models.CASCADE)
+    # Units missing to get back up to the reorder threshold
+    shortfall = models.IntegerField()
+    # Supplier to reorder from (the product's preferred supplier)
+    supplier = models.ForeignKey(Supplier, null=True, blank=True, on_delete=models.SET_NULL)
+    # When the entry was last refreshed
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.product_id}: short {self.shortfall}'
+
+# StockSnapshot stores a materialized ledger balance for one product
+class StockSnapshot(models.Model):
+    # The product this balance belongs to
+    product = models.ForeignKey(Product, related_name='snapshots', on_delete=models.CASCADE)
+    # Sum of all InventoryTransaction quantities up to last_transaction_id
+    quantity = models.IntegerField()
+    # Highest InventoryTransaction ID folded into this snapshot
+    last_transaction_id = models.BigIntegerField()
+    # Timestamp of that transaction: the balance holds from this instant on
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'last_transaction_id'], name='snapshot_product_txn_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} @ {self.taken_at}: {self.quantity}'
+
+# Grains the analytics rollups are kept at; a period is a day, or the first day of a month
+ROLLUP_GRAIN_CHOICES = [
+    ('day', 'Day'),
+    ('month', 'Month'),
+]
+
+# MovementRollup pre-aggregates the inventory ledger per product and period
+class MovementRollup(models.Model):
+    # The product whose ledger rows are summed
+    product = models.ForeignKey(Product, related_name='movement_rollups', on_delete=models.CASCADE)
+    # 'day' or 'month'
+    grain = models.CharField(max_length=5, choices=ROLLUP_GRAIN_CHOICES)
+    # The day, or the first day of the month
+    period = models.DateField()
+    # Sum of positive ledger quantities (stock in)
+    received = models.IntegerField(default=0)
+    # Sum of negative ledger quantities, as a positive number (stock out)
+    issued = models.IntegerField(default=0)
+    # Number of ledger rows folded in
+    transactions = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'grain', 'period'], name='movement_rollup_unique'),
+        ]
+        indexes = [
+            # Top-SKU queries over a period range
+            models.Index(fields=['grain', 'period'], name='movement_rollup_period_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} {self.grain} {self.period}: +{self.received} -{self.issued}'
+
+# SupplierRollup pre-aggregates ordered and received units per supplier and period
+class SupplierRollup(models.Model):
+    # The supplier the purchase orders went to
+    supplier = models.ForeignKey(Supplier, related_name='rollups', on_delete=models.CASCADE)
+    # 'day' or 'month'
+    grain = models.CharField(max_length=5, choices=ROLLUP_GRAIN_CHOICES)
+    # The day, or the first day of the month
+    period = models.DateField()
+    # Units on PO lines of POs created in the period
+    ordered = models.IntegerField(default=0)
+    # Units received against this supplier's POs in the period
+    received = models.IntegerField(default=0)
+    # Part of `received` that arrived within INVENTORY_ON_TIME_DAYS of approval
+    received_on_time = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'grain', 'period'], name='supplier_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.supplier_id} {self.grain} {self.period}: {self.received}/{self.ordered}'
+
+# RollupWatermark records how far each rollup source has been folded in
+class RollupWatermark(models.Model):
+    # Source name: 'ledger' (InventoryTransaction) or 'order_lines' (PurchaseOrderItem)
+    name = models.CharField(max_length=50, primary_key=True)
+    # Highest source row ID already folded into the rollups
+    last_id = models.BigIntegerField(default=0)
+    # When the watermark last moved
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.last_id}'
+
+# Job is one unit of deferred work in the database-backed queue (inventory.jobs)
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    # Registered handler name, e.g. 'rollups.catch_up'
+    name = models.CharField(max_length=100)
+    # Keyword arguments for the handler
+    payload = models.JSONField(default=dict, blank=True)
+    # Current state; failed means every attempt raised
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Jobs sharing a key are coalesced while one of them is still queued
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True)
+    # Attempts started so far, and the limit before the job is marked failed
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Not picked up before this time (retry back-off)
+    run_after = models.DateTimeField()
+    # Claim token of the worker running the job, and when it was claimed
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    # Traceback of the last failed attempt
+    last_error = models.TextField(blank=True)
+    # Timestamp when the job was enqueued
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Timestamp when the job succeeded or finally failed
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # At most one queued job per key
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(status='queued'),
+                name='job_queued_key_unique',
+            ),
+        ]
+        indexes = [
+            # Workers poll for due queued jobs
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
+
+# ArchivedTransaction holds ledger rows of closed periods moved out of InventoryTransaction
+class ArchivedTransaction(models.Model):
+    # ID the row had in InventoryTransaction (kept, so IDs stay unique across both tables)
+    id = models.BigIntegerField(primary_key=True)
+    # The product whose stock was updated
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Quantity added (positive) or removed (negative)
+    quantity = models.IntegerField()
+    # Original timestamp of the transaction
+    timestamp = models.DateTimeField()
+    # Reference or note (e.g., "PO #7 Receipt")
+    reference = models.CharField(max_length=255)
+    # First day of the month the row belongs to
+    period = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'timestamp'], name='archive_product_timestamp_idx'),
+            models.Index(fields=['product', 'id'], name='archive_product_id_idx'),
+            models.Index(fields=['period'], name='archive_period_idx'),
+        ]
+
+# LedgerPeriodSummary keeps per-product monthly totals of archived ledger rows
+class LedgerPeriodSummary(models.Model):
+    # The product the totals belong to
+    product = models.ForeignKey(Product, related_name='ledger_summaries', on_delete=models.CASCADE)
+    # First day of the month
+    period = models.DateField()
+    # Sum of positive quantities in the month
+    received = models.IntegerField(default=0)
+    # Sum of negative quantities in the month, as a positive number
+    issued = models.IntegerField(default=0)
+    # Number of ledger rows in the month
+    transactions = models.IntegerField(default=0)
+    # Ledger balance at the end of the month (all archived rows up to then)
+    closing_balance = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'period'], name='ledger_summary_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} {self.period}: {self.closing_balance}'
+
+# ChangeEvent is one entry of the transactional outbox read by downstream systems (inventory.changes)
+class ChangeEvent(models.Model):
+    # Topic options for change events
+    TOPIC_CHOICES = [
+        ('purchase_order', 'Purchase order status'),
+        ('receipt', 'Item receipt'),
+        ('ledger', 'Ledger movement'),
+    ]
+    # Sequence number (consumers read events with id > their cursor)
+    id = models.BigAutoField(primary_key=True)
+    # What changed
+    topic = models.CharField(max_length=20, choices=TOPIC_CHOICES)
+    # ID of the changed object (PO, PO item or ledger row)
+    object_id = models.BigIntegerField()
+    # Event body, e.g. {"status": "Approved"}
+    data = models.JSONField(default=dict)
+    # Timestamp when the change was committed
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'#{self.id} {self.topic} {self.object_id}'
+
+# ChangeCursor records how far a downstream consumer has acknowledged the change feed
+class ChangeCursor(models.Model):
+    # Consumer name, e.g. 'wms'
+    consumer = models.CharField(max_length=100, primary_key=True)
+    # Highest event ID the consumer has processed
+    acked_id = models.BigIntegerField(default=0)
+    # When the cursor last moved
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.consumer} @ {self.acked_id}'
+
+# IdempotencyRecord stores the response of a mutating request sent with an Idempotency-Key (inventory.idempotency)
+class IdempotencyRecord(models.Model):
+    # User who sent the request; keys are scoped per user
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Client-chosen Idempotency-Key header value
+    key = models.CharField(max_length=255)
+    # Method and path the key was used for, e.g. "POST /api/purchase-orders/7/receive/"
+    endpoint = models.CharField(max_length=255)
+    # SHA-256 of the request body; a retry must send the same body
+    fingerprint = models.CharField(max_length=64)
+    # Stored response, replayed to retries
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    # Timestamp when the request was executed; records are purged after the TTL
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # One record per user and key; also the index retries are looked up with
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} -> {self.status_code}'
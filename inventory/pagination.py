@@ -0,0 +1,143 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over (created_at, id), newest first.
+    Each page is fetched with a range condition on the indexed columns instead
+    of an OFFSET, so deep pages cost the same as the first one.
+    Response format: {'next': <url or null>, 'results': [...]}.
+    Use ?page_size= to change the page size (capped at max_page_size).
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        return self.parse_page_size(request.query_params)
+
+    def parse_page_size(self, params):
+        try:
+            size = int(params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def seek(self, queryset, position):
+        """
+        Order newest first and continue after `position` (from a cursor).
+        """
+        queryset = queryset.order_by('-created_at', '-id')
+        if position:
+            created_at, pk = position
+            # Equivalent to (created_at, id) < position, written so the database
+            # can range-scan the created_at index.
+            queryset = queryset.filter(
+                Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+            )
+        return queryset
+
+    def position(self, row):
+        """
+        The position a page ending with `row` continues after.
+        """
+        return row.created_at, row.pk
+
+    def encode_cursor(self, created_at, pk):
+        raw = f'{created_at.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request):
+        """
+        Return the (created_at, id) position to continue after, or None.
+        """
+        return self.parse_cursor(request.query_params.get(self.cursor_query_param))
+
+    def parse_cursor(self, encoded):
+        """
+        Decode a cursor value; raises NotFound if it is malformed.
+        """
+        if not encoded:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            position = parse_datetime(created_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = self.seek(queryset, self.decode_cursor(request))
+
+        # Fetch one extra row to learn whether there is a next page
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = self.position(page[-1])
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class IdKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over the primary key, ascending, for tables without a
+    creation time (products). Same response format and parameters.
+    """
+    page_size = 100
+    max_page_size = 1000
+
+    def seek(self, queryset, position):
+        queryset = queryset.order_by('id')
+        if position:
+            queryset = queryset.filter(id__gt=position[0])
+        return queryset
+
+    def position(self, row):
+        return (row.pk,)
+
+    def encode_cursor(self, pk):
+        return base64.urlsafe_b64encode(str(pk).encode()).decode()
+
+    def parse_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            return (int(base64.urlsafe_b64decode(encoded.encode()).decode()),)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,139 @@
+"""
+Lean read path for purchase-order payloads.
+
+PurchaseOrderSerializer instantiates a model per PO and per item and runs
+every value through a DRF field; on large pages that costs more than the SQL.
+build_purchase_orders() produces the same payloads straight from .values()
+rows: one query for the POs (supplier name joined) and one for their items,
+per batch of QUERY_BATCH_SIZE POs. The payload cache loads its misses with it
+(see cache.py); the serializer remains the reference shape and the tests
+check that both agree.
+
+Clients may ask for a sparse fieldset, e.g. ?fields=id,status,items. Cached
+payloads are cut down to it; for the POs not in the cache only the requested
+columns are read, and the items query is skipped unless 'items' is requested.
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import PurchaseOrder, PurchaseOrderItem
+
+# Payload fields in PurchaseOrderSerializer order
+PURCHASE_ORDER_FIELDS = ['id', 'supplier', 'supplier_name', 'status', 'created_at', 'approved_at', 'items']
+
+# Payload field -> values() column
+PURCHASE_ORDER_COLUMNS = {
+    'id': 'id',
+    'supplier': 'supplier_id',
+    'supplier_name': 'supplier__name',
+    'status': 'status',
+    'created_at': 'created_at',
+    'approved_at': 'approved_at',
+}
+
+# Fields whose values are formatted like a DRF DateTimeField
+DATETIME_FIELDS = {'created_at', 'approved_at'}
+
+# POs per query (keeps IN (...) under SQLite's parameter limit)
+QUERY_BATCH_SIZE = 900
+
+# DRF's own formatting, used when DATETIME_FORMAT is not ISO 8601
+datetime_field = serializers.DateTimeField()
+
+
+class FieldSelectionError(ValueError):
+    """
+    Raised for an unknown field in ?fields=.
+    """
+
+
+def parse_fields(value, allowed=PURCHASE_ORDER_FIELDS):
+    """
+    Fields named in a comma-separated ?fields= value, in payload order, or
+    None when the parameter is absent (every field).
+    """
+    if not value:
+        return None
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = sorted(requested - set(allowed))
+    if unknown:
+        raise FieldSelectionError(f"Unknown fields {unknown}; expected some of {allowed}.")
+    return [field for field in allowed if field in requested] or None
+
+
+def sparse(payloads, fields):
+    """
+    Payloads cut down to `fields` (all of them when None).
+    """
+    if fields is None:
+        return payloads
+    return [{field: payload[field] for field in fields} for payload in payloads]
+
+
+def datetime_formatter():
+    """
+    A function formatting datetimes as DRF's DateTimeField does (ISO 8601 in
+    the current time zone, 'Z' for UTC), with the time zone looked up once
+    instead of per value.
+    """
+    if api_settings.DATETIME_FORMAT != ISO_8601:
+        return datetime_field.to_representation
+    zone = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def iso(value):
+        if value is None:
+            return None
+        if zone is not None:
+            value = value.astimezone(zone)
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return iso
+
+
+def _items_by_order(po_ids):
+    items = {po_id: [] for po_id in po_ids}
+    rows = PurchaseOrderItem.objects.filter(purchase_order_id__in=po_ids).order_by('id').values_list(
+        'purchase_order_id', 'id', 'product_id', 'ordered_quantity', 'received_quantity',
+    )
+    for po_id, pk, product, ordered, received in rows:
+        items[po_id].append(
+            {'id': pk, 'product': product, 'ordered_quantity': ordered, 'received_quantity': received}
+        )
+    return items
+
+
+def build_purchase_orders(pks, fields=None):
+    """
+    Payloads of the POs with these ids, in the same order; ids that do not
+    exist are left out. `fields` selects a subset of PURCHASE_ORDER_FIELDS.
+    """
+    fields = fields or PURCHASE_ORDER_FIELDS
+    columns = [field for field in fields if field in PURCHASE_ORDER_COLUMNS]
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    datetimes = [(index, field) for index, field in enumerate(columns) if field in DATETIME_FIELDS]
+    to_datetime = datetime_formatter()
+    with_items = 'items' in fields
+
+    pks = list(pks)
+    found = {}
+    for start in range(0, len(pks), QUERY_BATCH_SIZE):
+        batch = pks[start:start + QUERY_BATCH_SIZE]
+        rows = PurchaseOrder.objects.filter(pk__in=batch).values_list(
+            *[PURCHASE_ORDER_COLUMNS[field] for field in columns]
+        )
+        payloads = {}
+        for row in rows:
+            payload = dict(zip(columns, row))
+            for index, field in datetimes:
+                payload[field] = to_datetime(row[index])
+            payloads[payload['id']] = payload
+        if with_items and payloads:
+            for po_id, items in _items_by_order(list(payloads)).items():
+                payloads[po_id]['items'] = items
+        found.update(payloads)
+    if columns + ['items'] * with_items == list(fields):
+        return [found[pk] for pk in pks if pk in found]
+    # 'id' was read for bookkeeping only
+    return [{field: found[pk][field] for field in fields} for pk in pks if pk in found]
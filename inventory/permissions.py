@@ -0,0 +1,27 @@
+"""
+Role checks for the purchase-order workflow.
+
+A user's roles are the names of their groups. They are loaded with one query
+the first time a request needs them and kept on the request, so an action
+that checks roles more than once (or per PO) does not query again. Nothing
+outlives the request, so group changes apply from the next request on.
+"""
+
+# Group whose members may approve purchase orders
+MANAGER_ROLE = 'Manager'
+
+
+def user_roles(request):
+    """
+    Group names of the request's user, loaded once per request.
+    """
+    roles = getattr(request, '_inventory_roles', None)
+    if roles is None:
+        user = request.user
+        roles = frozenset(user.groups.values_list('name', flat=True)) if user.is_authenticated else frozenset()
+        request._inventory_roles = roles
+    return roles
+
+
+def has_role(request, role):
+    return role in user_roles(request)
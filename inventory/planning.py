@@ -0,0 +1,137 @@
+"""
+Replenishment planner: turns the reorder worklist into purchase orders.
+
+For every product on the worklist the order quantity is
+
+    target stock - stock on hand - quantity still open on earlier POs
+
+where the target defaults to twice the reorder threshold. The quantities are
+computed by the database in a single query over the worklist (the open
+quantity is the maintained Product.on_order), and
+the resulting POs (one per preferred supplier, status Pending, i.e. awaiting
+approval) and their lines are written with bulk inserts. Quantities already on
+order are subtracted, so running the planner again does not order twice.
+
+Runs are serialised: a run first locks the worklist's product rows (in
+primary-key order, like stock movements), so a concurrent run - the command
+next to the queued job, or two workers - waits, then reads the on-order
+quantities its predecessor committed instead of ordering the same shortfall.
+On SQLite the IMMEDIATE transaction already takes the write lock up front.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from .availability import order_lines_placed
+from .changes import record_purchase_orders
+from .jobs import enqueue_on_commit, register
+from .models import Product, PurchaseOrder, PurchaseOrderItem, ReorderItem
+from .search import index as search_index
+
+# Target stock when Product.target_stock is empty, as a multiple of the threshold
+DEFAULT_TARGET_MULTIPLIER = 2
+
+# Line items inserted per INSERT statement
+PLAN_BATCH_SIZE = 2000
+
+# Only the first SKUs without a supplier are listed in the report
+MAX_REPORTED_SKUS = 100
+
+
+def reorder_quantities(supplier_id=None):
+    """
+    (product_id, sku, supplier_id, quantity) for every worklist product that
+    still needs units after counting open orders, ordered by supplier.
+    """
+    target = Coalesce(F('target_stock'), F('reorder_threshold') * DEFAULT_TARGET_MULTIPLIER)
+    queryset = Product.objects.filter(reorder_item__isnull=False)
+    if supplier_id is not None:
+        queryset = queryset.filter(preferred_supplier_id=supplier_id)
+    return (
+        queryset.annotate(quantity=target - F('current_stock') - F('on_order'))
+        .filter(quantity__gt=0)
+        .order_by('preferred_supplier_id', 'pk')
+        .values_list('pk', 'sku', 'preferred_supplier_id', 'quantity')
+    )
+
+
+def _lock_worklist(supplier_id=None):
+    """
+    Lock the product rows of the worklist (SELECT ... FOR UPDATE) until the
+    end of the current transaction.
+    """
+    queryset = Product.objects.select_for_update().filter(
+        pk__in=ReorderItem.objects.values('product_id')
+    )
+    if supplier_id is not None:
+        queryset = queryset.filter(preferred_supplier_id=supplier_id)
+    # Fetched to take the locks; only the ids are transferred
+    list(queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def plan_purchase_orders(user=None, supplier_id=None, dry_run=False):
+    """
+    Create one Pending PO per supplier covering every product that needs
+    reordering. Products without a preferred supplier are skipped and listed.
+    Returns a summary dict; with dry_run=True nothing is written.
+    """
+    lines_by_supplier = {}
+    skipped = []
+    skipped_count = 0
+    with transaction.atomic():
+        if not dry_run:
+            # Quantities are read only once the lock is held, so they include
+            # the lines of a run that finished while this one waited
+            _lock_worklist(supplier_id)
+        for product_id, sku, supplier, quantity in reorder_quantities(supplier_id).iterator(chunk_size=PLAN_BATCH_SIZE):
+            if supplier is None:
+                skipped_count += 1
+                if len(skipped) < MAX_REPORTED_SKUS:
+                    skipped.append(sku)
+                continue
+            lines_by_supplier.setdefault(supplier, []).append((product_id, quantity))
+
+        orders = []
+        if not dry_run:
+            orders = PurchaseOrder.objects.bulk_create([
+                PurchaseOrder(supplier_id=supplier, created_by=user)
+                for supplier in lines_by_supplier
+            ])
+            items = PurchaseOrderItem.objects.bulk_create([
+                PurchaseOrderItem(purchase_order=po, product_id=product_id, ordered_quantity=quantity)
+                for po, lines in zip(orders, lines_by_supplier.values())
+                for product_id, quantity in lines
+            ], batch_size=PLAN_BATCH_SIZE)
+            order_lines_placed(items)
+            record_purchase_orders((po.pk, po.status, po.supplier_id) for po in orders)
+            search_index('purchase_order', [po.pk for po in orders])
+
+    return {
+        'purchase_orders': [po.id for po in orders],
+        'suppliers': len(lines_by_supplier),
+        'lines': sum(len(lines) for lines in lines_by_supplier.values()),
+        'units': sum(quantity for lines in lines_by_supplier.values() for _, quantity in lines),
+        'skipped_without_supplier': skipped_count,
+        'skipped_skus': skipped,
+        'dry_run': dry_run,
+    }
+
+
+@register('planning.plan_purchase_orders')
+def plan_job(username=None, supplier_id=None):
+    user = get_user_model().objects.get(username=username) if username else None
+    plan_purchase_orders(user=user, supplier_id=supplier_id)
+
+
+def schedule_planning():
+    """
+    Queue a planner run after the current transaction commits, when
+    INVENTORY_AUTO_PLAN is on. POs are created by INVENTORY_AUTO_PLAN_USER.
+    """
+    if getattr(settings, 'INVENTORY_AUTO_PLAN', False):
+        enqueue_on_commit(
+            'planning.plan_purchase_orders',
+            {'username': getattr(settings, 'INVENTORY_AUTO_PLAN_USER', None)},
+            key='planning.plan_purchase_orders',
+        )
@@ -0,0 +1,65 @@
+"""
+Incremental maintenance of Product.reorder_needed and the reorder worklist.
+
+sync_reorder_state() is the single mechanism: it is called by the stock
+ledger after every movement, by the Product post_save signal (admin edits of
+stock or threshold, any model save), and by bulk writers such as the catalogue
+importer. It only touches the given products, so its cost is proportional to
+the change, not to the catalogue. rebuild_worklist() runs it over every
+product to repair state after raw SQL or QuerySet.update() writes.
+"""
+from django.db.models import BooleanField, Case, F, Q, Value, When
+from .batches import product_batches
+from .cache import invalidate_products
+from .models import Product, ReorderItem
+
+# Products processed per batch by rebuild_worklist
+DEFAULT_BATCH_SIZE = 2000
+
+# reorder_needed as it should be, computed by the database
+NEEDS_REORDER = Q(current_stock__lt=F('reorder_threshold'))
+
+
+def sync_reorder_state(product_ids):
+    """
+    Bring reorder_needed and the worklist up to date for the given products.
+    Costs three queries regardless of how many products are passed.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    # Stock, flag or threshold of these products changed
+    invalidate_products(product_ids)
+
+    # Fix only the flags that are wrong, so unchanged rows are not rewritten
+    Product.objects.filter(pk__in=product_ids).filter(
+        (NEEDS_REORDER & Q(reorder_needed=False)) | (~NEEDS_REORDER & Q(reorder_needed=True))
+    ).update(reorder_needed=Case(When(NEEDS_REORDER, then=Value(True)), default=Value(False),
+                                 output_field=BooleanField()))
+
+    entries = [
+        ReorderItem(product_id=pk, shortfall=threshold - stock, supplier_id=supplier_id)
+        for pk, threshold, stock, supplier_id in Product.objects.filter(pk__in=product_ids)
+        .filter(NEEDS_REORDER)
+        .values_list('pk', 'reorder_threshold', 'current_stock', 'preferred_supplier_id')
+    ]
+    ReorderItem.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['shortfall', 'supplier', 'updated_at'],
+    )
+    ReorderItem.objects.filter(product_id__in=product_ids).exclude(
+        product_id__in=[entry.product_id for entry in entries]
+    ).delete()
+
+
+def rebuild_worklist(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recompute reorder state for every product, batch by batch.
+    Returns the number of worklist entries afterwards.
+    """
+    for batch in product_batches(batch_size):
+        sync_reorder_state(batch)
+    # Entries whose product vanished are removed by the cascade; nothing else can be stale
+    return ReorderItem.objects.count()
@@ -0,0 +1,360 @@
+"""
+Pre-aggregated analytics rollups.
+
+Two append-only sources are folded into per-period totals at day and month
+grain:
+- the inventory ledger (InventoryTransaction) into MovementRollup per product,
+  and, for goods receipts ("PO #<id> Receipt"), into SupplierRollup.received /
+  received_on_time per supplier;
+- purchase order lines (PurchaseOrderItem) into SupplierRollup.ordered, dated
+  by the PO's creation.
+
+Each source has a RollupWatermark holding the highest row ID already folded
+in. catch_up() processes only rows past the watermark, in batches of
+set-based queries, and moves the watermark in the same transaction as the
+rollup rows, so every source row is counted exactly once. The stock ledger
+queues a catch-up job (see jobs.py) after each commit, keeping the rollups
+current; the rollup_analytics command does the same on demand and can rebuild
+from scratch.
+
+Watermark order equals commit order on SQLite, where writes are serialised. On
+PostgreSQL a transaction can commit a lower ID after a higher one; set
+INVENTORY_ROLLUP_SETTLE_SECONDS above the longest writing transaction so rows
+of every source are only folded once any earlier ID has had time to commit.
+"""
+import re
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DateField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from .jobs import enqueue_on_commit, register
+from .models import (
+    ArchivedTransaction, InventoryTransaction, MovementRollup, PurchaseOrder, PurchaseOrderItem, RollupWatermark,
+    SupplierRollup,
+)
+
+GRAINS = ['day', 'month']
+
+# Source rows folded per transaction
+DEFAULT_BATCH_SIZE = 5000
+
+LEDGER = 'ledger'
+ORDER_LINES = 'order_lines'
+
+# Reference written on ledger rows by services.receive_goods
+RECEIPT_REFERENCE = re.compile(r'^PO #(\d+) Receipt$')
+
+MOVEMENT_FIELDS = ['received', 'issued', 'transactions']
+SUPPLIER_FIELDS = ['ordered', 'received', 'received_on_time']
+
+
+def on_time_days():
+    """
+    Receipts within this many days of PO approval count as on time
+    (INVENTORY_ON_TIME_DAYS setting).
+    """
+    return getattr(settings, 'INVENTORY_ON_TIME_DAYS', 14)
+
+
+def settle_seconds():
+    return getattr(settings, 'INVENTORY_ROLLUP_SETTLE_SECONDS', 0)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def period_of(moment, grain):
+    """
+    The rollup period a timestamp falls in, in the current time zone
+    (the same calendar TruncDate/TruncMonth use).
+    """
+    day = timezone.localdate(moment)
+    return day if grain == 'day' else month_start(day)
+
+
+def _truncate(field, grain):
+    if grain == 'day':
+        return TruncDate(field)
+    return TruncMonth(field, output_field=DateField())
+
+
+def _fold(model, key_field, fields, totals):
+    """
+    Add {(key_id, grain, period): {field: amount}} onto the rollup rows,
+    creating missing ones. One read and one upsert per call.
+    """
+    if not totals:
+        return
+    keys = {key for key, _, _ in totals}
+    periods = {period for _, _, period in totals}
+    existing = {
+        (row[f'{key_field}_id'], row['grain'], row['period']): row
+        for row in model.objects.filter(**{f'{key_field}_id__in': keys}, period__in=periods)
+        .values(f'{key_field}_id', 'grain', 'period', *fields)
+    }
+    rows = []
+    for (key, grain, period), amounts in totals.items():
+        current = existing.get((key, grain, period), {})
+        rows.append(model(**{
+            f'{key_field}_id': key,
+            'grain': grain,
+            'period': period,
+            **{name: current.get(name, 0) + amounts.get(name, 0) for name in fields},
+        }))
+    model.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=[key_field, 'grain', 'period'],
+        update_fields=fields,
+        batch_size=1000,
+    )
+
+
+def _add(totals, key, amounts):
+    entry = totals.setdefault(key, {})
+    for name, amount in amounts.items():
+        entry[name] = entry.get(name, 0) + amount
+
+
+def _fold_ledger(first_id, last_id, model=InventoryTransaction):
+    rows = model.objects.filter(id__gt=first_id, id__lte=last_id)
+
+    movements = {}
+    for grain in GRAINS:
+        grouped = (
+            rows.annotate(bucket=_truncate('timestamp', grain))
+            .values('product_id', 'bucket')
+            .order_by()
+            .annotate(
+                received=Sum(Case(When(quantity__gt=0, then=F('quantity')), default=Value(0),
+                                  output_field=IntegerField())),
+                issued=Sum(Case(When(quantity__lt=0, then=-F('quantity')), default=Value(0),
+                                output_field=IntegerField())),
+                transactions=Count('id'),
+            )
+        )
+        for row in grouped:
+            _add(movements, (row['product_id'], grain, row['bucket']),
+                 {name: row[name] for name in MOVEMENT_FIELDS})
+    _fold(MovementRollup, 'product', MOVEMENT_FIELDS, movements)
+
+    receipts = []
+    for reference, moment, quantity in rows.filter(
+        reference__startswith='PO #', reference__endswith=' Receipt', quantity__gt=0,
+    ).values_list('reference', 'timestamp', 'quantity'):
+        match = RECEIPT_REFERENCE.match(reference)
+        if match:
+            receipts.append((int(match.group(1)), moment, quantity))
+    if not receipts:
+        return
+    orders = {
+        pk: (supplier_id, approved_at)
+        for pk, supplier_id, approved_at in PurchaseOrder.objects.filter(pk__in={po for po, _, _ in receipts})
+        .values_list('pk', 'supplier_id', 'approved_at')
+    }
+    allowance = timedelta(days=on_time_days())
+    suppliers = {}
+    for po_id, moment, quantity in receipts:
+        if po_id not in orders:
+            continue
+        supplier_id, approved_at = orders[po_id]
+        on_time = approved_at is not None and moment <= approved_at + allowance
+        for grain in GRAINS:
+            _add(suppliers, (supplier_id, grain, period_of(moment, grain)),
+                 {'received': quantity, 'received_on_time': quantity if on_time else 0})
+    _fold(SupplierRollup, 'supplier', SUPPLIER_FIELDS, suppliers)
+
+
+def _fold_order_lines(first_id, last_id):
+    rows = PurchaseOrderItem.objects.filter(id__gt=first_id, id__lte=last_id)
+    suppliers = {}
+    for grain in GRAINS:
+        grouped = (
+            rows.annotate(bucket=_truncate('purchase_order__created_at', grain))
+            .values('purchase_order__supplier_id', 'bucket')
+            .order_by()
+            .annotate(ordered=Sum('ordered_quantity'))
+        )
+        for row in grouped:
+            _add(suppliers, (row['purchase_order__supplier_id'], grain, row['bucket']), {'ordered': row['ordered']})
+    _fold(SupplierRollup, 'supplier', SUPPLIER_FIELDS, suppliers)
+
+
+# name -> (model, fold function, column holding the row's write time)
+SOURCES = {
+    LEDGER: (InventoryTransaction, _fold_ledger, 'timestamp'),
+    ORDER_LINES: (PurchaseOrderItem, _fold_order_lines, 'created_at'),
+}
+
+
+def _next_batch(name, batch_size):
+    """
+    Claim the watermark of `name` and fold the next batch of its rows.
+    Returns the number of rows folded (0 when caught up).
+    """
+    model, fold, written_at = SOURCES[name]
+    with transaction.atomic():
+        # Writing the watermark row first takes its lock (and SQLite's write
+        # lock), so concurrent catch-ups queue here instead of double counting.
+        RollupWatermark.objects.filter(name=name).update(updated_at=timezone.now())
+        first_id = RollupWatermark.objects.values_list('last_id', flat=True).get(name=name)
+
+        pending = model.objects.filter(id__gt=first_id)
+        if settle_seconds():
+            cutoff = timezone.now() - timedelta(seconds=settle_seconds())
+            pending = pending.filter(**{f'{written_at}__lte': cutoff})
+        ids = list(pending.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        last_id = ids[-1]
+        fold(first_id, last_id)
+        RollupWatermark.objects.filter(name=name).update(last_id=last_id)
+    return len(ids)
+
+
+@register('rollups.catch_up')
+def catch_up(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fold every source row past its watermark into the rollups.
+    Returns {source name: rows folded}.
+    """
+    RollupWatermark.objects.bulk_create([RollupWatermark(name=name) for name in SOURCES], ignore_conflicts=True)
+    folded = {}
+    for name in SOURCES:
+        folded[name] = 0
+        while True:
+            count = _next_batch(name, batch_size)
+            if not count:
+                break
+            folded[name] += count
+    return folded
+
+
+def schedule_catch_up():
+    """
+    Queue a catch-up for when the current transaction commits. Requests only
+    pay for one INSERT; queued catch-ups are coalesced into one job.
+    """
+    enqueue_on_commit('rollups.catch_up', key='rollups.catch_up')
+
+
+def rebuild(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Drop every rollup and fold all source rows again from the start,
+    including ledger rows already moved to the archive.
+    """
+    with transaction.atomic():
+        MovementRollup.objects.all().delete()
+        SupplierRollup.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+    archived = 0
+    last_id = 0
+    while True:
+        ids = list(
+            ArchivedTransaction.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        # Archived IDs never reappear in the hot ledger, so the ledger watermark is unaffected
+        with transaction.atomic():
+            _fold_ledger(last_id, ids[-1], model=ArchivedTransaction)
+        archived += len(ids)
+        last_id = ids[-1]
+    folded = catch_up(batch_size=batch_size)
+    folded['archive'] = archived
+    return folded
+
+
+def watermarks():
+    return dict(RollupWatermark.objects.values_list('name', 'last_id'))
+
+
+def _range(queryset, grain, since, until):
+    """
+    Restrict a rollup queryset to `grain` and the periods overlapping [since, until].
+    """
+    if grain == 'month':
+        since = since and month_start(since)
+        until = until and month_start(until)
+    queryset = queryset.filter(grain=grain)
+    if since:
+        queryset = queryset.filter(period__gte=since)
+    if until:
+        queryset = queryset.filter(period__lte=until)
+    return queryset
+
+
+def movement_series(product_ids, grain='day', since=None, until=None):
+    """
+    {product_id: [period rows, oldest first]} for the given products.
+    """
+    series = {pk: [] for pk in product_ids}
+    rows = _range(MovementRollup.objects.filter(product_id__in=product_ids), grain, since, until)
+    for row in rows.order_by('product_id', 'period').values('product_id', 'period', *MOVEMENT_FIELDS):
+        series[row.pop('product_id')].append(row)
+    return series
+
+
+def top_movers(grain='day', since=None, until=None, limit=20):
+    """
+    Products with the most units received over the range, with their totals.
+    """
+    rows = _range(MovementRollup.objects.all(), grain, since, until)
+    return list(
+        rows.values('product_id', sku=F('product__sku'))
+        .order_by()
+        .annotate(received=Sum('received'), issued=Sum('issued'), transactions=Sum('transactions'))
+        .order_by('-received', 'product_id')[:limit]
+    )
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def supplier_performance(grain='day', since=None, until=None, supplier_id=None):
+    """
+    Per-supplier ordered/received totals over the range with fill rate
+    (received / ordered) and on-time rate (received on time / received).
+    With supplier_id, the one supplier's entry also carries its period series.
+    """
+    rows = _range(SupplierRollup.objects.all(), grain, since, until)
+    if supplier_id is not None:
+        rows = rows.filter(supplier_id=supplier_id)
+    results = []
+    for row in (
+        rows.values('supplier_id', supplier_name=F('supplier__name'))
+        .order_by()
+        .annotate(**{name: Sum(name) for name in SUPPLIER_FIELDS})
+        .order_by('supplier_id')
+    ):
+        row['fill_rate'] = _rate(row['received'], row['ordered'])
+        row['on_time_rate'] = _rate(row['received_on_time'], row['received'])
+        results.append(row)
+    if supplier_id is not None:
+        series = list(rows.order_by('period').values('period', *SUPPLIER_FIELDS))
+        for row in results:
+            row['series'] = series
+    return results
+
+
+def default_since(days, today=None):
+    return (today or timezone.localdate()) - timedelta(days=days - 1)
+
+
+def parse_period(value, name):
+    """
+    A since/until query value as a date, or None when empty.
+    Raises ValueError for anything but an ISO date.
+    """
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date.")
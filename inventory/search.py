@@ -0,0 +1,252 @@
+"""
+Typeahead search over products, suppliers and purchase orders.
+
+A query is answered in two steps, each bounded by an index:
+1. Codes: a SKU prefix is a range scan of the unique SKU index, and a PO
+   number ('1234', 'PO 1234', '#1234') a primary-key lookup. These come
+   first, as scanners send codes.
+2. Names: on SQLite every word is matched as a prefix of the product,
+   supplier or (for POs) supplier name in the FTS5 table inventory_search
+   (created by migration 0013, with 2-4 character prefix indexes) and the
+   candidates are ranked with bm25. Elsewhere the words are matched with
+   icontains, which PostgreSQL answers from the pg_trgm indexes migration
+   0013 creates there.
+
+Each FTS entry's rowid encodes its object, id * 4 + KIND_CODES[kind], so an
+entry is replaced or deleted by rowid. The index is kept in sync:
+- by post_save / post_delete of Product, Supplier and PurchaseOrder
+  (see signals.py);
+- explicitly by the bulk writers that bypass signals (catalogue importer,
+  bulk PO creation, the planner);
+- `python manage.py rebuild_search_index` rebuilds it after raw bulk loads.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from .models import Product, PurchaseOrder, Supplier
+
+# Object kinds in the index, with their rowid tag
+KINDS = ['product', 'supplier', 'purchase_order']
+KIND_CODES = {'product': 1, 'supplier': 2, 'purchase_order': 3}
+
+# Results returned per query by default, and at most
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Shorter queries match too much to be useful (and to be fast)
+MIN_QUERY_LENGTH = 2
+
+# Name matches ranked per query; broad prefixes ('bl') stop here instead of
+# scoring every product
+MAX_CANDIDATES = 1000
+
+# IDs per IN (...) when indexing
+INDEX_BATCH_SIZE = 900
+
+# (FROM clause, indexed name, id) per kind, as SQL over the model tables
+SOURCES = {
+    'product': ('inventory_product p', 'p.name', 'p.id'),
+    'supplier': ('inventory_supplier s', 's.name', 's.id'),
+    'purchase_order': (
+        'inventory_purchaseorder o JOIN inventory_supplier s ON s.id = o.supplier_id', 's.name', 'o.id',
+    ),
+}
+
+# 'PO 1234', 'po#1234', '#1234', '1234'
+PO_NUMBER = re.compile(r'^\s*(?:po)?\s*#?\s*(\d+)\s*$', re.IGNORECASE)
+
+# Name lookups of the index-less search: (model, name field)
+NAME_FIELDS = {
+    'product': (Product, 'name'),
+    'supplier': (Supplier, 'name'),
+    'purchase_order': (PurchaseOrder, 'supplier__name'),
+}
+
+
+def uses_index():
+    """
+    True when the FTS5 index table is available (SQLite).
+    """
+    return connection.vendor == 'sqlite'
+
+
+def terms(query):
+    """
+    Words of a query, lowercased; punctuation separates words as it does in the index.
+    """
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def searchable(query):
+    return sum(len(word) for word in terms(query)) >= MIN_QUERY_LENGTH
+
+
+def _in(column, count):
+    return f"{column} IN ({', '.join(['%s'] * count)})"
+
+
+def _reindex(kind, where, params):
+    table, name, pk = SOURCES[kind]
+    rowid = f'{pk} * 4 + {KIND_CODES[kind]}'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM inventory_search WHERE rowid IN (SELECT {rowid} FROM {table} WHERE {where})', params,
+        )
+        cursor.execute(
+            f"INSERT INTO inventory_search (rowid, kind, title) "
+            f"SELECT {rowid}, '{kind}', {name} FROM {table} WHERE {where}",
+            params,
+        )
+
+
+def index(kind, pks):
+    """
+    (Re)index objects of one kind; run inside the writing transaction.
+    """
+    if not uses_index():
+        return
+    pks = sorted(set(pks))
+    for start in range(0, len(pks), INDEX_BATCH_SIZE):
+        batch = pks[start:start + INDEX_BATCH_SIZE]
+        _reindex(kind, _in(SOURCES[kind][2], len(batch)), batch)
+
+
+def index_supplier_orders(supplier_pks):
+    """
+    Reindex the POs of these suppliers (their entries carry the supplier name).
+    """
+    if not uses_index():
+        return
+    supplier_pks = sorted(set(supplier_pks))
+    for start in range(0, len(supplier_pks), INDEX_BATCH_SIZE):
+        batch = supplier_pks[start:start + INDEX_BATCH_SIZE]
+        _reindex('purchase_order', _in('o.supplier_id', len(batch)), batch)
+
+
+def unindex(kind, pks):
+    if not uses_index():
+        return
+    rowids = sorted(pk * 4 + KIND_CODES[kind] for pk in set(pks))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rowids), INDEX_BATCH_SIZE):
+            batch = rowids[start:start + INDEX_BATCH_SIZE]
+            cursor.execute(f"DELETE FROM inventory_search WHERE {_in('rowid', len(batch))}", batch)
+
+
+def rebuild():
+    """
+    Rebuild the whole index from the model tables. Returns the number of entries.
+    """
+    if not uses_index():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM inventory_search')
+        for kind in KINDS:
+            table, name, pk = SOURCES[kind]
+            cursor.execute(
+                f"INSERT INTO inventory_search (rowid, kind, title) "
+                f"SELECT {pk} * 4 + {KIND_CODES[kind]}, '{kind}', {name} FROM {table}"
+            )
+        # Merge the index segments written above into one
+        cursor.execute("INSERT INTO inventory_search (inventory_search) VALUES ('optimize')")
+        cursor.execute('SELECT count(*) FROM inventory_search')
+        return cursor.fetchone()[0]
+
+
+def _code_matches(query, kinds, limit):
+    """
+    The PO the query names, if any, and SKUs starting with the query (as
+    typed, or upper-cased).
+    """
+    matches = []
+    code = query.strip()
+    number = PO_NUMBER.match(code)
+    if 'purchase_order' in kinds and number:
+        orders = PurchaseOrder.objects.filter(pk=int(number.group(1))).values_list('pk', flat=True)
+        matches.extend(('purchase_order', pk) for pk in orders)
+    if 'product' in kinds and code:
+        prefixes = Q()
+        for prefix in {code, code.upper()}:
+            # A range on the unique SKU index; U+10FFFF sorts after any character
+            prefixes |= Q(sku__gte=prefix, sku__lt=prefix + '\U0010ffff')
+        products = Product.objects.filter(prefixes).order_by('sku').values_list('pk', flat=True)[:limit]
+        matches.extend(('product', pk) for pk in products)
+    return matches
+
+
+def _name_matches(words, kinds, limit):
+    """
+    Objects whose (supplier) name has every word as a prefix, best first.
+    """
+    if uses_index():
+        # Words are \w+ only, so quoting them is enough to make them literal
+        expression = 'title : (' + ' AND '.join(f'"{word}"*' for word in words) + ')'
+        if set(kinds) != set(KINDS):
+            expression = '(' + ' OR '.join(f'kind : {kind}' for kind in kinds) + ') AND ' + expression
+        codes = {code: kind for kind, code in KIND_CODES.items()}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM ('
+                'SELECT rowid, rank FROM inventory_search WHERE inventory_search MATCH %s LIMIT %s'
+                ') ORDER BY rank LIMIT %s',
+                [expression, MAX_CANDIDATES, limit],
+            )
+            return [(codes[rowid % 4], rowid // 4) for rowid, in cursor.fetchall()]
+
+    matches = []
+    for kind in kinds:
+        model, name = NAME_FIELDS[kind]
+        condition = Q()
+        for word in words:
+            condition &= Q(**{f'{name}__icontains': word})
+        # Names starting with the first word rank above names only containing it
+        rank = Case(
+            When(**{f'{name}__istartswith': words[0]}, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+        rows = model.objects.filter(condition).annotate(search_rank=rank).order_by('search_rank', 'pk')
+        matches.extend((rank, kind, pk) for rank, pk in rows.values_list('search_rank', 'pk')[:limit])
+    matches.sort(key=lambda match: match[0])
+    return [(kind, pk) for _, kind, pk in matches[:limit]]
+
+
+def matching_ids(query, kinds=KINDS, limit=DEFAULT_LIMIT):
+    """
+    Best matches for `query` as (kind, id) pairs: code matches first, then
+    name matches.
+    """
+    if not searchable(query):
+        return []
+    matches = _code_matches(query, kinds, limit)
+    if len(matches) < limit:
+        seen = set(matches)
+        matches.extend(match for match in _name_matches(terms(query), kinds, limit) if match not in seen)
+    return matches[:limit]
+
+
+def search(query, kinds=KINDS, limit=DEFAULT_LIMIT):
+    """
+    Typeahead results, best first: one dict per match with its kind, id and
+    the fields a picker displays. A few indexed queries for the matches, then
+    one per kind found.
+    """
+    matches = matching_ids(query, kinds, limit)
+    ids = {kind: [pk for match_kind, pk in matches if match_kind == kind] for kind in KINDS}
+    rows = {}
+    if ids['product']:
+        for row in Product.objects.filter(pk__in=ids['product']).values('id', 'sku', 'name', 'current_stock'):
+            rows['product', row['id']] = row
+    if ids['supplier']:
+        for row in Supplier.objects.filter(pk__in=ids['supplier']).values('id', 'name', 'contact_email'):
+            rows['supplier', row['id']] = row
+    if ids['purchase_order']:
+        orders = PurchaseOrder.objects.filter(pk__in=ids['purchase_order']).values(
+            'id', 'status', 'supplier_id', 'supplier__name',
+        )
+        for row in orders:
+            row['supplier_name'] = row.pop('supplier__name')
+            rows['purchase_order', row['id']] = row
+    # Entries removed since the index lookup are skipped
+    return [{'type': kind, **rows[kind, pk]} for kind, pk in matches if (kind, pk) in rows]
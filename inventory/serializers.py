@@ -1,5 +1,53 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import PurchaseOrder, PurchaseOrderItem
+from .availability import order_lines_placed
+from .models import PurchaseOrder, PurchaseOrderItem, Product, ReorderItem
+
+class ProductSerializer(serializers.ModelSerializer):
+    """
+    Read representation of a Product and its stock level.
+    """
+    class Meta:
+        model = Product
+        fields = [
+            'id',                 # Product ID
+            'name',               # Product name
+            'sku',                # Stock Keeping Unit
+            'description',        # Optional description
+            'price',              # Price per unit
+            'current_stock',      # Units currently in stock
+            'reorder_threshold',  # Reorder trigger level
+            'reorder_needed',     # Low-stock flag
+            'on_order',           # Units open on purchase orders
+            'target_stock',       # Replenishment target (null = 2 x threshold)
+            'preferred_supplier'  # Default replenishment supplier
+        ]
+
+
+class ReorderItemSerializer(serializers.ModelSerializer):
+    """
+    One entry of the reorder worklist: a product below its threshold.
+    """
+    sku = serializers.CharField(source='product.sku', read_only=True)
+    name = serializers.CharField(source='product.name', read_only=True)
+    current_stock = serializers.IntegerField(source='product.current_stock', read_only=True)
+    reorder_threshold = serializers.IntegerField(source='product.reorder_threshold', read_only=True)
+    supplier_name = serializers.CharField(source='supplier.name', read_only=True, default=None)
+
+    class Meta:
+        model = ReorderItem
+        fields = [
+            'product',            # Product ID
+            'sku',                # Stock Keeping Unit
+            'name',               # Product name
+            'current_stock',      # Units currently in stock
+            'reorder_threshold',  # Reorder trigger level
+            'shortfall',          # Units missing to reach the threshold
+            'supplier',           # Preferred supplier ID (may be null)
+            'supplier_name',      # Preferred supplier name
+            'updated_at'          # Last time the entry changed
+        ]
+
 
 class PurchaseOrderItemSerializer(serializers.ModelSerializer):
     """
@@ -59,13 +107,34 @@ class PurchaseOrderCreateSerializer(serializers.ModelSerializer):
         Custom creation logic:
         1. Pop 'items' from validated data.
         2. Create PurchaseOrder instance.
-        3. Loop through items and create PurchaseOrderItem instances linked to the PO.
+        3. Insert all PurchaseOrderItem instances linked to the PO with one bulk_create.
+        4. Add the open quantities to Product.on_order.
         """
         items_data = validated_data.pop('items')
-        po = PurchaseOrder.objects.create(**validated_data)
-        for item in items_data:
-            PurchaseOrderItem.objects.create(
-                purchase_order=po,
-                **item
-            )
+        with transaction.atomic():
+            po = PurchaseOrder.objects.create(**validated_data)
+            items = PurchaseOrderItem.objects.bulk_create([
+                PurchaseOrderItem(purchase_order=po, **item)
+                for item in items_data
+            ])
+            order_lines_placed(items)
         return po
+
+
+class BulkPurchaseOrderItemSerializer(serializers.Serializer):
+    """
+    Shape-only validation of a line item in a bulk create request.
+    The product reference is resolved later, for the whole batch at once.
+    """
+    product = serializers.IntegerField(min_value=1)
+    ordered_quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkPurchaseOrderSerializer(serializers.Serializer):
+    """
+    Shape-only validation of one PO in a bulk create request.
+    Unlike PurchaseOrderCreateSerializer it does not query the database per
+    reference; see services.create_purchase_orders.
+    """
+    supplier = serializers.IntegerField(min_value=1)
+    items = BulkPurchaseOrderItemSerializer(many=True, allow_empty=False)
@@ -0,0 +1,221 @@
+from django.db import transaction
+from django.utils import timezone
+from .availability import adjust_on_order, order_lines_placed
+from .cache import invalidate_purchase_orders
+from .changes import record, record_purchase_orders
+from .models import PurchaseOrder, PurchaseOrderItem, Product, Supplier
+from .search import index as search_index
+from .serializers import BulkPurchaseOrderSerializer
+from .stock import post_movements
+
+# Statuses that allow goods to be received against a PO
+RECEIVABLE_STATUSES = ['Approved', 'Partially Delivered']
+
+# IDs per IN (...) lookup when resolving references in bulk
+LOOKUP_BATCH_SIZE = 900
+
+# POs approved per bulk request (one IN (...) lookup and one UPDATE)
+MAX_BULK_APPROVE = LOOKUP_BATCH_SIZE
+
+# Per-PO outcomes reported by approve_purchase_orders
+APPROVED = 'approved'
+NOT_PENDING = 'not_pending'
+NOT_FOUND = 'not_found'
+
+
+class ReceiptError(Exception):
+    """
+    Raised when a goods receipt payload is rejected.
+    Carries the HTTP status code the API should answer with.
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _parse_receipt_lines(received_items):
+    """
+    Normalise the raw 'items' payload into {item_id: quantity}.
+    Repeated item IDs are summed so they are validated as one line.
+    """
+    quantities = {}
+    for item_data in received_items:
+        try:
+            item_id = int(item_data['id'])
+            qty = int(item_data['received_quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ReceiptError("Each item needs an integer 'id' and 'received_quantity'.")
+        if qty <= 0:
+            raise ReceiptError('Received quantity must be positive.')
+        quantities[item_id] = quantities.get(item_id, 0) + qty
+    return quantities
+
+
+def receive_goods(po, received_items):
+    """
+    Receive goods for a PO as one set-based, atomic operation.
+    Steps:
+    1. Lock the PO row and load every line in a single query.
+    2. Validate the whole payload against that item map.
+    3. Bulk update PurchaseOrderItem.received_quantity.
+    4. Post the stock movements through stock.post_movements, which increments
+       Product.current_stock / reorder_needed and bulk-creates the ledger rows,
+       and take the received units off Product.on_order.
+    5. Set PO status to Completed (every line fulfilled) or Partially Delivered.
+    Returns the new PO status. Raises ReceiptError without writing anything
+    if any line is invalid.
+    """
+    quantities = _parse_receipt_lines(received_items)
+
+    with transaction.atomic():
+        # Locking the PO serialises concurrent receipts of the same lines;
+        # product rows are locked afterwards by the stock service.
+        po.status = PurchaseOrder.objects.select_for_update().values_list('status', flat=True).get(pk=po.pk)
+        if po.status not in RECEIVABLE_STATUSES:
+            raise ReceiptError('Cannot receive goods for this PO status.')
+
+        items = {item.id: item for item in PurchaseOrderItem.objects.filter(purchase_order=po)}
+
+        # Validate every line before touching the database
+        for item_id, qty in quantities.items():
+            item = items.get(item_id)
+            if item is None:
+                raise ReceiptError(f"Item ID {item_id} not found in this PO.", status=404)
+            remaining_qty = item.ordered_quantity - item.received_quantity
+            if qty > remaining_qty:
+                raise ReceiptError(f"Cannot receive more than remaining quantity ({remaining_qty}).")
+
+        received = []
+        for item_id, qty in quantities.items():
+            item = items[item_id]
+            item.received_quantity += qty
+            received.append(item)
+
+        # The PO is complete only once every line (not just this payload) is fulfilled
+        all_received = all(item.received_quantity >= item.ordered_quantity for item in items.values())
+        po.status = 'Completed' if all_received else 'Partially Delivered'
+
+        if received:
+            PurchaseOrderItem.objects.bulk_update(received, ['received_quantity'])
+            adjust_on_order((item.product_id, -quantities[item.id]) for item in received)
+            record('receipt', (
+                (item.id, {
+                    'purchase_order': po.id, 'product': item.product_id,
+                    'quantity': quantities[item.id], 'received_quantity': item.received_quantity,
+                })
+                for item in received
+            ))
+            post_movements(
+                [(item.product_id, quantities[item.id]) for item in received],
+                reference=f"PO #{po.id} Receipt",
+            )
+        po.save(update_fields=['status', 'updated_at'])
+    return po.status
+
+
+def approve_purchase_orders(pks):
+    """
+    Approve the Pending POs among `pks` (at most MAX_BULK_APPROVE).
+    Steps:
+    1. Lock the POs and read their status in one query.
+    2. Move the Pending ones with a single conditional
+       UPDATE ... SET status='Approved' WHERE status='Pending', writing only
+       status, approved_at and updated_at.
+    Because the rows are locked first, the outcome reported for each PO is
+    exact even when it is approved, received or deleted concurrently.
+    Returns {pk: APPROVED | NOT_PENDING | NOT_FOUND}.
+    """
+    pks = sorted(set(pks))
+    if len(pks) > MAX_BULK_APPROVE:
+        raise ValueError(f"At most {MAX_BULK_APPROVE} POs can be approved at once.")
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            PurchaseOrder.objects.select_for_update().filter(pk__in=pks).order_by('pk')
+            .values_list('pk', 'status', 'supplier_id')
+        )
+        statuses = {pk: status for pk, status, _ in rows}
+        suppliers = {pk: supplier for pk, _, supplier in rows}
+        pending = [pk for pk, status in statuses.items() if status == 'Pending']
+        if pending:
+            PurchaseOrder.objects.filter(pk__in=pending, status='Pending').update(
+                status='Approved', approved_at=now, updated_at=now,
+            )
+            # The UPDATE bypasses post_save, which would drop the cached
+            # payloads and append the change events
+            invalidate_purchase_orders(pending)
+            record_purchase_orders((pk, 'Approved', suppliers[pk]) for pk in pending)
+    return {
+        pk: NOT_FOUND if pk not in statuses else APPROVED if statuses[pk] == 'Pending' else NOT_PENDING
+        for pk in pks
+    }
+
+
+def _existing_ids(model, ids):
+    """
+    Return the subset of `ids` that exist for `model`, one IN query per batch.
+    """
+    ids = sorted(ids)
+    found = set()
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        batch = ids[start:start + LOOKUP_BATCH_SIZE]
+        found.update(model.objects.filter(pk__in=batch).values_list('pk', flat=True))
+    return found
+
+
+def create_purchase_orders(payloads, user):
+    """
+    Create many POs (with their items) in one transaction.
+    Steps:
+    1. Validate the shape of every PO without touching the database.
+    2. Resolve all supplier and product references with one IN lookup each.
+    3. bulk_create the valid POs, then bulk_create all of their items.
+    Invalid POs are reported and skipped; they do not abort the batch.
+    Returns (created POs, errors) where each error is {'index': n, 'errors': {...}}
+    and `index` is the PO's position in `payloads`.
+    """
+    valid = []
+    errors = []
+    for index, payload in enumerate(payloads):
+        serializer = BulkPurchaseOrderSerializer(data=payload)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    suppliers = _existing_ids(Supplier, {data['supplier'] for _, data in valid})
+    products = _existing_ids(Product, {item['product'] for _, data in valid for item in data['items']})
+
+    accepted = []
+    for index, data in valid:
+        problems = {}
+        if data['supplier'] not in suppliers:
+            problems['supplier'] = [f"Invalid pk \"{data['supplier']}\" - object does not exist."]
+        missing = sorted({item['product'] for item in data['items']} - products)
+        if missing:
+            problems['items'] = [f"Invalid product pk(s): {missing}."]
+        if problems:
+            errors.append({'index': index, 'errors': problems})
+        else:
+            accepted.append(data)
+    errors.sort(key=lambda error: error['index'])
+
+    with transaction.atomic():
+        orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(supplier_id=data['supplier'], created_by=user)
+            for data in accepted
+        ])
+        items = PurchaseOrderItem.objects.bulk_create([
+            PurchaseOrderItem(
+                purchase_order=po,
+                product_id=item['product'],
+                ordered_quantity=item['ordered_quantity'],
+            )
+            for po, data in zip(orders, accepted)
+            for item in data['items']
+        ])
+        order_lines_placed(items)
+        record_purchase_orders((po.pk, po.status, po.supplier_id) for po in orders)
+        search_index('purchase_order', [po.pk for po in orders])
+    return orders, errors
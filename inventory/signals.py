@@ -0,0 +1,86 @@
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_products, invalidate_purchase_orders, invalidate_suppliers
+from .changes import record, record_purchase_orders
+from .models import Product, PurchaseOrder, PurchaseOrderItem, Supplier
+from .metrics import install_query_wrapper
+from .reorder import sync_reorder_state
+from . import search
+
+# Time every query for the request metrics, including on connections opened
+# before this module was imported
+connection_created.connect(install_query_wrapper, dispatch_uid='inventory_metrics_query_wrapper')
+for _connection in connections.all(initialized_only=True):
+    install_query_wrapper(sender=None, connection=_connection)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """
+    Any save of a Product (admin edit of stock or threshold, API, shell)
+    refreshes its reorder flag and worklist entry.
+    """
+    if not raw:
+        sync_reorder_state([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def product_indexed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Stock writes save only stock columns; the index holds the name
+    if not raw and (update_fields is None or 'name' in update_fields):
+        search.index('product', [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_products([instance.pk])
+    search.unindex('product', [instance.pk])
+
+
+@receiver(post_save, sender=PurchaseOrder)
+@receiver(post_delete, sender=PurchaseOrder)
+def purchase_order_changed(sender, instance, **kwargs):
+    invalidate_purchase_orders([instance.pk])
+
+
+@receiver(post_save, sender=PurchaseOrder)
+def purchase_order_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """
+    Change event for a PO that was created or may have changed status
+    (admin and API edits, receipts). Bulk writers record their own events.
+    """
+    if not raw and (created or update_fields is None or 'status' in update_fields):
+        record_purchase_orders([(instance.pk, instance.status, instance.supplier_id)])
+    if not raw and (created or update_fields is None or 'supplier' in update_fields):
+        search.index('purchase_order', [instance.pk])
+
+
+@receiver(post_delete, sender=PurchaseOrder)
+def purchase_order_deleted(sender, instance, **kwargs):
+    record('purchase_order', [(instance.pk, {'deleted': True})])
+    search.unindex('purchase_order', [instance.pk])
+
+
+@receiver(post_save, sender=PurchaseOrderItem)
+@receiver(post_delete, sender=PurchaseOrderItem)
+def purchase_order_item_changed(sender, instance, **kwargs):
+    # Line items are embedded in their PO's payload
+    invalidate_purchase_orders([instance.purchase_order_id])
+
+
+@receiver(post_save, sender=Supplier)
+def supplier_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if not created:
+        invalidate_suppliers([instance.pk])
+    if not raw and (update_fields is None or 'name' in update_fields):
+        search.index('supplier', [instance.pk])
+        if not created:
+            # PO entries carry the supplier name
+            search.index_supplier_orders([instance.pk])
+
+
+@receiver(post_delete, sender=Supplier)
+def supplier_deleted(sender, instance, **kwargs):
+    search.unindex('supplier', [instance.pk])
@@ -0,0 +1,210 @@
+"""
+Materialized stock snapshots.
+
+A StockSnapshot records a product's ledger balance up to a given
+InventoryTransaction ID. Point-in-time stock is answered from the nearest
+snapshot at or before the requested instant plus the ledger rows written after
+it, so the cost depends on the delta rather than on the whole history: the
+snapshots are looked up first, and each product's rows are then read as a
+range (product_id = X AND id > watermark) of the ledger's (product, id) index.
+
+A snapshot is only correct if no ledger row below its watermark commits after
+it is built. On databases where IDs can commit out of order (PostgreSQL
+sequences), set INVENTORY_SNAPSHOT_SETTLE_SECONDS above the longest
+ledger-writing transaction: builds then stop at the newest row older than
+that, and later rows wait for the next run.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .batches import product_batches
+from .models import ArchivedTransaction, InventoryTransaction, Product, StockSnapshot
+
+# Number of products handled per build/compaction batch
+DEFAULT_BATCH_SIZE = 1000
+
+
+def settle_seconds():
+    return getattr(settings, 'INVENTORY_SNAPSHOT_SETTLE_SECONDS', 0)
+
+
+def settled_upto():
+    """
+    Highest ledger ID a build may fold: the newest row, or with a settle delay
+    the newest row older than it (found scanning back from the top of the ID
+    index, so only the rows inside the window are read). None for no rows.
+    """
+    rows = InventoryTransaction.objects.order_by('-id')
+    if settle_seconds():
+        rows = rows.filter(timestamp__lte=timezone.now() - timedelta(seconds=settle_seconds()))
+    return rows.values_list('id', flat=True).first()
+
+
+def _latest_snapshot(product_ref, at=None):
+    """
+    Snapshots of `product_ref` (an OuterRef), newest first, optionally
+    restricted to those taken at or before `at`.
+    """
+    snapshots = StockSnapshot.objects.filter(product=product_ref)
+    if at is not None:
+        snapshots = snapshots.filter(taken_at__lte=at)
+    return snapshots.order_by('-last_transaction_id')
+
+
+def _bases(product_ids, at=None):
+    """
+    Return {product_id: (current_stock, snapshot quantity, snapshot watermark)}
+    using each product's latest snapshot (quantity and watermark 0 when it has
+    none). One query, reading one snapshot per product.
+    """
+    latest = _latest_snapshot(OuterRef('pk'), at)
+    rows = Product.objects.filter(pk__in=product_ids).annotate(
+        base_quantity=Subquery(latest.values('quantity')[:1]),
+        watermark=Subquery(latest.values('last_transaction_id')[:1]),
+    ).values_list('pk', 'current_stock', 'base_quantity', 'watermark')
+    return {pk: (stock, quantity or 0, watermark or 0) for pk, stock, quantity, watermark in rows}
+
+
+def _ledger_since_snapshot(watermarks, at=None, model=InventoryTransaction):
+    """
+    Ledger rows newer than each product's watermark ({product_id: highest ID
+    already in its snapshot}, from _bases), optionally up to `at`, grouped per
+    product. The watermarks are literals, so every product is one range of
+    the (product, id) index and only the rows past its snapshot are read.
+    `model` selects the hot ledger or its archive (same columns and IDs).
+    """
+    if not watermarks:
+        return model.objects.none().values('product_id')
+    unsnapshotted = [pk for pk, watermark in watermarks.items() if not watermark]
+    condition = Q(product_id__in=unsnapshotted) if unsnapshotted else Q()
+    for pk, watermark in watermarks.items():
+        if watermark:
+            condition |= Q(product_id=pk, id__gt=watermark)
+    rows = model.objects.filter(condition)
+    if at is not None:
+        rows = rows.filter(timestamp__lte=at)
+    return rows.values('product_id').order_by()
+
+
+def _watermarks(bases):
+    return {pk: watermark for pk, (_, _, watermark) in bases.items()}
+
+
+def _deltas_since_snapshot(watermarks, at=None):
+    """
+    {product_id: sum of hot and archived ledger rows past the latest snapshot},
+    in one UNION query. Archived rows only count for an `at` older than the
+    archival run, since archiving first builds snapshots covering every row
+    it moves.
+    """
+    if not watermarks:
+        return {}
+    hot, archived = (
+        _ledger_since_snapshot(watermarks, at, model).annotate(delta=Sum('quantity')).values_list('product_id', 'delta')
+        for model in (InventoryTransaction, ArchivedTransaction)
+    )
+    deltas = {}
+    for pk, delta in hot.union(archived, all=True):
+        deltas[pk] = deltas.get(pk, 0) + delta
+    return deltas
+
+
+def stock_as_of_many(product_ids, at):
+    """
+    Return {product_id: ledger balance as of `at`} for the given products.
+    Each balance starts from the nearest snapshot and replays only newer rows.
+    """
+    bases = _bases(product_ids, at)
+    deltas = _deltas_since_snapshot(_watermarks(bases), at)
+    return {pk: quantity + deltas.get(pk, 0) for pk, (_, quantity, _) in bases.items()}
+
+
+def stock_as_of(product_id, at):
+    """
+    Ledger balance of one product as of timestamp `at`.
+    Raises Product.DoesNotExist for an unknown product.
+    """
+    balances = stock_as_of_many([product_id], at)
+    if product_id not in balances:
+        raise Product.DoesNotExist(f"Product {product_id} does not exist.")
+    return balances[product_id]
+
+
+def build_snapshots(batch_size=DEFAULT_BATCH_SIZE, upto=None):
+    """
+    Fold new ledger rows into a fresh snapshot for every product that has any.
+    Works through products in batches of `batch_size`; each batch costs a
+    constant number of queries. Ledger rows above `upto` (default:
+    settled_upto() when the build starts) are left for the next run.
+    Returns the number of snapshots created.
+    """
+    if upto is None:
+        upto = settled_upto()
+        if upto is None:
+            return 0
+
+    created = 0
+    for batch in product_batches(batch_size):
+        bases = _bases(batch)
+        deltas = (
+            _ledger_since_snapshot(_watermarks(bases))
+            .filter(id__lte=upto)
+            .annotate(delta=Sum('quantity'), last_id=Max('id'), last_ts=Max('timestamp'))
+        )
+        snapshots = [
+            StockSnapshot(
+                product_id=row['product_id'],
+                quantity=bases[row['product_id']][1] + row['delta'],
+                last_transaction_id=row['last_id'],
+                taken_at=row['last_ts'],
+            )
+            for row in deltas
+        ]
+        StockSnapshot.objects.bulk_create(snapshots)
+        created += len(snapshots)
+    return created
+
+
+def compact_snapshots(keep_days=90, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Thin out snapshots older than `keep_days`, keeping only the last snapshot
+    of each calendar month per product. A product's newest snapshot is always
+    the last of its month, so it is never removed.
+    Returns the number of snapshots deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    deleted = 0
+    for batch in product_batches(batch_size):
+        rows = (
+            StockSnapshot.objects.filter(product_id__in=batch, taken_at__lt=cutoff)
+            .order_by('product_id', '-last_transaction_id')
+            .values_list('pk', 'product_id', 'taken_at')
+        )
+        kept_months = set()
+        doomed = []
+        for pk, product_id, taken_at in rows:
+            month = (product_id, taken_at.year, taken_at.month)
+            if month in kept_months:
+                doomed.append(pk)
+            else:
+                kept_months.add(month)
+        if doomed:
+            deleted += StockSnapshot.objects.filter(pk__in=doomed).delete()[0]
+    return deleted
+
+
+def reconcile(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Compare Product.current_stock with the ledger balance (latest snapshot plus
+    newer rows) and yield (product_id, current_stock, ledger_balance) for every
+    product that has drifted.
+    """
+    for batch in product_batches(batch_size):
+        bases = _bases(batch)
+        deltas = _deltas_since_snapshot(_watermarks(bases))
+        for pk, (stock, quantity, _) in bases.items():
+            balance = quantity + deltas.get(pk, 0)
+            if balance != stock:
+                yield pk, stock, balance
@@ -0,0 +1,221 @@
+"""
+Stock-mutation service.
+
+Every write to Product.current_stock (goods receipts, admin edits, sales,
+manual adjustments) goes through post_movements(), which applies the change
+and writes the matching InventoryTransaction rows in one transaction.
+
+Two concurrency modes are supported:
+- pessimistic: lock the affected Product rows with SELECT ... FOR UPDATE,
+  always in primary-key order so concurrent writers cannot deadlock.
+- optimistic: read without locking and apply a conditional UPDATE guarded by
+  Product.version, retrying the whole movement when another writer won.
+
+Both modes compute the new stock inside the database (F() expressions), so
+concurrent increments are never lost. The reorder worklist is refreshed for
+the touched products and a 'ledger' change event is appended per ledger row
+in the same transaction; analytics rollups and (when enabled) reorder
+planning are queued as jobs after it commits.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, IntegerField, Value, When
+from .changes import record
+from .models import InventoryTransaction, Product
+from .planning import schedule_planning
+from .reorder import sync_reorder_state
+from .rollups import schedule_catch_up
+
+PESSIMISTIC = 'pessimistic'
+OPTIMISTIC = 'optimistic'
+LOCKING_MODES = [PESSIMISTIC, OPTIMISTIC]
+
+# Maximum number of products touched by a single UPDATE statement.
+# Keeps the CASE expression well below the backend's parameter limit.
+STOCK_UPDATE_BATCH_SIZE = 250
+
+# Optimistic mode gives up after this many lost races
+DEFAULT_MAX_RETRIES = 25
+
+# Retry delay bounds in optimistic mode (seconds)
+BACKOFF_BASE_SECONDS = 0.002
+MAX_BACKOFF_SECONDS = 0.1
+
+
+class StockError(Exception):
+    """
+    Base class for rejected stock movements.
+    """
+
+
+class UnknownProduct(StockError):
+    """
+    Raised when a movement references a product that does not exist.
+    """
+
+
+class InsufficientStock(StockError):
+    """
+    Raised when a movement would take a product's stock below zero.
+    """
+
+
+class StockConflict(StockError):
+    """
+    Raised when optimistic mode keeps losing races after every retry.
+    """
+
+
+def default_mode():
+    """
+    Locking mode used when callers do not pick one explicitly.
+    Configurable with the INVENTORY_STOCK_LOCKING setting.
+    """
+    return getattr(settings, 'INVENTORY_STOCK_LOCKING', PESSIMISTIC)
+
+
+def _aggregate(movements):
+    """
+    Sum (product_id, quantity) pairs into {product_id: delta}.
+    """
+    deltas = {}
+    for product_id, quantity in movements:
+        deltas[product_id] = deltas.get(product_id, 0) + quantity
+    return deltas
+
+
+def _reorder_flag(new_stock):
+    """
+    Database expression for reorder_needed given the post-update stock.
+    """
+    return Case(
+        When(reorder_threshold__gt=new_stock, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def _check_levels(deltas, levels, allow_negative):
+    """
+    Validate the movement against the stock levels that were read.
+    """
+    missing = set(deltas) - set(levels)
+    if missing:
+        raise UnknownProduct(f"Unknown product IDs: {sorted(missing)}")
+    if not allow_negative:
+        for product_id, delta in deltas.items():
+            if levels[product_id] + delta < 0:
+                raise InsufficientStock(
+                    f"Product {product_id} has {levels[product_id]} in stock; cannot apply {delta}."
+                )
+
+
+def _write_ledger(movements, reference):
+    rows = InventoryTransaction.objects.bulk_create([
+        InventoryTransaction(product_id=product_id, quantity=quantity, reference=reference)
+        for product_id, quantity in movements
+    ])
+    record('ledger', (
+        (row.pk, {'product': row.product_id, 'quantity': row.quantity, 'reference': reference}) for row in rows
+    ))
+    # Fold the new rows into the analytics rollups once they are committed
+    schedule_catch_up()
+
+
+def _post_pessimistic(movements, deltas, reference, allow_negative):
+    with transaction.atomic():
+        # Lock rows in primary-key order so every writer acquires locks the same way
+        levels = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in=deltas)
+            .order_by('pk')
+            .values_list('pk', 'current_stock')
+        )
+        _check_levels(deltas, levels, allow_negative)
+
+        product_ids = sorted(deltas)
+        for start in range(0, len(product_ids), STOCK_UPDATE_BATCH_SIZE):
+            batch = product_ids[start:start + STOCK_UPDATE_BATCH_SIZE]
+            delta = Case(
+                *[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            Product.objects.filter(pk__in=batch).update(
+                current_stock=F('current_stock') + delta,
+                reorder_needed=_reorder_flag(F('current_stock') + delta),
+                version=F('version') + 1,
+            )
+        _write_ledger(movements, reference)
+        sync_reorder_state(product_ids)
+
+
+class _LostRace(Exception):
+    pass
+
+
+def _post_optimistic(movements, deltas, reference, allow_negative, max_retries):
+    for attempt in range(max_retries):
+        rows = {
+            pk: (stock, version)
+            for pk, stock, version in Product.objects.filter(pk__in=deltas)
+            .values_list('pk', 'current_stock', 'version')
+        }
+        _check_levels(deltas, {pk: stock for pk, (stock, _) in rows.items()}, allow_negative)
+        try:
+            with transaction.atomic():
+                for pk in sorted(deltas):
+                    stock, version = rows[pk]
+                    new_stock = stock + deltas[pk]
+                    updated = Product.objects.filter(pk=pk, version=version).update(
+                        current_stock=new_stock,
+                        reorder_needed=_reorder_flag(Value(new_stock)),
+                        version=version + 1,
+                    )
+                    if not updated:
+                        raise _LostRace()
+                _write_ledger(movements, reference)
+                sync_reorder_state(sorted(deltas))
+            return
+        except _LostRace:
+            # Exponential back-off with full jitter before re-reading the rows
+            time.sleep(random.uniform(0, min(BACKOFF_BASE_SECONDS * 2 ** attempt, MAX_BACKOFF_SECONDS)))
+    raise StockConflict(f"Gave up after {max_retries} conflicting updates.")
+
+
+def post_movements(movements, reference, mode=None, allow_negative=False, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Apply stock movements and log them in the inventory ledger.
+    Args:
+    - movements: iterable of (product_id, quantity); quantity is positive for
+      stock coming in and negative for stock going out. One
+      InventoryTransaction row is written per movement.
+    - reference: note stored on every ledger row (e.g. "PO #7 Receipt").
+    - mode: PESSIMISTIC or OPTIMISTIC (defaults to INVENTORY_STOCK_LOCKING).
+    - allow_negative: permit stock to drop below zero.
+    Runs atomically, joining the caller's transaction if there is one.
+    """
+    movements = [(product_id, quantity) for product_id, quantity in movements if quantity]
+    if not movements:
+        return
+    deltas = _aggregate(movements)
+    mode = mode or default_mode()
+    if mode == PESSIMISTIC:
+        _post_pessimistic(movements, deltas, reference, allow_negative)
+    elif mode == OPTIMISTIC:
+        _post_optimistic(movements, deltas, reference, allow_negative, max_retries)
+    else:
+        raise ValueError(f"Unknown stock locking mode: {mode!r}")
+    if any(delta < 0 for delta in deltas.values()):
+        # Stock went out: replenishment may be due (no-op unless INVENTORY_AUTO_PLAN)
+        schedule_planning()
+
+
+def adjust_stock(product_id, quantity, reference, **kwargs):
+    """
+    Convenience wrapper for a single-product movement (sales, stock counts).
+    """
+    post_movements([(product_id, quantity)], reference, **kwargs)
@@ -1,6 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PurchaseOrderViewSet, purchase_order_list
+from . import async_views
+from .views import (
+    PurchaseOrderViewSet, ProductViewSet, ReorderWorklistView, InventoryTransactionExportView, CatalogImportView,
+    CacheStatsView, ChangeAckView, ChangeFeedView, MovementAnalyticsView, SearchView, SupplierAnalyticsView,
+    metrics_endpoint, purchase_order_list, purchase_order_row,
+)
 
 # Create a DRF router to automatically generate REST API routes
 router = DefaultRouter()
@@ -9,6 +14,9 @@ router = DefaultRouter()
 # This will generate routes like:
 #   GET    /api/purchase-orders/            List all POs
 #   POST   /api/purchase-orders/            Create a new PO
+#   POST   /api/purchase-orders/bulk/       Create many POs in one transaction
+#   POST   /api/purchase-orders/bulk-approve/   Approve many Pending POs by id or filter
+#   GET    /api/purchase-orders/export/     Stream POs as NDJSON or CSV
 #   GET    /api/purchase-orders/{id}/       Retrieve a PO
 #   PUT    /api/purchase-orders/{id}/       Update a PO
 #   DELETE /api/purchase-orders/{id}/       Delete a PO
@@ -20,12 +28,61 @@ router.register(
     basename='purchaseorder'
 )
 
+# Read-only product API:
+#   GET    /api/products/                   List products
+#   GET    /api/products/{id}/              Retrieve a product
+#   GET    /api/products/{id}/stock/?as_of= Ledger stock at a point in time
+#   GET    /api/products/{id}/ledger-summary/ Monthly totals of the archived ledger
+#   GET    /api/products/availability/?sku= Stock and on-order quantity per SKU
+router.register(
+    r'api/products',
+    ProductViewSet,
+    basename='product'
+)
+
 # Define URL patterns for this app
 urlpatterns = [
     # Include the automatically generated DRF API URLs
     path('', include(router.urls)),
 
+    # Products below their reorder threshold (?supplier=<id>|none)
+    path('api/reorder-worklist/', ReorderWorklistView.as_view(), name='reorder_worklist'),
+
+    # Rollup-backed analytics (?grain=day|month&since=&until=&days=)
+    path('api/analytics/movements/', MovementAnalyticsView.as_view(), name='movement_analytics'),
+    path('api/analytics/suppliers/', SupplierAnalyticsView.as_view(), name='supplier_analytics'),
+
+    # Typeahead search over products, suppliers and POs (?q=&type=&limit=)
+    path('api/search/', SearchView.as_view(), name='search'),
+
+    # Change feed (?since=&topic=&limit=&wait=) and consumer acknowledgements
+    path('api/changes/', ChangeFeedView.as_view(), name='change_feed'),
+    path('api/changes/ack/', ChangeAckView.as_view(), name='change_ack'),
+
+    # Payload cache hit/miss counters (staff only)
+    path('api/cache-stats/', CacheStatsView.as_view(), name='cache_stats'),
+
+    # Streaming ledger export (?format=ndjson|csv&since=&until=)
+    path('api/inventory-transactions/export/', InventoryTransactionExportView.as_view(), name='transaction_export'),
+
+    # Catalogue upload (multipart: file, kind=suppliers|products|stock)
+    path('api/import/catalog/', CatalogImportView.as_view(), name='catalog_import'),
+
+    # Async (ASGI) read endpoints; see async_views.py
+    path('async/api/purchase-orders/', async_views.purchase_order_list, name='async_po_list'),
+    path('async/api/purchase-orders/<int:pk>/', async_views.purchase_order_detail, name='async_po_detail'),
+    path('async/api/products/availability/', async_views.product_availability, name='async_product_availability'),
+    path('async/api/products/<int:pk>/transactions/', async_views.product_transactions,
+         name='async_product_transactions'),
+    path('async/api/changes/stream/', async_views.change_stream, name='async_change_stream'),
+
+    # Prometheus scrape endpoint for the request metrics
+    path('metrics', metrics_endpoint, name='metrics'),
+
     # HTML page for viewing purchase orders in a Bootstrap table
-    # Accessible via: /purchase-orders/
+    # Accessible via: /purchase-orders/?status=&supplier=&sort=&cursor=
     path('purchase-orders/', purchase_order_list, name='po_list'),
+
+    # One rendered board row, fetched after approve/receive
+    path('purchase-orders/<int:pk>/row/', purchase_order_row, name='po_row'),
 ]
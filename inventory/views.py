@@ -1,11 +1,71 @@
-from rest_framework import viewsets, status
+import hashlib
+import hmac
+import io
+
+from rest_framework import generics, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.utils import timezone
-from django.shortcuts import render
-from .models import PurchaseOrder, PurchaseOrderItem, InventoryTransaction, Product
-from .serializers import PurchaseOrderSerializer, PurchaseOrderCreateSerializer
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.dateparse import parse_datetime
+from django.shortcuts import get_object_or_404, render
+from . import search
+from .models import PurchaseOrder, Product, ReorderItem, Supplier
+from .archive import period_summaries
+from .availability import (
+    AVAILABILITY_FIELDS, SKU_LIST_ERROR, adjust_on_order, availability_payload, parse_skus, refresh_on_order,
+)
+from .board import BOARD_SORTS, BoardFilterError, board_page
+from .cache import cache_stats, product_payloads, purchase_order_payloads
+from .changes import ChangeFeedError, ack, acked_id, latest_id, parse_feed_params, wait_for_events
+from .exports import ExportFilterError, export_purchase_orders, export_transactions, parse_bound
+from .idempotency import idempotent
+from .metrics import render_prometheus
+from .importers import IMPORT_KINDS, CatalogImporter, CatalogImportError, guess_format
+from .pagination import IdKeysetPagination, KeysetPagination
+from .permissions import MANAGER_ROLE, has_role
+from .payloads import FieldSelectionError, parse_fields, sparse
+from .renderers import API_RENDERERS, CSVRenderer, NDJSONRenderer, json_bytes
+from .rollups import (
+    GRAINS, MOVEMENT_FIELDS, default_since, movement_series, parse_period, supplier_performance, top_movers,
+    watermarks,
+)
+from .serializers import (
+    PurchaseOrderSerializer, PurchaseOrderCreateSerializer, ProductSerializer, ReorderItemSerializer,
+)
+from .services import (
+    APPROVED, MAX_BULK_APPROVE, NOT_FOUND, ReceiptError, approve_purchase_orders, create_purchase_orders,
+    receive_goods,
+)
+from .snapshots import stock_as_of
+
+
+def etagged(request, response):
+    """
+    Tag a response with a strong ETag of its data and answer 304 Not Modified
+    when the client's If-None-Match already matches, so polling clients only
+    download a page when something on it changed.
+    """
+    body = json_bytes(response.data, sort_keys=True)
+    etag = quote_etag(hashlib.md5(body, usedforsecurity=False).hexdigest())
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def cached_pk(kwargs):
+    try:
+        return int(kwargs['pk'])
+    except ValueError:
+        raise Http404
+
 
 class PurchaseOrderViewSet(viewsets.ModelViewSet):
     """
@@ -13,9 +73,20 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
     Provides:
     - CRUD operations (list, create, retrieve, update, delete)
     - Custom actions for approving and receiving orders.
+    List and retrieve are served from the payload cache (see cache.py) with
+    ETag / If-None-Match support. The list is keyset-paginated on
+    (created_at, id); its page query reads only those two columns and cache
+    misses are loaded with a fixed number of queries (supplier joined, items
+    prefetched).
+    create, bulk, approve, bulk_approve and receive honour an Idempotency-Key
+    header: a retried request replays the stored response (see idempotency.py).
+    List and retrieve accept a sparse fieldset (?fields=id,status,items) and
+    are also rendered as MessagePack when msgpack is installed.
     """
     queryset = PurchaseOrder.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    renderer_classes = API_RENDERERS
 
     def get_serializer_class(self):
         """
@@ -38,99 +109,210 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(status=status_param)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        try:
+            fields = parse_fields(request.query_params.get('fields'))
+        except FieldSelectionError as exc:
+            return Response({'error': str(exc)}, status=400)
+        queryset = self.filter_queryset(self.get_queryset()).only('id', 'created_at')
+        page = self.paginate_queryset(queryset)
+        payloads = purchase_order_payloads.get_many((po.pk for po in page), fields)
+        return etagged(request, self.get_paginated_response(payloads))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            fields = parse_fields(request.query_params.get('fields'))
+        except FieldSelectionError as exc:
+            return Response({'error': str(exc)}, status=400)
+        status_param = request.query_params.get('status')
+        loaded = fields
+        if status_param and fields is not None and 'status' not in fields:
+            # The status filter needs the column even when it is not returned
+            loaded = fields + ['status']
+        payloads = purchase_order_payloads.get_many([cached_pk(kwargs)], loaded)
+        if not payloads or (status_param and payloads[0]['status'] != status_param):
+            raise Http404
+        return etagged(request, Response(sparse(payloads, fields)[0]))
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """
         When creating a purchase order, set created_by to current user.
         """
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        """
+        A PUT/PATCH may change the status (e.g. to Completed), which changes
+        which lines count as on order, so on_order is recomputed for the PO's products.
+        """
+        with transaction.atomic():
+            po = serializer.save()
+            refresh_on_order(po.items.values_list('product_id', flat=True))
+
+    def perform_destroy(self, instance):
+        """
+        Take the PO's open quantities off Product.on_order in the same transaction.
+        """
+        with transaction.atomic():
+            if instance.status != 'Completed':
+                adjust_on_order(
+                    (product_id, received - ordered)
+                    for product_id, ordered, received in instance.items.values_list(
+                        'product_id', 'ordered_quantity', 'received_quantity'
+                    )
+                )
+            instance.delete()
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        """
+        Create many POs in one request (e.g. from a nightly MRP run).
+        Expects a JSON array of {"supplier": id, "items": [{"product": id, "ordered_quantity": n}]}.
+        Business Rules:
+        - Supplier and product references are checked for the whole batch at once.
+        - Valid POs are created in a single transaction; invalid ones are
+          reported by their position in the array and skipped.
+        Responds 201 if everything was created, 207 if only some POs were,
+        and 400 if none were.
+        """
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of purchase orders.'}, status=400)
+
+        orders, errors = create_purchase_orders(request.data, request.user)
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif orders:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': [po.id for po in orders], 'errors': errors}, status=response_status)
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream all matching POs with their items.
+        Example: /api/purchase-orders/export/?format=csv&status=Completed&since=2025-01-01&until=2025-02-01
+        - format: ndjson (default, one PO per line) or csv (one row per line item)
+        - status: optional status filter
+        - since / until: optional created_at range [since, until), ISO date or datetime
+        """
+        try:
+            filters = {
+                'since': parse_bound(request.query_params.get('since'), 'since'),
+                'until': parse_bound(request.query_params.get('until'), 'until'),
+                'status': request.query_params.get('status'),
+            }
+        except ExportFilterError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return export_purchase_orders(request.accepted_renderer.format, **filters)
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def approve(self, request, pk=None):
         """
         Custom action to approve a PO.
         Business Rules:
         - Only users in 'Manager' group can approve.
         - Only POs with status 'Pending' can be approved.
+        Uses the same conditional UPDATE as bulk_approve, so two concurrent
+        approvals of one PO cannot both succeed.
         """
-        po = self.get_object()
-        if not request.user.groups.filter(name='Manager').exists():
+        if not has_role(request, MANAGER_ROLE):
             return Response({'error': 'Only Managers can approve POs.'}, status=403)
-        if po.status != 'Pending':
+        pk = cached_pk(self.kwargs)
+        outcome = approve_purchase_orders([pk])[pk]
+        if outcome == NOT_FOUND:
+            raise Http404
+        if outcome != APPROVED:
             return Response({'error': 'Only Pending POs can be approved.'}, status=400)
-
-        po.status = 'Approved'
-        po.approved_at = timezone.now()
-        po.save()
         return Response({'status': 'PO approved.'})
 
+    @action(detail=False, methods=['post'], url_path='bulk-approve')
+    @idempotent
+    def bulk_approve(self, request):
+        """
+        Approve many POs in one request (e.g. at month-end).
+        Expects either {"ids": [1, 2, ...]} or
+        {"filter": {"supplier": id, "since": date, "until": date}}; a filter
+        (every key optional) selects Pending POs created in [since, until),
+        oldest first. Either way at most MAX_BULK_APPROVE POs are handled.
+        Business Rules:
+        - Only users in 'Manager' group can approve (checked once).
+        - Only Pending POs are approved, with one conditional UPDATE.
+        Responds with each PO's outcome ('approved', 'not_pending' or
+        'not_found') and, for a filter, whether more POs are waiting:
+        200 if every PO was approved, 207 if only some were, 400 if none were.
+        """
+        if not has_role(request, MANAGER_ROLE):
+            return Response({'error': 'Only Managers can approve POs.'}, status=403)
+        if not isinstance(request.data, dict) or ('ids' in request.data) == ('filter' in request.data):
+            return Response({'error': "Expected either 'ids' or 'filter'."}, status=400)
+
+        more = False
+        if 'ids' in request.data:
+            ids = request.data['ids']
+            if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+                return Response({'error': "'ids' must be a list of integers."}, status=400)
+            if len(set(ids)) > MAX_BULK_APPROVE:
+                return Response({'error': f'At most {MAX_BULK_APPROVE} POs can be approved at once.'}, status=400)
+        else:
+            filters = request.data['filter']
+            if not isinstance(filters, dict):
+                return Response({'error': "'filter' must be an object."}, status=400)
+            queryset = PurchaseOrder.objects.filter(status='Pending')
+            supplier = filters.get('supplier')
+            if supplier is not None:
+                if not isinstance(supplier, int) or isinstance(supplier, bool):
+                    return Response({'error': 'supplier must be an integer.'}, status=400)
+                queryset = queryset.filter(supplier_id=supplier)
+            try:
+                since = parse_bound(str(filters.get('since') or ''), 'since')
+                until = parse_bound(str(filters.get('until') or ''), 'until')
+            except ExportFilterError as exc:
+                return Response({'error': str(exc)}, status=400)
+            if since:
+                queryset = queryset.filter(created_at__gte=since)
+            if until:
+                queryset = queryset.filter(created_at__lt=until)
+            ids = list(queryset.order_by('created_at', 'id').values_list('pk', flat=True)[:MAX_BULK_APPROVE + 1])
+            more = len(ids) > MAX_BULK_APPROVE
+            ids = ids[:MAX_BULK_APPROVE]
+
+        outcomes = approve_purchase_orders(ids)
+        approved = [pk for pk, outcome in outcomes.items() if outcome == APPROVED]
+        if len(approved) == len(outcomes):
+            response_status = status.HTTP_200_OK
+        elif approved:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'approved': approved, 'outcomes': outcomes, 'more': more}, status=response_status)
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def receive(self, request, pk=None):
         """
         Custom action to receive goods for a PO.
         Business Rules:
         - Only 'Approved' or 'Partially Delivered' POs can receive goods.
         - Each received item quantity must be positive and <= remaining quantity.
-        - Updates inventory stock and logs InventoryTransaction.
+        - The whole payload is validated before anything is written.
+        - Updates inventory stock and logs InventoryTransaction in one atomic block.
         - Sets PO status to Completed or Partially Delivered.
         - Updates reorder flag based on new stock levels.
+        See services.receive_goods for the set-based implementation.
         """
         po = self.get_object()
-        if po.status not in ['Approved', 'Partially Delivered']:
-            return Response({'error': 'Cannot receive goods for this PO status.'}, status=400)
-
-        received_items = request.data.get('items', [])
-        all_received = True  # Flag to track if all items are fulfilled
-
-        for item_data in received_items:
-            # Find corresponding PurchaseOrderItem
-            try:
-                item = po.items.get(id=item_data['id'])
-            except PurchaseOrderItem.DoesNotExist:
-                return Response({'error': f"Item ID {item_data['id']} not found in this PO."}, status=404)
-
-            qty = item_data['received_quantity']
-            if qty <= 0:
-                return Response({'error': 'Received quantity must be positive.'}, status=400)
-
-            remaining_qty = item.ordered_quantity - item.received_quantity
-            if qty > remaining_qty:
-                return Response({'error': f"Cannot receive more than remaining quantity ({remaining_qty})."}, status=400)
-
-            # Update item received quantity
-            item.received_quantity += qty
-            item.save()
-
-            # Increment inventory
-            product = item.product
-            product.current_stock += qty
-            product.save()
-
-            # Log inventory transaction
-            InventoryTransaction.objects.create(
-                product=product,
-                quantity=qty,
-                reference=f"PO #{po.id} Receipt"
-            )
-
-            # Update reorder flag
-            if product.current_stock < product.reorder_threshold:
-                product.reorder_needed = True
-            else:
-                product.reorder_needed = False
-            product.save()
-
-            # If any item not fully received, mark PO as partially delivered
-            if item.received_quantity < item.ordered_quantity:
-                all_received = False
-
-        # Update PO status
-        if all_received:
-            po.status = 'Completed'
-        else:
-            po.status = 'Partially Delivered'
-        po.save()
-
-        return Response({'status': f'PO marked as {po.status}.'})
+        try:
+            new_status = receive_goods(po, request.data.get('items', []))
+        except ReceiptError as exc:
+            return Response({'error': exc.message}, status=exc.status)
+        return Response({'status': f'PO marked as {new_status}.'})
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -143,11 +325,366 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
+class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only API for products and their stock levels.
+    List and retrieve are served from the payload cache with ETag support.
+    The list is keyset-paginated by id (?cursor=, ?page_size=), so only one
+    page of payloads is loaded and cached per request.
+    """
+    queryset = Product.objects.all().order_by('id')
+    serializer_class = ProductSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = IdKeysetPagination
+    renderer_classes = API_RENDERERS
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset().only('id'))
+        payloads = product_payloads.get_many(product.pk for product in page)
+        return etagged(request, self.get_paginated_response(payloads))
+
+    def retrieve(self, request, *args, **kwargs):
+        return etagged(request, Response(product_payloads.get(cached_pk(kwargs))))
+
+    @action(detail=True, methods=['get'])
+    def stock(self, request, pk=None):
+        """
+        Ledger stock of a product at a point in time.
+        Example: /api/products/5/stock/?as_of=2025-07-01T00:00:00Z
+        Answered from the nearest StockSnapshot plus the newer ledger rows.
+        Without as_of, returns the current ledger balance.
+        """
+        product = self.get_object()
+        as_of = timezone.now()
+        if 'as_of' in request.query_params:
+            as_of = parse_datetime(request.query_params['as_of'])
+            if as_of is None:
+                return Response({'error': 'as_of must be an ISO 8601 datetime.'}, status=400)
+            if timezone.is_naive(as_of):
+                as_of = timezone.make_aware(as_of)
+        return Response({
+            'product': product.id,
+            'as_of': as_of,
+            'ledger_stock': stock_as_of(product.id, as_of),
+            'current_stock': product.current_stock,
+        })
+
+    @action(detail=True, methods=['get'], url_path='ledger-summary')
+    def ledger_summary(self, request, pk=None):
+        """
+        Monthly totals and closing balances of the product's archived ledger
+        history (see archive.py); recent months are in the live ledger.
+        """
+        product = self.get_object()
+        return Response({'product': product.id, 'periods': list(period_summaries(product.id))})
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        Stock on hand and on order for a set of SKUs.
+        Example: /api/products/availability/?sku=P0001,P0002
+        Reads the maintained Product.on_order, so the lookup is one indexed
+        query on sku regardless of how many POs are open.
+        """
+        skus = parse_skus(request.query_params.get('sku'))
+        if skus is None:
+            return Response({'error': SKU_LIST_ERROR}, status=400)
+        rows = Product.objects.filter(sku__in=skus).values(*AVAILABILITY_FIELDS)
+        return Response(availability_payload(skus, rows))
+
+
+class ReorderWorklistView(generics.ListAPIView):
+    """
+    Products below their reorder threshold, largest shortfall first.
+    Example: /api/reorder-worklist/?supplier=3
+    - supplier: only entries for this preferred supplier ('none' = no supplier)
+    Reads the ReorderItem worklist, so the cost follows the number of products
+    needing reorder rather than the size of the catalogue.
+    """
+    serializer_class = ReorderItemSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = ReorderItem.objects.select_related('product', 'supplier').order_by('-shortfall', 'product_id')
+        supplier = self.request.query_params.get('supplier')
+        if supplier == 'none':
+            queryset = queryset.filter(supplier__isnull=True)
+        elif supplier:
+            queryset = queryset.filter(supplier_id=supplier)
+        return queryset
+
+
+class AnalyticsView(APIView):
+    """
+    Shared query parsing for the rollup-backed analytics endpoints:
+    - grain: 'day' (default) or 'month'
+    - since/until: ISO dates (inclusive); since defaults to `days` ago
+    - days: length of the default window (default 90)
+    """
+    permission_classes = [IsAuthenticated]
+    default_days = 90
+
+    def parse_window(self, params):
+        grain = params.get('grain', 'day')
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of {GRAINS}.")
+        since = parse_period(params.get('since'), 'since')
+        until = parse_period(params.get('until'), 'until')
+        if since is None:
+            try:
+                days = max(1, int(params.get('days', self.default_days)))
+            except ValueError:
+                raise ValueError("days must be an integer.")
+            since = default_since(days, today=until)
+        return grain, since, until
+
+    def get(self, request):
+        try:
+            grain, since, until = self.parse_window(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+        body = {'grain': grain, 'since': since, 'until': until}
+        result = self.results(request, grain, since, until)
+        if isinstance(result, Response):
+            return result
+        body['results'] = result
+        # How far the rollups have folded the ledger and PO lines
+        body['watermarks'] = watermarks()
+        return Response(body)
+
+
+class MovementAnalyticsView(AnalyticsView):
+    """
+    Units received/issued per product and period, from MovementRollup.
+    Example: /api/analytics/movements/?sku=A-1,B-2&grain=day&days=90
+    - sku: comma-separated SKUs; each result carries its period series
+    - without sku: the `top` products (default 20) by units received, totals only
+    """
+    max_top = 500
+
+    def results(self, request, grain, since, until):
+        params = request.query_params
+        if 'sku' not in params:
+            try:
+                top = max(1, min(int(params.get('top', 20)), self.max_top))
+            except ValueError:
+                return Response({'error': 'top must be an integer.'}, status=400)
+            return top_movers(grain, since, until, limit=top)
+        skus = parse_skus(params.get('sku'))
+        if skus is None:
+            return Response({'error': SKU_LIST_ERROR}, status=400)
+        products = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+        series = movement_series(products.values(), grain, since, until)
+        results = []
+        for sku in skus:
+            if sku not in products:
+                continue
+            rows = series[products[sku]]
+            totals = {name: sum(row[name] for row in rows) for name in MOVEMENT_FIELDS}
+            results.append({'product_id': products[sku], 'sku': sku, **totals, 'series': rows})
+        return results
+
+
+class SupplierAnalyticsView(AnalyticsView):
+    """
+    Ordered vs received units per supplier with fill rate and on-time rate,
+    from SupplierRollup.
+    Example: /api/analytics/suppliers/?grain=month&since=2025-01-01
+    - supplier: one supplier's entry, with its period series
+    """
+    def results(self, request, grain, since, until):
+        supplier = request.query_params.get('supplier')
+        if supplier is not None and not supplier.isdigit():
+            return Response({'error': 'supplier must be an integer id.'}, status=400)
+        return supplier_performance(grain, since, until, supplier_id=supplier and int(supplier))
+
+
+class ChangeFeedView(APIView):
+    """
+    Change events after a cursor, oldest first (see changes.py).
+    Example: /api/changes/?since=1200&topic=purchase_order,receipt&wait=20
+    - since: last event ID already processed (default: the consumer's
+      acknowledged ID, else 0)
+    - consumer: name whose acknowledged cursor `since` defaults to
+    - topic: comma-separated topics (purchase_order, receipt, ledger)
+    - limit: events per page (default 500, at most 1000)
+    - wait: seconds to hold the request open until an event arrives (long poll, at most 30)
+    Responds with the events, 'next' (the `since` of the following call) and
+    'more' (further events are already waiting).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            params = parse_feed_params(request.query_params)
+        except ChangeFeedError as exc:
+            return Response({'error': str(exc)}, status=400)
+        consumer = request.query_params.get('consumer')
+        if consumer and not request.query_params.get('since'):
+            params['since'] = acked_id(consumer) or 0
+        return Response(wait_for_events(**params))
+
+
+class ChangeAckView(APIView):
+    """
+    Acknowledge change events, so compaction may delete them.
+    Expects {"consumer": "wms", "id": 1234}: every event up to that ID is
+    processed. Cursors never move backwards; the stored cursor is returned.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        consumer = request.data.get('consumer')
+        event_id = request.data.get('id')
+        if not isinstance(consumer, str) or not 0 < len(consumer) <= 100:
+            return Response({'error': "'consumer' must be a name of up to 100 characters."}, status=400)
+        if not isinstance(event_id, int) or isinstance(event_id, bool) or event_id < 0:
+            return Response({'error': "'id' must be a non-negative integer."}, status=400)
+        if event_id > latest_id():
+            return Response({'error': f'Event {event_id} does not exist yet.'}, status=400)
+        return Response({'consumer': consumer, 'acked': ack(consumer, event_id)})
+
+
+class SearchView(APIView):
+    """
+    Typeahead search over products, suppliers and POs (see search.py).
+    Example: /api/search/?q=blue wid&type=product&limit=10
+    - q: a SKU prefix, a PO number ('PO 1234'), or words matched as
+      prefixes of product and supplier names (at least 2 characters)
+    - type: comma-separated kinds (product, supplier, purchase_order); all by default
+    - limit: results (default 10, at most 50)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind] or search.KINDS
+        unknown = sorted(set(kinds) - set(search.KINDS))
+        if unknown:
+            return Response({'error': f'Unknown types {unknown}; expected some of {search.KINDS}.'}, status=400)
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= search.MAX_LIMIT:
+            return Response({'error': f'limit must be between 1 and {search.MAX_LIMIT}.'}, status=400)
+        query = request.query_params.get('q', '')
+        return Response({'query': query, 'results': search.search(query, kinds, limit)})
+
+
+class CacheStatsView(APIView):
+    """
+    Hit/miss counters of the payload caches in this server process.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class InventoryTransactionExportView(APIView):
+    """
+    Stream the inventory ledger.
+    Example: /api/inventory-transactions/export/?format=csv&since=2025-07-01
+    - format: ndjson (default) or csv
+    - since / until: optional timestamp range [since, until), ISO date or datetime
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    def get(self, request):
+        try:
+            filters = {
+                'since': parse_bound(request.query_params.get('since'), 'since'),
+                'until': parse_bound(request.query_params.get('until'), 'until'),
+            }
+        except ExportFilterError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return export_transactions(request.accepted_renderer.format, **filters)
+
+
+class CatalogImportView(APIView):
+    """
+    Upload a CSV/NDJSON file of suppliers, products or opening stock.
+    Multipart fields:
+    - file: the file to import
+    - kind: suppliers | products | stock
+    - format: csv | ndjson (default: from the file name)
+    Business Rules:
+    - Staff only.
+    - Invalid rows are skipped and listed in the report; valid rows are upserted.
+    Returns the import report with a rows/sec throughput figure.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        kind = request.data.get('kind')
+        if upload is None or kind not in IMPORT_KINDS:
+            return Response({'error': f"Send a 'file' and a 'kind' ({', '.join(IMPORT_KINDS)})."}, status=400)
+        file_format = request.data.get('format') or guess_format(upload.name)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            report = CatalogImporter(kind).run(stream, file_format)
+        except (CatalogImportError, UnicodeDecodeError, ValueError) as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response(report.as_dict())
+
+
 # HTML view to display Purchase Orders with Bootstrap table
 def purchase_order_list(request):
     """
-    Renders a simple HTML template showing all Purchase Orders.
-    Used for basic UI/testing.
+    Renders the purchase-order board: one keyset-paginated page of POs,
+    filterable by status and supplier and sortable on indexed columns
+    (?status=&supplier=&sort=&page_size=&cursor=). See board.py.
+    """
+    try:
+        page = board_page(request.GET)
+    except BoardFilterError as exc:
+        raise Http404(str(exc))
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_page = params.urlencode()
+    next_page = None
+    if page['next_cursor']:
+        params['cursor'] = page['next_cursor']
+        next_page = params.urlencode()
+    return render(request, 'inventory/po_list.html', {
+        'purchase_orders': page['orders'],
+        'page': page,
+        'statuses': [value for value, _ in PurchaseOrder.STATUS_CHOICES],
+        'sorts': list(BOARD_SORTS),
+        'suppliers': Supplier.objects.order_by('name').values_list('id', 'name'),
+        'first_page': first_page,
+        'next_page': next_page,
+        'is_first_page': not request.GET.get('cursor'),
+    })
+
+
+def purchase_order_row(request, pk):
+    """
+    Renders one board row, so the page can swap in a PO's new state after
+    approve/receive without reloading the table.
+    """
+    po = get_object_or_404(PurchaseOrder.objects.select_related('supplier'), pk=pk)
+    return render(request, 'inventory/po_row.html', {'po': po})
+
+
+def metrics_token_matches(request):
+    token = getattr(settings, 'INVENTORY_METRICS_TOKEN', None)
+    if not token:
+        return False
+    scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(presented.encode(), token.encode())
+
+
+def metrics_endpoint(request):
+    """
+    Request metrics in the Prometheus text format.
+    Open to logged-in staff and to a scraper presenting INVENTORY_METRICS_TOKEN
+    as a bearer token. The client address is not trusted: behind a local
+    reverse proxy every request would come from 127.0.0.1.
     """
-    pos = PurchaseOrder.objects.all().select_related('supplier')
-    return render(request, 'inventory/po_list.html', {'purchase_orders': pos})
+    if not request.user.is_staff and not metrics_token_matches(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')